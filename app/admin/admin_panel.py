@@ -6,6 +6,8 @@ from typing import Dict, List, Optional, Any
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from app.core.i18n import t
+from app.core.assets import CONTENT_KEY_PREFIX, content_key
+from app.admin.segments import AudienceSegments, VERIFIED, IN_VERIFICATION, REACHABLE, SUPPRESSED
 
 logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -32,6 +34,9 @@ class AdminPanel:
         self.data.setdefault('referral_settings', {})['min_deposit'] = self.min_deposit
 
         self._migrate_data()
+        # Сегменты аудитории (множества user_id), обновляются при каждом изменении пользователя
+        self.segments = AudienceSegments()
+        self.segments.rebuild(self.data.get("users", {}))
         # Ініціалізуємо статистику, якщо її немає
         if "statistics" not in self.data:
             self.data["statistics"] = {
@@ -59,6 +64,13 @@ class AdminPanel:
                     del user_data["deposited"]
                     updated = True
         
+        # Кеш file_id за іменем файлу не знає, чи змінилася картинка — тепер ключ за вмістом
+        file_ids = self.data.get("file_ids", {})
+        stale_keys = [key for key in file_ids if not key.startswith(CONTENT_KEY_PREFIX)]
+        for key in stale_keys:
+            del file_ids[key]
+        updated = updated or bool(stale_keys)
+
         # Міграція статистики
         if "stats" in self.data:
             del self.data["stats"]
@@ -139,6 +151,9 @@ class AdminPanel:
         builder.row(
             InlineKeyboardButton(text="📄 Загрузить JSON (SSID)", callback_data="admin_upload_ssid_json")
         )
+        builder.row(
+            InlineKeyboardButton(text="🔁 Перепроверка депозитов", callback_data="admin_bulk_reverify")
+        )
         builder.row(
             InlineKeyboardButton(text=t("admin.maintenance", lang), callback_data="admin_maintenance")
         )
@@ -173,6 +188,9 @@ class AdminPanel:
         builder.row(
             InlineKeyboardButton(text=t("admin.broadcast.verified_only", lang), callback_data="admin_broadcast_verified")
         )
+        builder.row(
+            InlineKeyboardButton(text=t("admin.broadcast.segment", lang), callback_data="admin_broadcast_segment")
+        )
         builder.row(
             InlineKeyboardButton(text=t("back.back", lang), callback_data="admin_panel")
         )
@@ -193,8 +211,8 @@ class AdminPanel:
         )
         return builder.as_markup()
     
-    def add_broadcast(self, message: str, target: str = "all"):
-        """Додавання розсилки."""
+    def add_broadcast(self, message: str, target: str = "all") -> int:
+        """Додавання розсилки. Повертає її індекс в історії."""
         broadcast = {
             "message": message,
             "target": target,
@@ -203,6 +221,7 @@ class AdminPanel:
         }
         self.data["broadcasts"].append(broadcast)
         self._save_data()
+        return len(self.data["broadcasts"]) - 1
     
     def get_pending_broadcasts(self) -> List[Dict]:
         """Отримання очікуючих розсилок."""
@@ -299,29 +318,21 @@ class AdminPanel:
         return data.get("referral_settings", self._get_default_data()["referral_settings"])
     
     def get_file_id(self, file_name: str) -> Optional[str]:
-        """Отримує кешований file_id за ім'ям файлу."""
-        return self._load_data().get("file_ids", {}).get(file_name)
+        """Отримує кешований file_id для поточного вмісту файлу."""
+        key = content_key(file_name)
+        return self.data.get("file_ids", {}).get(key) if key else None
 
     def set_file_id(self, file_name: str, file_id: str):
-        """Зберігає file_id для файлу."""
-        data = self._load_data()
-        if "file_ids" not in data:
-            data["file_ids"] = {}
-        data["file_ids"][file_name] = file_id
-        self._save_data()
+        """Зберігає file_id для поточного вмісту файлу."""
+        self.set_file_ids({file_name: file_id})
 
-    def clear_file_id(self, file_name: str) -> bool:
-        """Видаляє кешований file_id для зазначеного файлу (щоб оновити картинку)."""
-        data = self._load_data()
-        file_ids = data.get("file_ids", {})
-        if file_name in file_ids:
-            try:
-                del file_ids[file_name]
-                self._save_data()
-                return True
-            except Exception:
-                return False
-        return False
+    def set_file_ids(self, file_ids: Dict[str, str]):
+        """Зберігає кілька file_id одним записом (наприклад, після прогріву кешу)."""
+        keyed = {key: file_id for key, file_id in ((content_key(name), file_id) for name, file_id in file_ids.items()) if key}
+        if not keyed:
+            return
+        self.data.setdefault("file_ids", {}).update(keyed)
+        self._save_data()
 
     def get_user_stats(self, user_id: int) -> Dict:
         """Отримання статистики користувача."""
@@ -378,6 +389,7 @@ class AdminPanel:
         else:
             # Інакше просто оновлюємо час
             self.data["users"][user_id]["last_activity"] = datetime.now().isoformat()
+        self.segments.update(user_id, self.data["users"][user_id])
         self._save_data()
 
     def is_user_verified(self, user_id: str) -> bool:
@@ -402,6 +414,7 @@ class AdminPanel:
         else:
             user_data["is_verified"] = True
             user_data["account_id"] = account_id
+        self.segments.update(user_id_str, self.data["users"][user_id_str])
         self._save_data()
 
     # --- Методи управління користувачами ---
@@ -434,6 +447,7 @@ class AdminPanel:
             if uid:
                 users[user_id_str]["uid"] = uid
         
+        self.segments.update(user_id_str, users[user_id_str])
         self._save_data()
         return is_new_user
 
@@ -449,8 +463,32 @@ class AdminPanel:
         
         # Тепер, коли ми впевнені, що користувач існує, оновлюємо поле.
         users[user_id_str][field] = value
+        self.segments.update(user_id_str, users[user_id_str])
         self._save_data()
     
+    def suppress_users(self, reasons: Dict[int, str]):
+        """Позначає користувачів, яким доставка неможлива (бот заблоковано, акаунт видалено).
+        Приймає {user_id: причина}; зберігає один раз на всю пачку."""
+        users = self.data.setdefault("users", {})
+        now = datetime.now().isoformat()
+        for user_id, reason in reasons.items():
+            user = users.get(str(user_id))
+            if not isinstance(user, dict):
+                continue
+            user["suppressed"] = {"reason": reason, "at": now}
+            self.segments.update(user_id, user)
+        if reasons:
+            self._save_data()
+
+    def unsuppress_user(self, user_id: int) -> bool:
+        """Повертає користувача в аудиторію розсилок. True, якщо він був у списку придушення."""
+        user = self.get_user(user_id)
+        if not isinstance(user, dict) or not user.pop("suppressed", None):
+            return False
+        self.segments.update(user_id, user)
+        self._save_data()
+        return True
+
     def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Отримує дані користувача."""
         return self.data.get("users", {}).get(str(user_id))
@@ -507,15 +545,10 @@ class AdminPanel:
         users = self.data.get("users", {})
         today_str = datetime.now().strftime("%Y-%m-%d")
         
-        verified_users = 0
-        in_verification = 0
-        
-        for user in users.values():
-            if isinstance(user, dict):
-                if user.get("is_registered") and user.get("has_deposit"):
-                    verified_users += 1
-                elif user.get("is_registered"):
-                    in_verification += 1
+        # Розміри сегментів підтримуються при кожній зміні користувача
+        sizes = self.segments.sizes()
+        verified_users = sizes[VERIFIED]
+        in_verification = sizes[IN_VERIFICATION]
 
         return {
             "total_starts": stats.get("total_starts", 0),
@@ -523,7 +556,9 @@ class AdminPanel:
             "signals_generated_today": stats.get("daily_signals", {}).get(today_str, 0),
             "total_users": len(users),
             "verified_users": verified_users,
-            "in_verification_users": in_verification
+            "in_verification_users": in_verification,
+            "reachable_users": sizes[REACHABLE],
+            "suppressed_users": sizes[SUPPRESSED]
         }
 
     # --- Управління користувачами ---
@@ -0,0 +1,204 @@
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set
+
+# Базовые сегменты аудитории
+ALL = "all"
+VERIFIED = "verified"                  # зарегистрирован и внёс депозит
+IN_VERIFICATION = "in_verification"    # зарегистрирован, депозита ещё нет
+SUPPRESSED = "suppressed"              # доставка невозможна: бот заблокирован, аккаунт удалён
+REACHABLE = "reachable"                # all - suppressed
+LANG_PREFIX = "lang:"                  # lang:ru, lang:en, ...
+ACTIVE_PREFIX = "active:"              # active:7 — заходили за последние 7 дней
+
+_TOKEN_RE = re.compile(r"\s*(?:([()&|\-])|([A-Za-z_]+(?::[A-Za-z0-9_]+)?))")
+
+
+class SegmentExpressionError(ValueError):
+    """Ошибка в выражении сегмента."""
+
+
+class AudienceSegments:
+    """
+    Сегменты аудитории в виде множеств user_id, поддерживаемые при каждом изменении
+    пользователя: выбор аудитории — O(размер сегмента), без обхода всей базы.
+
+    Активность хранится корзинами по дням (день -> множество user_id), поэтому
+    active:N — объединение N последних корзин.
+
+    Пользователи, которым доставка невозможна, попадают в suppressed;
+    reachable = all - suppressed — аудитория, до которой рассылка реально дойдёт.
+
+    Сегменты комбинируются выражениями: "verified & lang:en", "all - active:30",
+    "(in_verification | verified) & active:7". Операторы: | — объединение,
+    & — пересечение, - — разность; скобки задают порядок.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._sets: Dict[str, Set[int]] = {ALL: set(), VERIFIED: set(), IN_VERIFICATION: set(), SUPPRESSED: set()}
+        self._active_by_day: Dict[int, Set[int]] = {}
+        # Текущее членство пользователя, чтобы обновление стоило O(1)
+        self._membership: Dict[int, tuple] = {}
+
+    # --- Поддержание ---
+
+    def rebuild(self, users: Dict[str, Any]):
+        self._reset()
+        for user_id, user in users.items():
+            self.update(user_id, user)
+
+    @staticmethod
+    def _activity_day(user: Dict[str, Any]) -> Optional[int]:
+        stamp = user.get("last_seen") or user.get("last_activity") or user.get("first_seen")
+        if not stamp:
+            return None
+        try:
+            return datetime.fromisoformat(stamp).date().toordinal()
+        except (TypeError, ValueError):
+            return None
+
+    def _membership_of(self, user: Dict[str, Any]) -> tuple:
+        if user.get("is_registered") and user.get("has_deposit"):
+            status = VERIFIED
+        elif user.get("is_registered"):
+            status = IN_VERIFICATION
+        else:
+            status = None
+        return status, f"{LANG_PREFIX}{user.get('lang', 'ru')}", self._activity_day(user), bool(user.get("suppressed"))
+
+    def update(self, user_id: Any, user: Any):
+        """Пересчитывает членство одного пользователя после изменения его записи."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return  # Служебные/повреждённые ключи в базе в сегменты не попадают
+        if not isinstance(user, dict):
+            self.remove(user_id)
+            return
+        new = self._membership_of(user)
+        old = self._membership.get(user_id)
+        if old == new:
+            return
+        if old is not None:
+            self._discard(user_id, old)
+        self._sets[ALL].add(user_id)
+        status, lang, day, suppressed = new
+        if status:
+            self._sets[status].add(user_id)
+        if suppressed:
+            self._sets[SUPPRESSED].add(user_id)
+        self._sets.setdefault(lang, set()).add(user_id)
+        if day is not None:
+            self._active_by_day.setdefault(day, set()).add(user_id)
+        self._membership[user_id] = new
+
+    def _discard(self, user_id: int, membership: tuple):
+        status, lang, day, _ = membership
+        if status:
+            self._sets[status].discard(user_id)
+        self._sets[SUPPRESSED].discard(user_id)
+        self._sets.get(lang, set()).discard(user_id)
+        if day is not None:
+            bucket = self._active_by_day.get(day)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._active_by_day[day]
+
+    def remove(self, user_id: Any):
+        user_id = int(user_id)
+        membership = self._membership.pop(user_id, None)
+        if membership is not None:
+            self._discard(user_id, membership)
+        self._sets[ALL].discard(user_id)
+
+    # --- Чтение ---
+
+    def active_within(self, days: int) -> Set[int]:
+        since = date.today().toordinal() - max(days, 1) + 1
+        result: Set[int] = set()
+        for day, bucket in self._active_by_day.items():
+            if day >= since:
+                result |= bucket
+        return result
+
+    def get(self, name: str) -> Set[int]:
+        """Множество user_id сегмента. Возвращается копия — её можно менять."""
+        if name.startswith(ACTIVE_PREFIX):
+            try:
+                return self.active_within(int(name[len(ACTIVE_PREFIX):]))
+            except ValueError:
+                raise SegmentExpressionError(f"Неверное число дней в '{name}'")
+        if name.startswith(LANG_PREFIX):
+            return set(self._sets.get(name, ()))
+        if name == REACHABLE:
+            return self._sets[ALL] - self._sets[SUPPRESSED]
+        if name not in self._sets:
+            raise SegmentExpressionError(f"Неизвестный сегмент '{name}'")
+        return set(self._sets[name])
+
+    def names(self) -> List[str]:
+        return [ALL, REACHABLE, VERIFIED, IN_VERIFICATION, SUPPRESSED] + sorted(
+            n for n in self._sets if n.startswith(LANG_PREFIX)
+        )
+
+    def sizes(self) -> Dict[str, int]:
+        sizes = {name: len(self._sets[name]) for name in self.names() if name != REACHABLE}
+        sizes[REACHABLE] = sizes[ALL] - sizes[SUPPRESSED]
+        return {name: sizes[name] for name in self.names()}
+
+    # --- Выражения ---
+
+    def evaluate(self, expression: str) -> Set[int]:
+        """Вычисляет выражение над сегментами; бросает SegmentExpressionError."""
+        tokens = self._tokenize(expression)
+        if not tokens:
+            raise SegmentExpressionError("Пустое выражение")
+        result, pos = self._parse_union(tokens, 0)
+        if pos != len(tokens):
+            raise SegmentExpressionError(f"Лишний символ '{tokens[pos]}'")
+        return result
+
+    @staticmethod
+    def _tokenize(expression: str) -> List[str]:
+        tokens, pos = [], 0
+        expression = expression.strip()
+        while pos < len(expression):
+            match = _TOKEN_RE.match(expression, pos)
+            if not match or match.end() == pos:
+                raise SegmentExpressionError(f"Не удалось разобрать выражение с позиции {pos + 1}")
+            tokens.append(match.group(1) or match.group(2).lower())
+            pos = match.end()
+        return tokens
+
+    # union := inter (('|' | '-') inter)* ;  inter := atom ('&' atom)* ;  atom := name | '(' union ')'
+    def _parse_union(self, tokens: List[str], pos: int):
+        result, pos = self._parse_intersection(tokens, pos)
+        while pos < len(tokens) and tokens[pos] in ("|", "-"):
+            op = tokens[pos]
+            right, pos = self._parse_intersection(tokens, pos + 1)
+            result = result | right if op == "|" else result - right
+        return result, pos
+
+    def _parse_intersection(self, tokens: List[str], pos: int):
+        result, pos = self._parse_atom(tokens, pos)
+        while pos < len(tokens) and tokens[pos] == "&":
+            right, pos = self._parse_atom(tokens, pos + 1)
+            result &= right
+        return result, pos
+
+    def _parse_atom(self, tokens: List[str], pos: int):
+        if pos >= len(tokens):
+            raise SegmentExpressionError("Неожиданный конец выражения")
+        token = tokens[pos]
+        if token == "(":
+            result, pos = self._parse_union(tokens, pos + 1)
+            if pos >= len(tokens) or tokens[pos] != ")":
+                raise SegmentExpressionError("Не хватает ')'")
+            return result, pos + 1
+        if token in ("&", "|", "-", ")"):
+            raise SegmentExpressionError(f"Неожиданный символ '{token}'")
+        return self.get(token), pos + 1
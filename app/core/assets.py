@@ -0,0 +1,160 @@
+"""
+Реестр картинок из imagen/, которые бот отправляет пользователям.
+
+Обработчики и прогрев кеша при старте берут пути отсюда. Кеш file_id в AdminPanel
+привязан к содержимому файла (content_key), поэтому изменённая картинка
+загружается заново автоматически, а неизменённая всегда идёт по file_id.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.core.utils import compose_vertical_collage
+
+logger = logging.getLogger(__name__)
+
+IMAGEN_DIR = "imagen"
+
+# Экраны по ключу и языку (ru — для всех, кроме en)
+SCREENS: Dict[str, Dict[str, str]] = {
+    'start': {'ru': '2step_eng.png', 'en': '2step_ua.png'},
+    'market': {'ru': 'market_ua.png', 'en': 'market_eng.png'},
+    'currencypair': {'ru': 'currencypair_ua.png', 'en': 'currencypair_eu.png'},
+    'expirationtime': {'ru': 'expirationtime_ua.png', 'en': 'expirationtime_eng.png'},
+    'notregist': {'ru': 'dontregist_ua.png', 'en': 'notregist_eng.png'},
+    'notbalance': {'ru': 'notbalace_ua.png', 'en': 'notbalace_eng.png'},
+    'finish': {'ru': 'finish_ua.png', 'en': 'finish_eng.png'},
+    'twostep': {'ru': 'start_ua.png', 'en': 'start_eng.png'},
+    'buy': {'ru': 'Buy_ua.png', 'en': 'buy_eng.png'},
+    'sell': {'ru': 'sell_ua.png', 'en': 'sell_eng.png'},
+}
+FALLBACK = {'ru': 'start_ua.png', 'en': 'start_eng.png'}
+WELCOME = {'ru': '2step_ua.png', 'en': '2step_eng.png'}
+EDUCATION = {'ru': 'edic_ru.png', 'en': 'edic_eng.png'}
+
+# Шаги удаления аккаунта и коллаж из них (одно сообщение вместо альбома)
+DELETE_ACCOUNT_STEPS = ['image.png', 'image copy.png', 'image copy 2.png', 'image copy 3.png', 'image copy 4.png']
+DELETE_ACCOUNT_COLLAGE = {'ru': 'delete_account_help_ru.jpg', 'en': 'delete_account_help_en.jpg'}
+
+CONTENT_KEY_PREFIX = "sha256:"
+
+# path -> ((size, mtime_ns), ключ): хеш пересчитывается только после изменения файла
+_content_keys: Dict[str, Tuple[Tuple[int, int], str]] = {}
+# out_path -> ключ входов, из которых собран коллаж
+_collage_keys: Dict[str, str] = {}
+# out_path -> блокировка сборки (коллаж собирают из разных потоков to_thread)
+_collage_locks: Dict[str, threading.Lock] = {}
+_collage_locks_guard = threading.Lock()
+
+
+def content_key(path: str) -> Optional[str]:
+    """Ключ кеша file_id по содержимому файла; None, если файла нет."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    signature = (stat.st_size, stat.st_mtime_ns)
+    known = _content_keys.get(path)
+    if known and known[0] == signature:
+        return known[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    key = f"{CONTENT_KEY_PREFIX}{digest.hexdigest()}"
+    _content_keys[path] = (signature, key)
+    return key
+
+
+def asset_path(filename: str) -> str:
+    return f"{IMAGEN_DIR}/{filename}"
+
+
+def _locale(lang: str) -> str:
+    return 'en' if lang == 'en' else 'ru'
+
+
+def screen(key: str, lang: str) -> str:
+    filename = SCREENS.get(key, {}).get(_locale(lang))
+    return asset_path(filename or FALLBACK[_locale(lang)])
+
+
+def fallback_image(lang: str) -> str:
+    return asset_path(FALLBACK[_locale(lang)])
+
+
+def welcome_image(lang: str) -> str:
+    return asset_path(WELCOME[_locale(lang)])
+
+
+def education_image(lang: str) -> str:
+    path = asset_path(EDUCATION[_locale(lang)])
+    return path if os.path.exists(path) else screen('currencypair', lang)
+
+
+def delete_account_steps() -> List[str]:
+    return [path for path in map(asset_path, DELETE_ACCOUNT_STEPS) if os.path.exists(path)]
+
+
+def delete_account_collage(lang: str) -> str:
+    return asset_path(DELETE_ACCOUNT_COLLAGE[_locale(lang)])
+
+
+def static_images() -> List[str]:
+    """Все существующие на диске картинки, которые отправляются как есть (шаги — только в коллаже)."""
+    names = {filename for variants in SCREENS.values() for filename in variants.values()}
+    names |= set(FALLBACK.values()) | set(WELCOME.values()) | set(EDUCATION.values())
+    return sorted(path for path in map(asset_path, names) if os.path.exists(path))
+
+
+def _collage_key(image_paths: List[str], max_width: int, spacing: int) -> str:
+    parts = [content_key(path) or f"missing:{path}" for path in image_paths] + [f"w={max_width}", f"s={spacing}"]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def build_collage(image_paths: List[str], out_path: str, max_width: int = 1280, spacing: int = 8) -> str:
+    """
+    compose_vertical_collage с мемоизацией: коллаж пересобирается, только если
+    изменились входные картинки или параметры. Ключ входов хранится рядом
+    с файлом (<out_path>.inputs), поэтому переживает перезапуск. Блокирующая
+    функция — из async вызывать через to_thread; одновременные вызовы для одного
+    out_path выполняются по очереди.
+    """
+    with _collage_locks_guard:
+        lock = _collage_locks.setdefault(out_path, threading.Lock())
+    with lock:
+        key = _collage_key(image_paths, max_width, spacing)
+        marker_path = f"{out_path}.inputs"
+        if out_path not in _collage_keys and os.path.exists(marker_path):
+            with open(marker_path, "r", encoding="utf-8") as f:
+                _collage_keys[out_path] = f.read().strip()
+        if _collage_keys.get(out_path) == key and os.path.exists(out_path):
+            return out_path
+        compose_vertical_collage(image_paths, out_path, max_width=max_width, spacing=spacing)
+        tmp_path = f"{marker_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(key)
+        os.replace(tmp_path, marker_path)
+        _collage_keys[out_path] = key
+        return out_path
+
+
+def ready_delete_account_collage(lang: str) -> Optional[str]:
+    """Коллаж шагов удаления аккаунта; первый шаг, если склейка не удалась; None без картинок."""
+    steps = delete_account_steps()
+    if not steps:
+        return None
+    try:
+        return build_collage(steps, delete_account_collage(lang), max_width=1280)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось собрать коллаж {delete_account_collage(lang)}: {e}")
+        return steps[0]
+
+
+def build_collages() -> List[str]:
+    """Готовит коллажи для всех языков; возвращает пути (без повторов)."""
+    paths = (ready_delete_account_collage(lang) for lang in DELETE_ACCOUNT_COLLAGE)
+    return list(dict.fromkeys(path for path in paths if path))
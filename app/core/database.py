@@ -12,6 +12,9 @@ def create_or_update_user(user_id: int, username: Optional[str] = None):
     if is_new:
         # Засчитываем старт только при первом появлении пользователя
         admin_panel.increment_start_count()
+    elif admin_panel.unsuppress_user(user_id):
+        # Пользователь снова написал боту — значит, доставка снова возможна
+        logger.info(f"Користувач {user_id} повернувся, знято зі списку придушення розсилок.")
 
 
 def set_user_registered(user_id: int, is_registered: bool):
@@ -5,6 +5,11 @@ from dotenv import load_dotenv
 from app.admin.admin_panel import AdminPanel
 from app.services.telethon_code import telethon_client  # Import the instance directly
 from app.services.trading_api import TradingAPI
+from app.services.bulk_verification import BulkReverification
+from app.services.deposit_watcher import DepositWatcher
+from app.services.postback_server import PostbackServer
+from app.services.broadcast import BroadcastEngine
+from app.services.asset_prewarm import AssetPrewarmer
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
@@ -37,4 +42,19 @@ admin_panel = AdminPanel(admin_ids=admin_ids_list)
 # Инициализация Trading API
 trading_api = TradingAPI()
 trading_api.set_admin_panel(admin_panel)
-trading_api.set_telethon_client(telethon_client) # Pass the wrapper instance
\ No newline at end of file
+trading_api.set_telethon_client(telethon_client) # Pass the wrapper instance
+
+# Массовая перепроверка депозитов (возобновляется после перезапуска)
+bulk_reverification = BulkReverification(bot, trading_api, admin_panel)
+
+# Фоновое ожидание депозита после регистрации
+deposit_watcher = DepositWatcher(bot, trading_api, admin_panel, storage=storage)
+
+# Приёмник постбэков партнёрской программы (запускается, если задан POSTBACK_SECRET)
+postback_server = PostbackServer(trading_api, admin_panel, deposit_watcher)
+
+# Рассылки администратора (общий token bucket на все отправители)
+broadcast_engine = BroadcastEngine(bot, admin_panel)
+
+# Прогрев кеша file_id картинок при старте (если задан ASSET_STORAGE_CHAT_ID)
+asset_prewarmer = AssetPrewarmer(bot, admin_panel)
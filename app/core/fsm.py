@@ -37,6 +37,9 @@ class Admin(StatesGroup):
     view_stats = State()
     send_broadcast = State()
     send_verified_broadcast = State()
+    enter_segment_expression = State()
+    send_segment_broadcast = State()
+    send_broadcast_en_variant = State()
     confirm_broadcast = State()
     add_admin = State()
     remove_admin = State() 
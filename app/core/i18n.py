@@ -59,6 +59,7 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
 		"admin.back_to_panel": "⬅️ Назад в админ-панель",
 		"admin.broadcast.all_users": "👥 Всем пользователям",
 		"admin.broadcast.verified_only": "✅ Только верифицированным",
+		"admin.broadcast.segment": "🎯 По сегменту",
 		"admin.settings.welcome": "👋 Приветствие",
 		"admin.settings.referral": "🔗 Реферальные настройки",
 		"admin.settings.finish_msg": "🎉 Сообщение после верификации",
@@ -112,6 +113,10 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
 		"deposit.checking": "⏳ Спасибо, проверяю информацию о вашем депозите...",
 		"deposit.no_uid": "❌ <b>Ошибка:</b> Не удалось получить ID аккаунта. Попробуйте ещё раз.",
 		"deposit.too_low": "❌ Похоже, ваш счёт ещё не пополнен на необходимую сумму.\n\nПожалуйста, убедитесь, что депозит не менее <b>${min_deposit}</b> и попробуйте ещё раз.",
+		"deposit.confirmed_notice": "✅ Мы увидели ваш депозит — доступ к сигналам и закрытой группе открыт!",
+		"verify.queue_position": "⏳ Вы в очереди на проверку: {position}-й. Пожалуйста, подождите...",
+		"verify.queue_busy": "⏳ Сейчас проходит очень много проверок. Пожалуйста, попробуйте ещё раз через минуту.",
+		"deposit.watching": "⏳ Депозит пока не виден. Мы уже проверяем ваш аккаунт и пришлём сообщение, как только пополнение появится — больше ничего нажимать не нужно.",
 
 		"signals.menu_caption": "Вы можете начинать пользоваться сигналами. Выберите рынок для начала.",
 		"verify.i_registered": "✅ Я зарегистрировался!",
@@ -180,6 +185,7 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
 		"admin.back_to_panel": "⬅️ Back to admin panel",
 		"admin.broadcast.all_users": "👥 All users",
 		"admin.broadcast.verified_only": "✅ Verified only",
+		"admin.broadcast.segment": "🎯 By segment",
 		"admin.settings.welcome": "👋 Welcome message",
 		"admin.settings.referral": "🔗 Referral settings",
 		"admin.settings.finish_msg": "🎉 Finish message",
@@ -225,6 +231,10 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
 
 		"deposit.checking": "⏳ Thanks, checking your deposit info...",
 		"deposit.no_uid": "❌ <b>Error:</b> Could not get the account ID. Please try again.",
+		"deposit.confirmed_notice": "✅ We have seen your deposit — access to the signals and the private group is now open!",
+		"verify.queue_position": "⏳ You are in the verification queue: #{position}. Please wait...",
+		"verify.queue_busy": "⏳ There are too many checks right now. Please try again in a minute.",
+		"deposit.watching": "⏳ We don't see the deposit yet. Your account is already being checked and we will message you as soon as the deposit appears — no need to press anything else.",
 		"deposit.too_low": "You have not funded your balance, or your account has less than <b>${min_deposit}</b> ❌\n\nTo join the private group you need at least <b>${min_deposit}</b> on your trading account! You have 2 more attempts to fund your trading account.\n\nYou will get:\n\n🔗 Personal trading with BotX in a private VIP channel — daily.\n🔗 Daily market news and analytics.\n🔗 Access to BotX BOT that gives around 10,000 forecasts for FIN and OTC assets every day!\n🔗 Private educational materials for faster learning.\n\nIf you have already deposited at least <b>${min_deposit}</b>, press the ‘Account funded’ button to get instant access to the private group ✔️\n\n<b>IMPORTANT FACT:</b> During the first three days the average profit of a new partner is from $35 to $150!",
 
 		"signals.menu_caption": "You can start using signals. Choose a market to begin.",
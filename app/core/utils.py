@@ -4,8 +4,10 @@ import random
 from datetime import datetime, timedelta
 import locale
 import asyncio
+import json
 import logging
 import os
+import time
 import pytz
 from loguru import logger
 from functools import wraps
@@ -13,6 +15,92 @@ from PIL import Image
 
 logger = logging.getLogger(__name__)
 
+def env_int(name: str, default: int, minimum: int | None = None) -> int:
+    """Читает целое число из переменной окружения, при ошибке возвращает default."""
+    try:
+        value = int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        value = default
+    if minimum is not None:
+        value = max(minimum, value)
+    return value
+
+def env_float(name: str, default: float, minimum: float | None = None) -> float:
+    """Читает число с плавающей точкой из переменной окружения, при ошибке возвращает default."""
+    try:
+        value = float(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        value = default
+    if minimum is not None:
+        value = max(minimum, value)
+    return value
+
+def load_json_state(path: str, what: str) -> dict:
+    """Читает состояние сервиса из JSON; {} если файла нет или он повреждён (what — что это, для лога)."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, json.JSONDecodeError) as e:
+        logger.error(f"Не удалось загрузить {what} из {path}: {e}")
+        return {}
+
+def save_json_state(path: str, data, what: str):
+    """Атомарная запись JSON: временный файл + os.replace."""
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except (IOError, OSError) as e:
+        logger.error(f"Не удалось сохранить {what} в {path}: {e}")
+
+class AsyncTokenBucket:
+    """
+    Асинхронный token bucket: не более rate операций в секунду с всплеском до capacity.
+    block_for() приостанавливает всех ожидающих (например, после FloodWait от Telegram).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Ждёт, пока можно выполнить операцию. Ожидающие обслуживаются по очереди."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def block_for(self, seconds: float):
+        """Запрещает операции на seconds секунд и обнуляет накопленный запас."""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._refill(now)
+        self.tokens = 0.0
+
+    @property
+    def blocked_for(self) -> float:
+        """Сколько секунд ещё действует блокировка (0, если её нет)."""
+        return max(0.0, self._blocked_until - time.monotonic())
+
 def async_retry(max_retries=3, delay=2, allowed_exceptions=()):
     """
     A decorator to retry an async function if it fails.
@@ -52,46 +140,102 @@ async def check_api_initialized(message: Message) -> bool:
             return False
     return True 
 
+async def _upload_file(photo_path: str) -> FSInputFile:
+    """File to upload instead of photo_path: its optimized variant from the asset pipeline."""
+    from app.services import asset_pipeline
+    return FSInputFile(await asyncio.to_thread(asset_pipeline.optimize, photo_path))
+
+# Ошибки edit_message_media, после которых экран можно показать только новым сообщением
+EDIT_FALLBACK_ERRORS = (
+    "there is no media in the message to edit",
+    "message can't be edited",
+    "message to edit not found",
+    "message_id_invalid",
+)
+
+# Как проходят смены экранов: на месте, без изменений или через удаление и новую отправку
+screen_transition_stats = {"edited": 0, "not_modified": 0, "fallback": 0}
+
+def screen_transition_metrics() -> dict:
+    total = sum(screen_transition_stats.values())
+    return dict(screen_transition_stats, fallback_rate=screen_transition_stats["fallback"] / total if total else 0.0)
+
+async def _edit_screen_photo(
+    message: Message,
+    photo_filename: str,
+    caption: str,
+    reply_markup: object = None,
+    parse_mode: str = "HTML",
+    file_id: str | None = None
+):
+    """
+    Screen transition in one call: edit_message_media swaps the photo, caption and
+    keyboard of the existing message. Only when Telegram cannot edit this message
+    (text message, too old, already gone) it falls back to delete + send_photo.
+    """
+    from app.core.dispatcher import admin_panel
+    photo_path = os.path.abspath(photo_filename)
+    media = InputMediaPhoto(
+        media=file_id if file_id else await _upload_file(photo_path), caption=caption, parse_mode=parse_mode
+    )
+    try:
+        edited = await message.edit_media(media, reply_markup=reply_markup)
+        screen_transition_stats["edited"] += 1
+        if file_id is None and isinstance(edited, Message) and edited.photo:
+            admin_panel.set_file_id(photo_filename, edited.photo[-1].file_id)
+        return edited if isinstance(edited, Message) else message
+    except TelegramBadRequest as e:
+        error = str(e).lower()
+        if "message is not modified" in error:
+            screen_transition_stats["not_modified"] += 1
+            return message
+        if not any(marker in error for marker in EDIT_FALLBACK_ERRORS):
+            raise
+        screen_transition_stats["fallback"] += 1
+        logger.debug(f"Screen edit fell back to delete+send: {e}")
+
+    try:
+        await message.delete()
+    except TelegramBadRequest as e:
+        # If the message is already gone, that's fine.
+        if "message to delete not found" not in str(e):
+            logger.warning(f"Could not delete message before sending new one: {e}")
+    sent_message = await message.bot.send_photo(
+        chat_id=message.chat.id,
+        photo=media.media,
+        caption=caption,
+        reply_markup=reply_markup,
+        parse_mode=parse_mode
+    )
+    if file_id is None and sent_message.photo:
+        admin_panel.set_file_id(photo_filename, sent_message.photo[-1].file_id)
+    return sent_message
+
 async def _send_photo_with_caching(
     message: Message,
     photo_filename: str,
     caption: str,
     reply_markup: object = None,
     edit: bool = False,
-    parse_mode: str = "HTML"
+    parse_mode: str = "HTML",
+    file_id: str | None = None
 ):
     """
     Sends a photo, using a cached file_id if available.
-    If edit is True, it tries to edit the existing message.
-    If editing fails, it deletes the old message and sends a new one.
+    If edit is True, the existing message is turned into this screen in place
+    (see _edit_screen_photo).
+    A file_id already resolved by the caller skips the cache lookup.
+    Uploads use the optimized variant of the file (resized progressive JPEG).
     """
     from app.core.dispatcher import admin_panel
-    file_id = admin_panel.get_file_id(photo_filename)
+    if file_id is None:
+        file_id = admin_panel.get_file_id(photo_filename)
     # The script runs from the root, so we can just use the filename.
     # To be safe, we ensure it's an absolute path from the current working directory.
     photo_path = os.path.abspath(photo_filename)
 
-    # --- New logic: Always delete and send for 'edit' to avoid race conditions ---
     if edit:
-        try:
-            # First, try to delete the message this interaction came from.
-            # This is often cleaner than trying to edit it, especially if it's a photo.
-            await message.delete()
-        except TelegramBadRequest as e:
-            # If the message is already gone, that's fine.
-            # We only log a warning for other, unexpected errors.
-            if "message to delete not found" not in str(e):
-                logger.warning(f"Could not delete message before sending new one: {e}")
-        
-        # Now, send a new message in the same chat.
-        # We need to use message.chat.id because the original message is gone.
-        return await message.bot.send_photo(
-            chat_id=message.chat.id,
-            photo=FSInputFile(photo_path) if file_id is None else file_id,
-            caption=caption,
-            reply_markup=reply_markup,
-            parse_mode=parse_mode
-        )
+        return await _edit_screen_photo(message, photo_filename, caption, reply_markup, parse_mode, file_id)
 
     # --- Original logic for sending a new message ---
     if file_id:
@@ -110,7 +254,7 @@ async def _send_photo_with_caching(
     # Send as a new file and cache the ID
     try:
         sent_message = await message.answer_photo(
-            photo=FSInputFile(photo_path),
+            photo=await _upload_file(photo_path),
             caption=caption,
             reply_markup=reply_markup,
             parse_mode=parse_mode
@@ -140,7 +284,7 @@ async def _send_album_with_caching(
         if cached_id:
             media.append(InputMediaPhoto(media=cached_id, caption=caption if idx == 0 else None, parse_mode=parse_mode))
         else:
-            media.append(InputMediaPhoto(media=FSInputFile(abs_path), caption=caption if idx == 0 else None, parse_mode=parse_mode))
+            media.append(InputMediaPhoto(media=await _upload_file(abs_path), caption=caption if idx == 0 else None, parse_mode=parse_mode))
     try:
         sent_messages = await message.bot.send_media_group(chat_id=message.chat.id, media=media)
         # Кэшируем file_id
@@ -216,7 +360,14 @@ def compose_vertical_collage(image_paths: list[str], out_path: str, max_width: i
             y += spacing
 
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    canvas.save(out_path, format="JPEG", quality=90)
+    # Атомарная запись: читатель никогда не увидит недописанный файл
+    tmp_path = f"{out_path}.tmp"
+    try:
+        canvas.save(tmp_path, format="JPEG", quality=90)
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
     return out_path
 
 def _format_asset_name(asset: str) -> str:
@@ -17,17 +17,25 @@ from aiogram.exceptions import TelegramBadRequest
 
 logger = logging.getLogger(__name__)
 
-from app.core.dispatcher import dp, bot, admin_panel, trading_api
+from app.core.dispatcher import dp, admin_panel, trading_api, bulk_reverification, deposit_watcher, broadcast_engine
 from app.core.keyboards import (
     get_referral_settings_keyboard, 
     get_cancel_keyboard,
     get_back_to_panel_keyboard, 
 )
 from app.core.fsm import Admin, AuthStates
-import app.core.database as db
 from app.handlers.user_handlers import show_signal_menu
 from app.services.telethon_code import telethon_client
+from app.services.bulk_verification import STOPPED
+from app.services.broadcast import (
+    RUNNING as BROADCAST_RUNNING,
+    PAUSED as BROADCAST_PAUSED,
+    DEFAULT_LANG as BROADCAST_DEFAULT_LANG,
+    variant_from_messages,
+)
+from app.admin.segments import SegmentExpressionError, ALL as SEGMENT_ALL, VERIFIED as SEGMENT_VERIFIED
 from app.core.i18n import t
+from app.core.utils import screen_transition_metrics
 
 
 router = Router()
@@ -144,6 +152,7 @@ async def show_stats_command(message: Message):
         return
 
     stats = admin_panel.get_statistics()
+    cache = trading_api.verification_cache.metrics()
     
     stats_message = (
         "📊 <b>Статистика бота</b>\n\n"
@@ -151,8 +160,10 @@ async def show_stats_command(message: Message):
         f"🚀 Натискання /start: {stats['total_starts']}\n"
         f"✅ Верифіковані користувачі: {stats['verified_users']}\n"
         f"⏳ Користувачі в процесі верифікації: {stats['in_verification_users']}\n"
+        f"📬 Досяжна аудиторія розсилок: {stats['reachable_users']} (недоступні: {stats['suppressed_users']})\n"
         f"📈 Згенеровано сигналів (сьогодні): {stats['signals_generated_today']}\n"
-        f"📈 Згенеровано сигналів (всього): {stats['signals_generated_total']}"
+        f"📈 Згенеровано сигналів (всього): {stats['signals_generated_total']}\n"
+        f"🗂 Кеш верифікації: {cache['size']} записів, влучання {cache['hits']}/{cache['hits'] + cache['misses']} ({cache['hit_rate']:.0%})"
     )
     
     await message.answer(stats_message, parse_mode="HTML")
@@ -226,6 +237,10 @@ async def process_new_maintenance_message(message: Message, state: FSMContext):
 async def show_admin_stats(callback: CallbackQuery):
     """Показує статистику бота."""
     stats = admin_panel.get_statistics()
+    cache = trading_api.verification_cache.metrics()
+    watcher = deposit_watcher.metrics()
+    sessions = telethon_client.snapshot()
+    screens = screen_transition_metrics()
     
     stats_text = (
         "📊 <b>Статистика бота</b>\n\n"
@@ -233,8 +248,15 @@ async def show_admin_stats(callback: CallbackQuery):
         f"🚀 Нажатий /start: {stats['total_starts']}\n"
         f"✅ Верифицированные пользователи: {stats['verified_users']}\n"
         f"⏳ Пользователи в процессе верификации: {stats['in_verification_users']}\n"
+        f"📬 Достижимая аудитория рассылок: {stats['reachable_users']} (недоступны: {stats['suppressed_users']})\n"
         f"📈 Сгенерировано сигналов (сегодня): {stats['signals_generated_today']}\n"
-        f"📈 Сгенерировано сигналов (всего): {stats['signals_generated_total']}"
+        f"📈 Сгенерировано сигналов (всего): {stats['signals_generated_total']}\n"
+        f"🗂 Кеш верификации: {cache['size']} записей, попаданий {cache['hits']}/{cache['hits'] + cache['misses']} ({cache['hit_rate']:.0%})\n"
+        f"👀 Ожидают депозита под наблюдением: {watcher['watched']}, найдено депозитов: {watcher['confirmed']}\n"
+        f"📨 Сессии Telethon: {sum(1 for s in sessions if s['connected'])}/{len(sessions)} активны, "
+        f"в FloodWait: {sum(1 for s in sessions if s['flood_blocked_for'] > 0)}\n"
+        f"🖼 Смены экранов: на месте {screens['edited']}, без изменений {screens['not_modified']}, "
+        f"через удаление и отправку {screens['fallback']} ({screens['fallback_rate']:.0%})"
     )
     
     try:
@@ -250,22 +272,116 @@ async def show_admin_stats(callback: CallbackQuery):
         await callback.answer()
 # endregion
 
+# region Bulk re-verification
+def _bulk_reverify_keyboard() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    if bulk_reverification.is_running:
+        builder.row(InlineKeyboardButton(text="⏹ Остановить", callback_data="admin_bulk_reverify_stop"))
+    else:
+        if bulk_reverification.state.get("status") == STOPPED:
+            builder.row(InlineKeyboardButton(text="⏯ Продолжить", callback_data="admin_bulk_reverify_resume"))
+        builder.row(InlineKeyboardButton(text="▶️ Запустить с уведомлением", callback_data="admin_bulk_reverify_start:1"))
+        builder.row(InlineKeyboardButton(text="▶️ Запустить без уведомления", callback_data="admin_bulk_reverify_start:0"))
+    builder.row(InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_bulk_reverify"))
+    builder.row(InlineKeyboardButton(text=t("admin.back_to_panel", "ru"), callback_data="admin_panel"))
+    return builder.as_markup()
+
+async def _render_bulk_reverify_menu(message: Message):
+    text = (
+        f"{bulk_reverification.progress_text()}\n\n"
+        f"Сейчас ожидают подтверждения депозита: {len(bulk_reverification.candidates())}"
+    )
+    try:
+        await message.edit_text(text, reply_markup=_bulk_reverify_keyboard(), parse_mode="HTML")
+    except TelegramBadRequest:
+        pass  # Текст не изменился
+
+@router.callback_query(F.data == "admin_bulk_reverify")
+async def bulk_reverify_menu(callback: CallbackQuery):
+    """Показывает меню массовой перепроверки депозитов."""
+    await _render_bulk_reverify_menu(callback.message)
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("admin_bulk_reverify_start:"))
+async def bulk_reverify_start(callback: CallbackQuery):
+    """Запускает массовую перепроверку депозитов."""
+    notify = callback.data.split(":")[1] == "1"
+    started = await bulk_reverification.start(callback.message.chat.id, notify)
+    await callback.answer("Перепроверка запущена." if started else "Перепроверка уже выполняется.", show_alert=not started)
+    await _render_bulk_reverify_menu(callback.message)
+
+@router.callback_query(F.data == "admin_bulk_reverify_stop")
+async def bulk_reverify_stop(callback: CallbackQuery):
+    """Останавливает массовую перепроверку."""
+    bulk_reverification.stop()
+    await callback.answer("Перепроверка остановлена.")
+    await _render_bulk_reverify_menu(callback.message)
+
+@router.callback_query(F.data == "admin_bulk_reverify_resume")
+async def bulk_reverify_resume(callback: CallbackQuery):
+    """Продолжает остановленную перепроверку."""
+    resumed = bulk_reverification.resume()
+    await callback.answer("Перепроверка продолжена." if resumed else "Нечего продолжать.")
+    await _render_bulk_reverify_menu(callback.message)
+# endregion
+
 # region Broadcast
 @router.callback_query(F.data == 'admin_broadcast_menu')
 async def broadcast_menu(callback: CallbackQuery, state: FSMContext):
-    """Показує меню вибору типу розсилки."""
+    """Показує меню вибору типу розсилки або незавершену розсилку."""
+    if broadcast_engine.job.get("status") in (BROADCAST_RUNNING, BROADCAST_PAUSED):
+        await callback.message.edit_text(
+            broadcast_engine.progress_text(),
+            reply_markup=broadcast_engine.progress_keyboard(),
+            parse_mode="HTML"
+        )
+        return
     await callback.message.edit_text(
         "📨 <b>Рассылка</b>\n\nВыберите, кому отправить сообщение:",
         reply_markup=admin_panel.get_broadcast_keyboard(),
         parse_mode="HTML"
     )
 
+@router.callback_query(F.data == 'admin_broadcast_pause')
+async def pause_broadcast(callback: CallbackQuery):
+    """Ставит текущую рассылку на паузу (уже начатые отправки завершаются)."""
+    if not broadcast_engine.is_running:
+        await callback.answer("Рассылка не выполняется.")
+        return
+    await callback.answer("Останавливаю рассылку...")
+    await broadcast_engine.pause()
+
+@router.callback_query(F.data == 'admin_broadcast_resume')
+async def resume_broadcast(callback: CallbackQuery):
+    """Продолжает рассылку с места остановки."""
+    resumed = broadcast_engine.resume()
+    await callback.answer("Рассылка продолжена." if resumed else "Нечего продолжать.")
+    if resumed:
+        try:
+            await callback.message.edit_text(
+                broadcast_engine.progress_text(),
+                reply_markup=broadcast_engine.progress_keyboard(),
+                parse_mode="HTML"
+            )
+        except TelegramBadRequest:
+            pass
+
+@router.callback_query(F.data == 'admin_broadcast_cancel')
+async def cancel_broadcast(callback: CallbackQuery):
+    """Отменяет текущую рассылку; оставшиеся получатели её не получат."""
+    if broadcast_engine.job.get("status") not in (BROADCAST_RUNNING, BROADCAST_PAUSED):
+        await callback.answer("Нечего отменять.")
+        return
+    await callback.answer("Отменяю рассылку...")
+    await broadcast_engine.cancel()
+
 @router.callback_query(F.data == 'admin_broadcast_all')
 async def start_broadcast_all(callback: CallbackQuery, state: FSMContext):
     """Починає процес розсилки для всіх."""
     await state.set_state(Admin.send_broadcast)
     await callback.message.edit_text(
-        "📨 Введите сообщение для рассылки. Оно будет отправлено <b>всем</b> пользователям бота.",
+        "📨 Отправьте сообщение для рассылки (текст, фото, альбом или документ). "
+        "Оно будет отправлено <b>всем</b> пользователям бота.",
         reply_markup=get_cancel_keyboard("admin_broadcast_menu"),
         parse_mode="HTML"
     )
@@ -275,49 +391,135 @@ async def start_broadcast_verified(callback: CallbackQuery, state: FSMContext):
     """Починає процес розсилки для верифікованих."""
     await state.set_state(Admin.send_verified_broadcast)
     await callback.message.edit_text(
-        "📨 Введите сообщение для рассылки. Оно будет отправлено только <b>верифицированным</b> пользователям.",
+        "📨 Отправьте сообщение для рассылки (текст, фото, альбом или документ). "
+        "Оно будет отправлено только <b>верифицированным</b> пользователям.",
         reply_markup=get_cancel_keyboard("admin_broadcast_menu"),
         parse_mode="HTML"
     )
 
-@router.message(StateFilter(Admin.send_broadcast), F.text)
-async def process_broadcast_message(message: Message, state: FSMContext):
-    """Надсилає розсилку всім користувачам."""
-    users = db.get_all_users()
-    await send_messages_to_users(message, state, list(users.keys()))
+@router.callback_query(F.data == 'admin_broadcast_segment')
+async def start_broadcast_segment(callback: CallbackQuery, state: FSMContext):
+    """Просить вираз сегмента аудиторії."""
+    await state.set_state(Admin.enter_segment_expression)
+    sizes = "\n".join(f"• <code>{name}</code> — {size}" for name, size in admin_panel.segments.sizes().items())
+    await callback.message.edit_text(
+        "🎯 <b>Рассылка по сегменту</b>\n\n"
+        f"Сегменты:\n{sizes}\n• <code>active:N</code> — заходили за последние N дней\n\n"
+        "Операторы: <code>|</code> объединение, <code>&amp;</code> пересечение, <code>-</code> разность, скобки.\n"
+        "Например: <code>verified &amp; lang:en</code> или <code>in_verification - active:30</code>\n\n"
+        "✍️ Введите выражение:",
+        reply_markup=get_cancel_keyboard("admin_broadcast_menu"),
+        parse_mode="HTML"
+    )
 
-@router.message(StateFilter(Admin.send_verified_broadcast), F.text)
-async def process_verified_broadcast_message(message: Message, state: FSMContext):
-    """Надсилає розсилку верифікованим користувачам."""
-    all_users = db.get_all_users()
-    verified_user_ids = [uid for uid, udata in all_users.items() if db.is_fully_verified(int(uid))]
-    await send_messages_to_users(message, state, verified_user_ids)
-
-async def send_messages_to_users(message: Message, state: FSMContext, user_ids: list):
-    """Відправляє повідомлення заданому списку користувачів."""
-    total_users = len(user_ids)
-    count = 0
-    errors = 0
-    
-    await message.answer(f"⏳ Починаю розсилку для <b>{total_users}</b> користувачів...", parse_mode="HTML")
-    
-    for user_id in user_ids:
-        try:
-            await bot.send_message(user_id, message.text, parse_mode="HTML")
-            count += 1
-            await asyncio.sleep(0.1)  # Невелика затримка
-        except Exception as e:
-            errors += 1
-            logger.warning(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
-            
+@router.message(StateFilter(Admin.enter_segment_expression), F.text)
+async def process_segment_expression(message: Message, state: FSMContext):
+    """Обчислює сегмент і просить текст розсилки."""
+    try:
+        recipients = admin_panel.segments.evaluate(message.text)
+    except SegmentExpressionError as e:
+        await message.answer(f"⚠️ {e}. Попробуйте ещё раз.", reply_markup=get_cancel_keyboard("admin_broadcast_menu"))
+        return
+    await state.update_data(segment_expression=message.text.strip(), segment_recipients=sorted(recipients))
+    await state.set_state(Admin.send_segment_broadcast)
     await message.answer(
-        f"✅ <b>Рассылка завершена.</b>\n\n"
-        f"📥 Отправлено: <b>{count}</b> из {total_users}\n"
-        f"❌ Ошибок: <b>{errors}</b>",
-        reply_markup=admin_panel.get_admin_keyboard(),
+        f"🎯 В сегменте <b>{len(recipients)}</b> пользователей.\n\n📨 Отправьте сообщение для рассылки (текст, фото, альбом или документ):",
+        reply_markup=get_cancel_keyboard("admin_broadcast_menu"),
         parse_mode="HTML"
     )
+
+# Сообщения альбома приходят отдельными апдейтами: собираем их по media_group_id
+ALBUM_COLLECT_SECS = 1.0
+_album_buffer: dict = {}
+
+async def _collect_broadcast_messages(message: Message) -> list | None:
+    """Повертає всі повідомлення альбому (або одне повідомлення); None — для решти частин альбому."""
+    if not message.media_group_id:
+        return [message]
+    key = (message.chat.id, message.media_group_id)
+    if key in _album_buffer:
+        _album_buffer[key].append(message)
+        return None
+    _album_buffer[key] = [message]
+    await asyncio.sleep(ALBUM_COLLECT_SECS)
+    return sorted(_album_buffer.pop(key), key=lambda m: m.message_id)
+
+async def _accept_broadcast_content(message: Message, state: FSMContext, user_ids, target: str):
+    """Зберігає основний (RU) варіант розсилки і просить EN-варіант."""
+    messages = await _collect_broadcast_messages(message)
+    if messages is None:
+        return
+    variant = variant_from_messages(messages)
+    if variant is None:
+        await message.answer(
+            "⚠️ Поддерживаются текст, фото, альбом и документ. Отправьте сообщение ещё раз.",
+            reply_markup=get_cancel_keyboard("admin_broadcast_menu")
+        )
+        return
+    await state.update_data(
+        broadcast_recipients=sorted(user_ids), broadcast_target=target, broadcast_variants={BROADCAST_DEFAULT_LANG: variant}
+    )
+    await state.set_state(Admin.send_broadcast_en_variant)
+    kb = InlineKeyboardBuilder()
+    kb.row(InlineKeyboardButton(text="➡️ Отправить всем этот вариант", callback_data="admin_broadcast_send"))
+    kb.row(InlineKeyboardButton(text=t("back.back", "ru"), callback_data="admin_broadcast_menu"))
+    await message.answer(
+        "🇬🇧 Отправьте вариант для пользователей с английским языком (текст, фото, альбом или документ) "
+        "или разошлите всем этот вариант.",
+        reply_markup=kb.as_markup()
+    )
+
+@router.message(StateFilter(Admin.send_broadcast))
+async def process_broadcast_message(message: Message, state: FSMContext):
+    """Приймає розсилку для всіх користувачів."""
+    await _accept_broadcast_content(message, state, admin_panel.segments.get(SEGMENT_ALL), "all")
+
+@router.message(StateFilter(Admin.send_verified_broadcast))
+async def process_verified_broadcast_message(message: Message, state: FSMContext):
+    """Приймає розсилку для верифікованих користувачів."""
+    await _accept_broadcast_content(message, state, admin_panel.segments.get(SEGMENT_VERIFIED), "verified")
+
+@router.message(StateFilter(Admin.send_segment_broadcast))
+async def process_segment_broadcast_message(message: Message, state: FSMContext):
+    """Приймає розсилку для обраного сегмента."""
+    data = await state.get_data()
+    await _accept_broadcast_content(
+        message, state, data.get("segment_recipients", []), data.get("segment_expression", "segment")
+    )
+
+@router.message(StateFilter(Admin.send_broadcast_en_variant))
+async def process_broadcast_en_variant(message: Message, state: FSMContext):
+    """Приймає EN-варіант і запускає розсилку."""
+    messages = await _collect_broadcast_messages(message)
+    if messages is None:
+        return
+    variant = variant_from_messages(messages)
+    if variant is None:
+        await message.answer("⚠️ Поддерживаются текст, фото, альбом и документ. Отправьте сообщение ещё раз.")
+        return
+    data = await state.get_data()
+    variants = dict(data.get("broadcast_variants", {}), en=variant)
+    await send_messages_to_users(message, state, data.get("broadcast_recipients", []), variants, data.get("broadcast_target", "all"))
+
+@router.callback_query(F.data == "admin_broadcast_send", StateFilter(Admin.send_broadcast_en_variant))
+async def send_broadcast_without_en_variant(callback: CallbackQuery, state: FSMContext):
+    """Запускає розсилку з одним варіантом для всіх мов."""
+    data = await state.get_data()
+    await callback.answer()
+    await send_messages_to_users(
+        callback.message, state, data.get("broadcast_recipients", []),
+        data.get("broadcast_variants", {}), data.get("broadcast_target", "all")
+    )
+
+async def send_messages_to_users(message: Message, state: FSMContext, user_ids: list, variants: dict, target: str = "all"):
+    """Запускает фоновую рассылку заданному списку пользователей; прогресс — в одном сообщении."""
     await state.clear()
+    started = await broadcast_engine.start(message.chat.id, user_ids, variants, target=target)
+    if not started:
+        await message.answer(
+            "⏳ Предыдущая рассылка ещё не завершена. Продолжите или отмените её в меню рассылки.",
+            reply_markup=admin_panel.get_admin_keyboard()
+        )
 
 # endregion
 
@@ -12,7 +12,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, ReplyKeyboardRemove
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from app.core.dispatcher import trading_api, admin_panel, bot
+from app.core.dispatcher import trading_api, admin_panel, bot, deposit_watcher
 import app.core.database as db
 from app.core.i18n import t
 from app.core.keyboards import (
@@ -23,7 +23,8 @@ from app.core.keyboards import (
     get_cancel_keyboard, get_signal_confirmation_keyboard, get_language_keyboard
 )
 from app.core.fsm import Verification, Trading
-from app.core.utils import _send_photo_with_caching, _format_asset_name, _send_album_with_caching, compose_vertical_collage
+from app.core import assets
+from app.core.utils import _send_photo_with_caching, _format_asset_name, _send_album_with_caching, env_float
 from aiogram.exceptions import TelegramBadRequest
 
 logger = logging.getLogger(__name__)
@@ -33,6 +34,10 @@ router = Router()
 verification_locks = {}
 # --- Simple locks to avoid double-click duplicates for info flows ---
 info_locks = set()
+# --- Signals computed in the background while the user looks at the confirmation screen ---
+# user_id -> (params, started_at, task)
+signal_prefetch = {}
+SIGNAL_PREFETCH_MAX_AGE_SECS = env_float("SIGNAL_PREFETCH_MAX_AGE_SECS", 30.0, minimum=0.0)
 
 ADMIN_IDS_STR = os.getenv("ADMIN_IDS", "")
 ADMIN_IDS = [int(x) for x in ADMIN_IDS_STR.split(",") if x] if ADMIN_IDS_STR else []
@@ -78,9 +83,8 @@ async def _prompt_subscription(message: Message, lang: str, edit: bool = True):
     }
     caption = captions["en"] if lang == "en" else captions["ru"]
     try:
-        # Сбрасываем кэш id и отправляем корректную картинку под язык
-        img_path = ("imagen/start_eng.png" if lang == "en" else "imagen/start_ua.png")
-        admin_panel.clear_file_id(img_path)
+        # Картинка под язык; file_id в кеше привязан к содержимому файла
+        img_path = assets.fallback_image(lang)
         await _send_photo_with_caching(message, img_path, caption, _build_subscription_keyboard(lang), edit=edit)
     except (TelegramBadRequest, AttributeError):
         await message.answer(caption, reply_markup=_build_subscription_keyboard(lang))
@@ -118,21 +122,7 @@ def _generate_dynamic_facts(lang: str) -> str:
 
 # --- Image helper ---
 def _img(key: str, lang: str) -> str:
-	locale = 'en' if lang == 'en' else 'ru'
-	mapping = {
-		'start': {'ru': '2step_eng.png', 'en': '2step_ua.png'},
-		'market': {'ru': 'market_ua.png', 'en': 'market_eng.png'},
-		'currencypair': {'ru': 'currencypair_ua.png', 'en': 'currencypair_eu.png'},
-		'expirationtime': {'ru': 'expirationtime_ua.png', 'en': 'expirationtime_eng.png'},
-		'notregist': {'ru': 'dontregist_ua.png', 'en': 'notregist_eng.png'},
-		'notbalance': {'ru': 'notbalace_ua.png', 'en': 'notbalace_eng.png'},
-		'finish': {'ru': 'finish_ua.png', 'en': 'finish_eng.png'},
-		'twostep': {'ru': 'start_ua.png', 'en': 'start_eng.png'},
-		'buy': {'ru': 'Buy_ua.png', 'en': 'buy_eng.png'},
-		'sell': {'ru': 'sell_ua.png', 'en': 'sell_eng.png'},
-	}
-	filename = mapping.get(key, {}).get(locale)
-	return f"imagen/{filename}" if filename else ("imagen/start_eng.png" if lang == 'en' else "imagen/start_ua.png")
+	return assets.screen(key, lang)
 
 # --- MAIN COMMANDS & START SCREEN ---
 
@@ -172,9 +162,8 @@ async def cmd_start(message: Message, state: FSMContext):
         
     if caption_text:
         from app.core.keyboards import get_start_keyboard
-        # Сброс кэша, чтобы Telegram не показывал старое изображение другого языка
-        img_path = ("imagen/2step_eng.png" if lang == "en" else "imagen/2step_ua.png")
-        admin_panel.clear_file_id(img_path)
+        # Картинка под язык пользователя (у каждого языка свой файл и свой file_id)
+        img_path = assets.welcome_image(lang)
         await _send_photo_with_caching(message, img_path, caption_text, get_start_keyboard(lang))
 
 @router.callback_query(F.data == "main_menu")
@@ -278,15 +267,8 @@ async def show_education_intro(callback: CallbackQuery):
     else:
         keyboard = get_education_prompt_keyboard(lang)
     
-    try:
-        await callback.message.delete()
-    except (TelegramBadRequest, AttributeError):
-        pass
-    # Новая логика выбора картинки для блока обучения
-    edic_img = "imagen/edic_eng.png" if lang == "en" else "imagen/edic_ru.png"
-    if not os.path.exists(edic_img):
-        edic_img = _img('currencypair', lang)
-    admin_panel.clear_file_id(edic_img)
+    # Новая логика выбора картинки для блока обучения; экран меняется на месте
+    edic_img = assets.education_image(lang)
     await _send_photo_with_caching(callback.message, edic_img, caption, keyboard, edit=True)
     await callback.answer()
 
@@ -340,10 +322,7 @@ async def show_education_from_workspace_handler(callback: CallbackQuery):
     except (TelegramBadRequest, AttributeError):
         pass
     # Новая логика выбора изображения для раздела обучения
-    edic_img = "imagen/edic_eng.png" if lang == "en" else "imagen/edic_ru.png"
-    if not os.path.exists(edic_img):
-        edic_img = _img('currencypair', lang)
-    admin_panel.clear_file_id(edic_img)
+    edic_img = assets.education_image(lang)
     
     await _send_photo_with_caching(callback.message, edic_img, caption, kb.as_markup(), edit=False)
     await callback.answer()
@@ -357,8 +336,8 @@ async def handle_show_signals(callback: CallbackQuery, state: FSMContext):
     Перевіряє верифікацію та направляє користувача до відповідного потоку.
     """
     lang = db.get_user_lang(callback.from_user.id)
-    # First, check if the API connection is alive
-    if not await trading_api.is_api_connection_alive():
+    # First, check the cached API connection state (updated by the heartbeat)
+    if not trading_api.is_api_available():
         await callback.answer(
             t("ui.error_internal", lang),
             show_alert=True
@@ -394,7 +373,7 @@ async def unified_access_handler(callback: CallbackQuery, state: FSMContext):
     if db.is_fully_verified(user_id):
         # Ця логіка тепер обробляє тільки 'trade_signals_prompt',
         # оскільки 'open_all_lessons_prompt' приведе до показу уроків.
-        if not await trading_api.is_api_connection_alive():
+        if not trading_api.is_api_available():
             await callback.answer(
                 "Сервіс тимчасово недоступний. Спробуйте пізніше.", 
                 show_alert=True
@@ -427,8 +406,7 @@ async def unified_access_handler(callback: CallbackQuery, state: FSMContext):
             caption_text = t("education.locked_prompt", db.get_user_lang(callback.from_user.id), link=referral_link)
             try:
                 lang_cur = db.get_user_lang(callback.from_user.id)
-                img_path = ("imagen/start_eng.png" if lang_cur == "en" else "imagen/start_ua.png")
-                admin_panel.clear_file_id(img_path)
+                img_path = assets.fallback_image(lang_cur)
                 await _send_photo_with_caching(
                     callback.message,
                     img_path,
@@ -526,15 +504,23 @@ async def process_uid(message: Message, state: FSMContext):
             return
 
         await state.update_data(uid=uid)
-        await message.answer(t("verify.checking", lang) if t("verify.checking", lang) != "verify.checking" else f"⏳ Хвилинку, перевіряю вашу реєстрацію...")
+        checking_message = await message.answer(t("verify.checking", lang) if t("verify.checking", lang) != "verify.checking" else f"⏳ Хвилинку, перевіряю вашу реєстрацію...")
 
-        is_registered, _ = await trading_api.check_registration(user_id, uid)
+        is_registered, result = await trading_api.check_registration(
+            user_id, uid, on_position=_queue_position_updater(checking_message, lang)
+        )
+        if result.get("error") == "queue_full":
+            await message.answer(t("verify.queue_busy", lang))
+            del verification_locks[user_id]
+            return
         min_deposit = admin_panel.get_referral_settings().get("min_deposit", 20.0)
         facts = _generate_dynamic_facts(lang)
 
         if is_registered:
             db.set_user_uid(message.from_user.id, uid)
             db.set_user_registered(message.from_user.id, True)
+            if not admin_panel.is_fully_verified(user_id):
+                deposit_watcher.watch(user_id, uid)
 
             await state.set_state(Verification.waiting_for_deposit_confirmation)
 
@@ -573,6 +559,18 @@ async def process_uid(message: Message, state: FSMContext):
     if user_id in verification_locks:
         del verification_locks[user_id]
 
+def _queue_position_updater(status_message: Message, lang: str):
+    """Returns a callback that shows the user's place in the verification queue (0 — the check has started)."""
+    async def update(position: int):
+        try:
+            if position > 0:
+                await status_message.edit_text(t("verify.queue_position", lang, position=position))
+            else:
+                await status_message.edit_text(t("verify.checking", lang))
+        except TelegramBadRequest:
+            pass  # Message unchanged or already replaced by the result
+    return update
+
 @router.callback_query(F.data == "check_deposit", StateFilter(Verification.waiting_for_deposit_confirmation))
 async def check_deposit_handler(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
@@ -591,25 +589,29 @@ async def check_deposit_handler(callback: CallbackQuery, state: FSMContext):
             min_deposit = admin_panel.get_referral_settings().get("min_deposit", 20.0)
 
             await callback.message.delete()
-            loading_message = await callback.message.answer(t("deposit.checking", lang) if t("deposit.checking", lang) != "deposit.checking" else "⏳ Дякую, перевіряю інформацію про ваш депозит...")
 
             if not uid:
-                await loading_message.edit_text(
+                await callback.message.answer(
                     t("deposit.no_uid", lang) if t("deposit.no_uid", lang) != "deposit.no_uid" else "❌ <b>Помилка:</b> Не вдалося отримати ID аккаунта. Спробуйте ще раз.",
                     reply_markup=get_check_deposit_keyboard(lang),
                     parse_mode="HTML"
                 )
                 return
 
-            has_deposit, _ = await trading_api.check_deposit(user_id, uid, min_deposit)
-
-            if has_deposit:
-                db.set_user_deposited(user_id, True)
-                await loading_message.delete()
+            # The deposit watcher re-checks in the background and notifies the user,
+            # so the button only reads the stored status and asks for an early re-check.
+            user = admin_panel.get_user(user_id) or {}
+            if user.get("has_deposit"):
+                deposit_watcher.unwatch(user_id)
                 await show_fully_verified_screen(callback.message, edit=False)
+                return
+
+            if deposit_watcher.entry(user_id) is None:
+                deposit_watcher.watch(user_id, uid)
+            deposit_watcher.nudge(user_id)
+            if deposit_watcher.entry(user_id)["checks"] == 0:
+                await callback.message.answer(t("deposit.watching", lang), reply_markup=get_check_deposit_keyboard(lang))
             else:
-                await loading_message.delete()
-                
                 caption = (
                     t("deposit.too_low", lang, min_deposit=f"{min_deposit:.2f}")
                     if t("deposit.too_low", lang) != "deposit.too_low"
@@ -830,6 +832,64 @@ async def back_to_pair_selection(callback: CallbackQuery, state: FSMContext):
     await state.set_state(Trading.selecting_pair)
     await _send_photo_with_caching(callback.message, _img('currencypair', db.get_user_lang(callback.from_user.id)), t("pairs.choose_caption", db.get_user_lang(callback.from_user.id)), get_currency_pairs_keyboard(pairs, market_type, lang=db.get_user_lang(callback.from_user.id)), edit=True)
 
+async def _compute_signal(market_type: str, asset: str, timeframe: int, lang: str):
+    """Computes the signal and resolves its photo and cached file_id."""
+    signal_result = await trading_api.generate_signal(market_type, asset, timeframe)
+    if not signal_result or signal_result.get("error"):
+        return signal_result, None, None
+    photo_file = _img('buy', lang) if signal_result.get("direction") == "call" else _img('sell', lang)
+    file_id = admin_panel.get_file_id(photo_file)
+    return signal_result, photo_file, file_id
+
+def _start_signal_prefetch(user_id: int, market_type: str, asset: str, timeframe: str):
+    """Starts computing the signal in the background so it is ready when the animation ends."""
+    if not all([asset, market_type, timeframe]) or not str(timeframe).isdigit():
+        return
+    _drop_signal_prefetch(user_id)
+    loop = asyncio.get_running_loop()
+    task = asyncio.create_task(
+        _compute_signal(market_type, asset, int(timeframe), db.get_user_lang(user_id))
+    )
+    task.add_done_callback(_signal_prefetch_done)
+    signal_prefetch[user_id] = ((market_type, asset, str(timeframe)), loop.time(), task)
+    # Unused prefetches are evicted once they are too old to be served
+    loop.call_later(SIGNAL_PREFETCH_MAX_AGE_SECS, _expire_signal_prefetch, user_id, task)
+
+def _signal_prefetch_done(task: asyncio.Task):
+    """Retrieves the exception so an unused failed prefetch is logged, not reported by asyncio."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"Signal prefetch failed: {task.exception()}")
+
+def _expire_signal_prefetch(user_id: int, task: asyncio.Task):
+    entry = signal_prefetch.get(user_id)
+    if entry and entry[2] is task:
+        _drop_signal_prefetch(user_id)
+
+def _drop_signal_prefetch(user_id: int):
+    entry = signal_prefetch.pop(user_id, None)
+    if entry and not entry[2].done():
+        entry[2].cancel()
+
+async def _take_signal(user_id: int, market_type: str, asset: str, timeframe: str):
+    """Returns the prefetched signal if it matches the parameters and is fresh, otherwise computes it now."""
+    entry = signal_prefetch.pop(user_id, None)
+    if entry:
+        params, started_at, task = entry
+        fresh = asyncio.get_running_loop().time() - started_at <= SIGNAL_PREFETCH_MAX_AGE_SECS
+        if params == (market_type, asset, str(timeframe)) and fresh:
+            try:
+                signal_result, photo_file, file_id = await task
+                if signal_result and not signal_result.get("error"):
+                    # The prefetch ran while the confirmation screen was shown: count expiry from delivery
+                    close_time = trading_api.clock.server_datetime() + timedelta(minutes=int(timeframe))
+                    signal_result["close_time"] = int(close_time.timestamp())
+                return signal_result, photo_file, file_id
+            except Exception as e:
+                logger.warning(f"Prefetched signal for user {user_id} failed, recomputing: {e}")
+        elif not task.done():
+            task.cancel()
+    return await _compute_signal(market_type, asset, int(timeframe), db.get_user_lang(user_id))
+
 @router.callback_query(StateFilter(Trading.selecting_trading_time), F.data.startswith("confirm_params:"))
 async def confirm_signal_parameters_handler(callback: CallbackQuery, state: FSMContext):
     """Handles selection of trading time and shows confirmation."""
@@ -868,6 +928,7 @@ async def confirm_signal_parameters_handler(callback: CallbackQuery, state: FSMC
         parse_mode="HTML"
     )
     await callback.answer()
+    _start_signal_prefetch(callback.from_user.id, market_type, asset, time_str)
 
 @router.callback_query(F.data == "get_signal", StateFilter(Trading.selecting_trading_time))
 async def get_signal_handler(callback: CallbackQuery, state: FSMContext):
@@ -884,16 +945,18 @@ async def get_signal_handler(callback: CallbackQuery, state: FSMContext):
         # If editing fails, send a new message and work with that
         message = await callback.message.answer(text=t("ui.generating_signal", lang), parse_mode="HTML")
         await asyncio.sleep(3) # имитация ожидания
-        await process_and_send_signal(message, state)
+        await process_and_send_signal(message, state, callback.from_user.id)
         return
 
     await asyncio.sleep(3) # имитация ожидания
     
     # Then, process and send the signal in a separate step.
-    await process_and_send_signal(callback.message, state)
+    # The signal itself was started in the background on confirmation and is usually ready by now.
+    await process_and_send_signal(callback.message, state, callback.from_user.id)
 
-async def process_and_send_signal(message: Message, state: FSMContext):
-    """Generates a signal based on state data and sends it."""
+async def process_and_send_signal(message: Message, state: FSMContext, user_id: int | None = None):
+    """Generates a signal based on state data (or takes the prefetched one) and sends it."""
+    user_id = user_id or message.chat.id
     user_data = await state.get_data()
     asset = user_data.get("asset")
     market_type = user_data.get("market_type")
@@ -903,6 +966,7 @@ async def process_and_send_signal(message: Message, state: FSMContext):
     admin_panel.increment_signals_generated()
 
     if not all([asset, market_type, timeframe]):
+        _drop_signal_prefetch(user_id)
         await message.edit_text(
             text="❌ <b>Ошибка:</b> Не удалось получить все необходимые параметры. Попробуйте снова.",
             reply_markup=get_retry_signal_keyboard(),
@@ -910,7 +974,7 @@ async def process_and_send_signal(message: Message, state: FSMContext):
         )
         return
         
-    signal_result = await trading_api.generate_signal(market_type, asset, int(timeframe))
+    signal_result, photo_file, photo_file_id = await _take_signal(user_id, market_type, asset, timeframe)
 
     if not signal_result or signal_result.get("error"):
         error_message = signal_result.get("error", "Рынок сейчас нестабилен.") if signal_result else "Рынок сейчас нестабилен."
@@ -927,7 +991,6 @@ async def process_and_send_signal(message: Message, state: FSMContext):
 
     direction_text = "ВИЩЕ" if direction == "call" else "НИЖЧЕ"
     direction_emoji = "🔼" if direction == "call" else "🔽"
-    photo_file = _img('buy', db.get_user_lang(message.chat.id)) if direction == "call" else _img('sell', db.get_user_lang(message.chat.id))
     
     utc_tz = pytz.utc
     local_tz = pytz.timezone('Europe/Kyiv') # Or your target timezone
@@ -1033,7 +1096,8 @@ async def process_and_send_signal(message: Message, state: FSMContext):
 
     await _send_photo_with_caching(
         message, photo_file, signal_text,
-        get_signal_keyboard(asset, db.get_user_lang(message.chat.id)), edit=True
+        get_signal_keyboard(asset, db.get_user_lang(message.chat.id)), edit=True,
+        file_id=photo_file_id
     )
     
     # Reset state to allow starting a new signal flow
@@ -1111,6 +1175,7 @@ async def process_custom_time(message: Message, state: FSMContext):
         reply_markup=get_signal_confirmation_keyboard(db.get_user_lang(message.chat.id)),
         parse_mode="HTML"
     )
+    _start_signal_prefetch(message.from_user.id, market_type, asset, time_str)
 
 @router.callback_query(F.data == "back_to_pair_select", StateFilter(Trading.selecting_trading_time))
 async def back_to_pair_selection(callback: CallbackQuery, state: FSMContext):
@@ -1224,23 +1289,10 @@ async def have_account_other_link_handler(callback: CallbackQuery):
 
         caption_text = text_en if lang == "en" else text_ru
 
-        images = [
-            "imagen/image.png",
-            "imagen/image copy.png",
-            "imagen/image copy 2.png",
-            "imagen/image copy 3.png",
-            "imagen/image copy 4.png",
-        ]
-        available = [p for p in images if os.path.exists(p)]
-        if available:
-            # Формируем единое изображение-коллаж, чтобы отправить одним сообщением
-            collage_name = ("imagen/delete_account_help_en.jpg" if lang == "en" else "imagen/delete_account_help_ru.jpg")
-            try:
-                compose_vertical_collage(available, collage_name, max_width=1280)
-            except Exception:
-                # В случае ошибки склейки — отправляем первое изображение как fallback
-                collage_name = available[0]
-            admin_panel.clear_file_id(collage_name)
+        # Единое изображение-коллаж, чтобы отправить одним сообщением; собирается
+        # в отдельном потоке и только после изменения исходных картинок
+        collage_name = await asyncio.to_thread(assets.ready_delete_account_collage, lang)
+        if collage_name:
             await _send_photo_with_caching(callback.message, collage_name, caption_text, get_cancel_keyboard("main_menu", lang), edit=False)
         else:
             await callback.message.answer(caption_text, reply_markup=get_cancel_keyboard("main_menu", lang))
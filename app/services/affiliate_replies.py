@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from telethon import events
+
+from app.services.verification_parser import parse_verification_response
+
+logger = logging.getLogger(__name__)
+
+_DIGITS_RE = re.compile(r"\d+")
+
+
+class PendingReply:
+    """Ожидание ответа партнёрского бота на один отправленный UID."""
+
+    def __init__(self, token: int, uid: str):
+        self.token = token
+        self.uid = uid
+        # UID только на границах цифр: "1234" не совпадает с "12345" или с "$11234.00"
+        self.uid_re = re.compile(rf"(?<!\d){re.escape(uid)}(?!\d)") if uid else None
+        self.sent_id: Optional[int] = None
+        # id сообщения уникален только внутри аккаунта, поэтому ключ — (клиент, id)
+        self.sent_key: Optional[Tuple[int, int]] = None
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class AffiliateReplyRouter:
+    """
+    Маршрутизатор ответов партнёрского бота на основе событий Telethon.
+
+    Обработчик NewMessage на чате бота разрешает ожидающие запросы сразу при
+    получении ответа — без опроса истории чата. Порядок сопоставления:
+      1) ответ (reply_to_msg_id) на наше сообщение с UID;
+      2) UID из ответа: поле UID, а если его нет — UID как отдельное число в тексте
+         (не часть другого UID, суммы или даты);
+      3) ответ без UID (например, "пользователь не найден") — самому раннему
+         ожидающему запросу, отправленному через этот же аккаунт: бот отвечает
+         на сообщения по порядку, а через один аккаунт может идти несколько проверок.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, PendingReply] = {}
+        self._by_sent_id: Dict[Tuple[int, int], int] = {}
+        self._tokens = itertools.count(1)
+        self._attached_to: Optional[Any] = None
+
+    def attach(self, telethon_client: Any, chat: str):
+        """Подписывается на входящие сообщения из чата партнёрского бота."""
+        if self._attached_to is telethon_client:
+            return
+        telethon_client.add_event_handler(self._on_message, events.NewMessage(chats=chat, incoming=True))
+        self._attached_to = telethon_client
+        logger.info(f"Маршрутизатор ответов подписан на сообщения {chat}.")
+
+    @property
+    def is_attached(self) -> bool:
+        return self._attached_to is not None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    # --- Регистрация ожиданий ---
+
+    def expect(self, uid: str) -> PendingReply:
+        """Регистрирует ожидание до отправки UID, чтобы не пропустить быстрый ответ."""
+        pending = PendingReply(next(self._tokens), uid)
+        self._pending[pending.token] = pending
+        return pending
+
+    def bind_sent_message(self, pending: PendingReply, sent_id: Optional[int], client: Any = None):
+        """
+        Связывает ожидание с id отправленного сообщения (для сопоставления по reply_to).
+        client — клиент Telethon, через который ушло сообщение (при пуле аккаунтов).
+        """
+        if sent_id is None or pending.token not in self._pending:
+            return
+        pending.sent_id = sent_id
+        pending.sent_key = (id(client), sent_id)
+        self._by_sent_id[pending.sent_key] = pending.token
+
+    def discard(self, pending: PendingReply):
+        self._pending.pop(pending.token, None)
+        if pending.sent_key is not None:
+            self._by_sent_id.pop(pending.sent_key, None)
+        if not pending.future.done():
+            pending.future.cancel()
+
+    async def wait(self, pending: PendingReply, timeout: float) -> Optional[str]:
+        """Ждёт ответ не дольше timeout секунд. None — ответа нет."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(pending.future), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.discard(pending)
+
+    # --- Обработка входящих сообщений ---
+
+    def _resolve(self, pending: PendingReply, text: str):
+        if not pending.future.done():
+            pending.future.set_result(text)
+        self._pending.pop(pending.token, None)
+        if pending.sent_key is not None:
+            self._by_sent_id.pop(pending.sent_key, None)
+
+    def _match(self, client_key: int, reply_to_key: Optional[Tuple[int, int]], text: str) -> List[PendingReply]:
+        if reply_to_key is not None:
+            token = self._by_sent_id.get(reply_to_key)
+            if token in self._pending:
+                return [self._pending[token]]
+        uid_field = _DIGITS_RE.search(str(parse_verification_response(text).get("uid", "")))
+        if uid_field:
+            # Ответ про конкретный UID не может принадлежать другому запросу
+            return [p for p in self._pending.values() if p.uid == uid_field.group()]
+        by_uid = [p for p in self._pending.values() if p.uid_re and p.uid_re.search(text)]
+        if by_uid:
+            # Все ожидания одного и того же UID получают один и тот же ответ
+            return by_uid
+        # Ответ пришёл в чат конкретного аккаунта — запросы других аккаунтов он не касается;
+        # id сообщений внутри аккаунта растут, поэтому наименьший — отправленный раньше всех
+        same_client = [p for p in self._pending.values() if p.sent_key is not None and p.sent_key[0] == client_key]
+        if same_client:
+            return [min(same_client, key=lambda p: p.sent_key[1])]
+        return []
+
+    async def _on_message(self, event):
+        message = event.message
+        text = getattr(message, "text", "") or ""
+        reply_to_id = getattr(message, "reply_to_msg_id", None)
+        client_key = id(getattr(event, "client", None))
+        reply_to_key = (client_key, reply_to_id) if reply_to_id is not None else None
+        matched = self._match(client_key, reply_to_key, text)
+        if not matched:
+            if self._pending:
+                logger.warning(
+                    f"Ответ партнёрского бота не сопоставлен ни с одним из {len(self._pending)} ожидающих запросов."
+                )
+            return
+        for pending in matched:
+            self._resolve(pending, text)
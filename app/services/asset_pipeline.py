@@ -0,0 +1,95 @@
+import logging
+import os
+import threading
+from typing import Dict, List
+
+from PIL import Image
+
+from app.core import assets
+from app.core.utils import env_int
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, "data", "asset_cache")
+
+# Telegram показывает фото не больше 1280 px по длинной стороне — больше загружать бессмысленно
+MAX_SIDE = env_int("ASSET_MAX_SIDE", 1280, minimum=320)
+JPEG_QUALITY = env_int("ASSET_JPEG_QUALITY", 85, minimum=40)
+
+
+def variant_path(path: str) -> str:
+    """
+    Путь оптимизированного варианта: хеш содержимого исходника + параметры сжатия.
+    Сам path, если исходник не прочитать.
+    """
+    key = assets.content_key(path)
+    if key is None:
+        return path
+    digest = key[len(assets.CONTENT_KEY_PREFIX):]
+    return os.path.join(CACHE_DIR, f"{digest}-{MAX_SIDE}q{JPEG_QUALITY}.jpg")
+
+
+def _render(path: str, out_path: str):
+    with Image.open(path) as img:
+        if img.mode in ("RGBA", "LA", "P"):
+            # Прозрачность — на белый фон, как выглядят экраны в клиенте
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+        img.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+        # Свой временный файл у каждого потока: фоновый прогрев и отправка могут готовить один вариант
+        tmp_path = f"{out_path}.{threading.get_ident()}.tmp"
+        try:
+            # Новое изображение без exif/icc — метаданные не сохраняются
+            img.save(tmp_path, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            os.replace(tmp_path, out_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def optimize(path: str) -> str:
+    """
+    Возвращает файл, который нужно загружать в Telegram вместо path: кешированный
+    оптимизированный вариант или сам path, если вариант не меньше исходника
+    или исходник не читается. Блокирующая функция — из async вызывать через to_thread.
+    """
+    if not os.path.exists(path):
+        return path
+    try:
+        out_path = variant_path(path)
+    except OSError as e:
+        logger.warning(f"Не удалось прочитать {path}: {e}")
+        return path
+    if out_path == path:
+        return path
+    if not os.path.exists(out_path):
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            _render(path, out_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось оптимизировать {path}: {e}")
+            return path
+    return out_path if os.path.getsize(out_path) < os.path.getsize(path) else path
+
+
+def build_all(paths: List[str]) -> List[Dict[str, int]]:
+    """Готовит варианты для всех картинок; отчёт по каждой: исходный размер, итоговый, экономия."""
+    report = []
+    for path in paths:
+        source_bytes = os.path.getsize(path)
+        result_bytes = os.path.getsize(optimize(path))
+        report.append({"path": path, "source": source_bytes, "result": result_bytes, "saved": source_bytes - result_bytes})
+        logger.info(
+            f"Картинка {path}: {source_bytes // 1024} КБ -> {result_bytes // 1024} КБ "
+            f"(экономия {(source_bytes - result_bytes) // 1024} КБ)"
+        )
+    total_source = sum(item["source"] for item in report)
+    total_saved = sum(item["saved"] for item in report)
+    if total_source:
+        logger.info(f"Оптимизация картинок: сэкономлено {total_saved // 1024} КБ из {total_source // 1024} КБ ({total_saved / total_source:.0%}).")
+    return report
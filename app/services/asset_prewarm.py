@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.types import FSInputFile
+
+from app.core import assets
+from app.services import asset_pipeline
+from app.core.utils import env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+
+class AssetPrewarmer:
+    """
+    Фоновая подготовка картинок при старте: для всех картинок из app.core.assets (экраны _img(),
+    обучение, коллажи) собираются оптимизированные варианты (asset_pipeline)
+    с отчётом об экономии. Затем прогрев кеша file_id: варианты картинок без
+    file_id параллельно загружаются в служебный чат, их file_id
+    сохраняются в AdminPanel. После этого отправки пользователям идут по file_id
+    и не загружают файлы с диска. Без ASSET_STORAGE_CHAT_ID этап пропускается целиком:
+    варианты и коллажи собираются лениво при первой отправке.
+
+    Настройки из окружения:
+      - ASSET_STORAGE_CHAT_ID — служебный чат/канал, куда бот может отправлять фото;
+        без него прогрев выключен
+      - ASSET_PREWARM_CONCURRENCY — одновременных загрузок (4)
+      - ASSET_PREWARM_TIMEOUT_SECS — предельное время фонового прогрева (60)
+    """
+
+    def __init__(self, bot: Bot, admin_panel: Any):
+        self.bot = bot
+        self.admin_panel = admin_panel
+        raw_chat_id = os.getenv("ASSET_STORAGE_CHAT_ID", "").strip()
+        self.storage_chat_id: Optional[int] = int(raw_chat_id) if raw_chat_id.lstrip("-").isdigit() else None
+        self.concurrency = env_int("ASSET_PREWARM_CONCURRENCY", 4, minimum=1)
+        self.timeout_secs = env_float("ASSET_PREWARM_TIMEOUT_SECS", 60.0, minimum=1.0)
+        self.max_attempts = 3
+        self.stats = {"uploaded": 0, "cached": 0, "failed": 0, "seconds": 0.0, "bytes_saved": 0}
+        self.report: List[Dict[str, int]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.storage_chat_id is not None
+
+    def metrics(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+    async def prepare(self) -> List[str]:
+        """Собирает коллажи и оптимизированные варианты; возвращает пути всех картинок."""
+        paths = assets.static_images() + await asyncio.to_thread(assets.build_collages)
+        self.report = await asyncio.to_thread(asset_pipeline.build_all, paths)
+        self.stats["bytes_saved"] = sum(item["saved"] for item in self.report)
+        return paths
+
+    def pending_assets(self, paths: List[str]) -> List[str]:
+        """Картинки без file_id в кеше."""
+        cached = [path for path in paths if self.admin_panel.get_file_id(path)]
+        self.stats["cached"] = len(cached)
+        return [path for path in paths if path not in cached]
+
+    async def _upload(self, path: str, semaphore: asyncio.Semaphore, uploaded: Dict[str, str]):
+        async with semaphore:
+            upload_path = await asyncio.to_thread(asset_pipeline.optimize, path)
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    message = await self.bot.send_photo(
+                        self.storage_chat_id, FSInputFile(os.path.abspath(upload_path)), disable_notification=True
+                    )
+                    if message.photo:
+                        uploaded[path] = message.photo[-1].file_id
+                    return
+                except TelegramRetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+                except (TelegramNetworkError, TelegramServerError) as e:
+                    if attempt == self.max_attempts:
+                        logger.warning(f"Прогрев: не удалось загрузить {path}: {e}")
+                        return
+                    await asyncio.sleep(attempt)
+                except TelegramBadRequest as e:
+                    logger.warning(f"Прогрев: Telegram отклонил {path}: {e}")
+                    return
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Загружает недостающие картинки и сохраняет их file_id одной записью —
+        в том числе уже загруженные, если прогрев прерван по таймауту.
+        """
+        started = time.monotonic()
+        paths = self.pending_assets(await self.prepare())
+        semaphore = asyncio.Semaphore(self.concurrency)
+        uploaded: Dict[str, str] = {}
+        try:
+            await asyncio.gather(*(self._upload(path, semaphore, uploaded) for path in paths))
+        finally:
+            self.admin_panel.set_file_ids(uploaded)
+        self.stats.update(
+            uploaded=len(uploaded), failed=len(paths) - len(uploaded), seconds=round(time.monotonic() - started, 1)
+        )
+        logger.info(
+            f"Прогрев кеша картинок: загружено {self.stats['uploaded']}, уже в кеше {self.stats['cached']}, "
+            f"ошибок {self.stats['failed']} за {self.stats['seconds']}с."
+        )
+        return self.metrics()
+
+    async def run_with_timeout(self):
+        """Прогрев не дольше ASSET_PREWARM_TIMEOUT_SECS; уже загруженные file_id сохраняются."""
+        try:
+            await asyncio.wait_for(self.run(), timeout=self.timeout_secs)
+        except asyncio.TimeoutError:
+            logger.warning(f"Прогрев кеша картинок не уложился в {self.timeout_secs:.0f}с и остановлен.")
+        except Exception as e:
+            logger.error(f"Ошибка прогрева кеша картинок: {e}", exc_info=True)
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Запускает прогрев в фоне; None, если служебный чат не задан."""
+        if not self.enabled:
+            logger.info("ASSET_STORAGE_CHAT_ID не задан — прогрев кеша картинок пропущен.")
+            return None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_with_timeout())
+        return self._task
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
@@ -3,6 +3,7 @@ import logging
 from datetime import datetime, timedelta
 from app.core.dispatcher import bot, admin_panel, trading_api
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from app.services.connection_supervisor import CONNECTED, FAILED
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +12,43 @@ SESSION_CHECK_INTERVAL_OK = 1800  # 30 минут, если все в поряд
 SESSION_CHECK_INTERVAL_ERROR = 3600  # 1 час, если сессия умерла (чтобы не спамить)
 PROACTIVE_REFRESH_THRESHOLD_HOURS = 12  # За сколько часов до истечения пытаться обновить
 
+async def _send_critical_session_alert(bot, trading_api, admin_id: int):
+    """Отправляет администратору критическое уведомление о мёртвой сессии (один раз до восстановления)."""
+    if trading_api.critical_notification_sent:
+        return
+    auth_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔑 Обновить сессию", callback_data="start_manual_auth")]
+    ])
+    await bot.send_message(
+        admin_id,
+        "🔴 <b>Критическая ошибка запуска!</b>\n\nСессия API недействительна или отсутствует. Бот не может получать рыночные данные.\n\nНажмите кнопку ниже, чтобы начать процесс авторизации.",
+        reply_markup=auth_keyboard,
+        parse_mode="HTML"
+    )
+    trading_api.critical_notification_sent = True # Set flag after sending
+
+def register_connection_notifications(bot, trading_api, admin_panel):
+    """
+    Подписывает уведомления администратора на события супервизора соединения:
+    failed — критическое уведомление, connected после сбоя — сообщение о восстановлении.
+    """
+    async def on_connection_state(old_state: str, new_state: str):
+        admin_id = admin_panel.get_admin_id()
+        if not admin_id:
+            return
+        try:
+            if new_state == FAILED:
+                logger.warning("Супервизор не смог восстановить соединение с API. Отправляю уведомление.")
+                await _send_critical_session_alert(bot, trading_api, admin_id)
+            elif new_state == CONNECTED and trading_api.critical_notification_sent:
+                logger.info("Соединение с API восстановлено. Сбрасываю флаг уведомления.")
+                trading_api.critical_notification_sent = False
+                await bot.send_message(admin_id, "🟢 <b>Соединение с API восстановлено.</b>", parse_mode="HTML")
+        except Exception as e:
+            logger.error(f"Не удалось отправить уведомление о состоянии соединения: {e}")
+
+    trading_api.supervisor.subscribe(on_connection_state)
+
 async def periodic_auth_check(bot, trading_api, admin_panel, interval_seconds: int = 3600):
     """
     Periodically checks the API connection status and warns the admin if the session
@@ -27,20 +65,12 @@ async def periodic_auth_check(bot, trading_api, admin_panel, interval_seconds: i
                 continue
 
             # Check 1: Is connection dead or session expired? (Critical)
-            if not await trading_api.is_api_connection_alive():
+            # Состояние берём из heartbeat/супервизора, без живого запроса
+            if not trading_api.is_api_available():
                 # Anti-spam check: only send if a notification hasn't been sent already.
                 if not trading_api.critical_notification_sent:
                     logger.warning("Проверка показала, что сессия API недействительна. Отправляю уведомление.")
-                    auth_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="🔑 Обновить сессию", callback_data="start_manual_auth")]
-                    ])
-                    await bot.send_message(
-                        admin_id,
-                        "🔴 <b>Критическая ошибка запуска!</b>\n\nСессия API недействительна или отсутствует. Бот не может получать рыночные данные.\n\nНажмите кнопку ниже, чтобы начать процесс авторизации.",
-                        reply_markup=auth_keyboard,
-                        parse_mode="HTML"
-                    )
-                    trading_api.critical_notification_sent = True # Set flag after sending
+                    await _send_critical_session_alert(bot, trading_api, admin_id)
             else:
                 # If the connection is alive, reset the flag so it can notify again if it fails later.
                 if trading_api.critical_notification_sent:
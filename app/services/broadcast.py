@@ -0,0 +1,490 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.types import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InputMediaDocument,
+    InputMediaPhoto,
+    Message,
+)
+
+from app.admin.segments import SUPPRESSED as SEGMENT_SUPPRESSED
+from app.core.utils import AsyncTokenBucket, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+# Результат доставки одному получателю
+SENT = "sent"
+BLOCKED = "blocked"   # бот заблокирован / пользователь удалён
+FAILED = "failed"
+UNKNOWN = "unknown"   # отправка началась до падения бота — повторно не шлём, чтобы не было дублей
+RESULTS = (SENT, BLOCKED, FAILED, UNKNOWN)
+
+# Состояния рассылки
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+DONE = "done"
+
+# Виды вложений рассылки
+PHOTO = "photo"
+DOCUMENT = "document"
+DEFAULT_LANG = "ru"   # вариант для пользователей без своего языкового варианта
+
+# Ошибки BadRequest, после которых доставка этому пользователю невозможна и в будущем
+PERMANENT_ERROR_MARKERS = ("chat not found", "user is deactivated", "peer_id_invalid", "bot was blocked")
+
+
+def variant_from_messages(messages: List[Message]) -> Optional[Dict[str, Any]]:
+    """
+    Вариант рассылки из сообщения администратора (или всех сообщений альбома):
+    {"text": текст или подпись в HTML, "media": [{"type": photo|document, "file_id": ...}]}.
+    Файлы уже загружены в Telegram вместе с сообщением администратора, поэтому
+    получателям они уходят по file_id, без повторной загрузки. None — неподдерживаемый тип.
+    """
+    text, media = "", []
+    for message in messages:
+        if not text and (message.text or message.caption):
+            # Рассылка уходит с parse_mode HTML — форматирование берём из entities
+            text = message.html_text
+        if message.photo:
+            media.append({"type": PHOTO, "file_id": message.photo[-1].file_id})
+        elif message.document:
+            media.append({"type": DOCUMENT, "file_id": message.document.file_id})
+        elif not message.text:
+            return None
+    if not text and not media:
+        return None
+    return {"text": text, "media": media}
+
+
+def describe_variant(variant: Dict[str, Any]) -> str:
+    """Короткое описание варианта для истории рассылок."""
+    media = variant.get("media") or []
+    if not media:
+        return variant.get("text", "")
+    kinds = ", ".join(sorted({item["type"] for item in media}))
+    return f"[{kinds} x{len(media)}] {variant.get('text', '')}".strip()
+
+
+class BroadcastEngine:
+    """
+    Рассылка сообщений с высокой пропускной способностью.
+
+    - BROADCAST_CONCURRENCY (10) отправителей берут получателей по порядку
+      и делят один token bucket: BROADCAST_RATE_PER_SEC (28) сообщений в секунду
+      с всплеском до BROADCAST_BURST (5) — в пределах лимита Telegram ~30 msg/s.
+    - TelegramRetryAfter приостанавливает весь bucket на retry_after секунд,
+      сообщение отправляется повторно и попыткой не считается.
+    - Сетевые/серверные ошибки повторяются до BROADCAST_MAX_ATTEMPTS (3) раз
+      с экспоненциальной задержкой; Forbidden и BadRequest не повторяются.
+    - Постоянные отказы (бот заблокирован, аккаунт удалён, чат не найден) заносятся
+      в список придушения (suppressed): такие пользователи исключаются из следующих
+      рассылок, пока снова не нажмут /start.
+    - Рассылка — набор вариантов по языку пользователя (lang): текст, фото,
+      документ или альбом. Вложения отправляются по file_id, полученному один раз
+      из сообщения администратора; альбом расходует из bucket по токену на файл.
+    - Прогресс показывается редактированием одного сообщения администратора
+      не чаще раза в BROADCAST_PROGRESS_SECS (3), с кнопками паузы и отмены.
+
+    Каждая рассылка хранится в data/broadcasts/: <id>.json — получатели и статус,
+    <id>.log — журнал "s <индекс>" перед отправкой и "d <индекс> <результат>" после.
+    После паузы или падения бота рассылка продолжается с первого получателя,
+    которому отправка ещё не начиналась. Начатые, но не подтверждённые отправки
+    считаются UNKNOWN и не повторяются — дублей не бывает.
+    """
+
+    def __init__(self, bot: Bot, admin_panel: Any, journal_dir: str = os.path.join(DATA_DIR, "broadcasts")):
+        self.bot = bot
+        self.admin_panel = admin_panel
+        self.journal_dir = journal_dir
+        self.concurrency = env_int("BROADCAST_CONCURRENCY", 10, minimum=1)
+        self.max_attempts = env_int("BROADCAST_MAX_ATTEMPTS", 3, minimum=1)
+        self.retry_delay_secs = env_float("BROADCAST_RETRY_DELAY_SECS", 1.0, minimum=0.0)
+        self.progress_every_secs = env_float("BROADCAST_PROGRESS_SECS", 3.0, minimum=1.0)
+        self.rate_limiter = AsyncTokenBucket(
+            rate=env_float("BROADCAST_RATE_PER_SEC", 28.0, minimum=0.1),
+            capacity=env_float("BROADCAST_BURST", 5.0, minimum=1.0),
+        )
+        self.job: Dict[str, Any] = {}
+        self._started: Set[int] = set()
+        self._results: Dict[int, str] = {}
+        self._cursor = 0
+        self._journal = None
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._last_progress = 0.0
+        self._suppress: Dict[int, str] = {}
+        self._load_latest()
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # --- Журнал на диске ---
+
+    def _meta_path(self, job_id: str) -> str:
+        return os.path.join(self.journal_dir, f"{job_id}.json")
+
+    def _log_path(self, job_id: str) -> str:
+        return os.path.join(self.journal_dir, f"{job_id}.log")
+
+    def _save_meta(self):
+        path = self._meta_path(self.job["id"])
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.job, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (IOError, OSError) as e:
+            logger.error(f"Не удалось сохранить рассылку {self.job['id']}: {e}")
+
+    def _load_latest(self):
+        """Загружает последнюю незавершённую рассылку (выполнялась или стоит на паузе)."""
+        if not os.path.isdir(self.journal_dir):
+            return
+        latest = None
+        for name in os.listdir(self.journal_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.journal_dir, name), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (IOError, json.JSONDecodeError) as e:
+                logger.error(f"Не удалось загрузить рассылку {name}: {e}")
+                continue
+            if job.get("status") in (RUNNING, PAUSED) and (latest is None or job["created_at"] > latest["created_at"]):
+                latest = job
+        if latest is not None:
+            self.job = latest
+            self._replay_journal()
+            logger.info(f"Найдена незавершённая рассылка {latest['id']}: {self._processed()}/{len(latest['recipients'])}.")
+
+    def _replay_journal(self):
+        self._started, self._results = set(), {}
+        try:
+            with open(self._log_path(self.job["id"]), "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 2 and parts[0] == "s":
+                        self._started.add(int(parts[1]))
+                    elif len(parts) == 3 and parts[0] == "d" and parts[2] in RESULTS:
+                        self._results[int(parts[1])] = parts[2]
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError) as e:
+            logger.error(f"Журнал рассылки {self.job['id']} повреждён, читаю до ошибки: {e}")
+        self._cursor = 0
+
+    def _write_journal(self, line: str):
+        self._journal.write(line)
+        self._journal.flush()
+
+    def _mark_unknown(self):
+        """Начатые до сбоя, но не подтверждённые отправки: статус доставки неизвестен."""
+        for index in sorted(self._started - self._results.keys()):
+            self._results[index] = UNKNOWN
+            self._write_journal(f"d {index} {UNKNOWN}\n")
+
+    # --- Публичный интерфейс ---
+
+    def _counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(RESULTS, 0)
+        for result in self._results.values():
+            counts[result] += 1
+        return counts
+
+    def _processed(self) -> int:
+        return len(self._results)
+
+    async def start(self, admin_chat_id: int, recipients: List[int], variants: Dict[str, Dict[str, Any]],
+                    target: str = "all") -> bool:
+        """
+        Запускает новую рассылку в фоне. variants — {язык: вариант} (см. variant_from_messages);
+        вариант DEFAULT_LANG обязателен. False, если есть незавершённая рассылка.
+        """
+        if self.is_running or self.job.get("status") in (RUNNING, PAUSED):
+            return False
+        suppressed = self.admin_panel.segments.get(SEGMENT_SUPPRESSED)
+        reachable = [int(user_id) for user_id in recipients if int(user_id) not in suppressed]
+        self.job = {
+            "id": f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}",
+            "status": RUNNING,
+            "variants": variants,
+            "target": target,
+            "recipients": reachable,
+            "suppressed_skipped": len(recipients) - len(reachable),
+            "retry_after_pauses": 0,
+            "admin_chat_id": admin_chat_id,
+            "progress_message_id": None,
+            "created_at": time.time(),
+            "history_index": self.admin_panel.add_broadcast(describe_variant(variants[DEFAULT_LANG]), target),
+        }
+        self._started, self._results, self._cursor = set(), {}, 0
+        try:
+            msg = await self.bot.send_message(
+                admin_chat_id, self.progress_text(), reply_markup=self.progress_keyboard(), parse_mode="HTML"
+            )
+            self.job["progress_message_id"] = msg.message_id
+        except Exception as e:
+            logger.warning(f"Не удалось отправить сообщение прогресса рассылки: {e}")
+        self._save_meta()
+        logger.info(f"Запущена рассылка {self.job['id']} на {len(self.job['recipients'])} получателей.")
+        self._launch()
+        return True
+
+    async def pause(self) -> bool:
+        """Останавливает выдачу новых получателей и дожидается уже начатых отправок."""
+        if not self.is_running:
+            return False
+        await self._stop_workers(PAUSED)
+        await self._report_progress(force=True)
+        return True
+
+    def resume(self) -> bool:
+        """Продолжает рассылку после паузы или падения бота."""
+        if self.is_running or self.job.get("status") not in (RUNNING, PAUSED):
+            return False
+        self._set_status(RUNNING)
+        logger.info(f"Продолжаю рассылку {self.job['id']} с {self._processed()}/{len(self.job['recipients'])}.")
+        self._launch()
+        return True
+
+    async def cancel(self) -> bool:
+        if self.is_running:
+            await self._stop_workers(CANCELLED)
+        elif self.job.get("status") == PAUSED:
+            self._set_status(CANCELLED)
+        else:
+            return False
+        await self._report_progress(force=True)
+        return True
+
+    def resume_if_interrupted(self) -> bool:
+        """Вызывается при старте бота: продолжает рассылку, прерванную падением."""
+        if self.job.get("status") == RUNNING:
+            return self.resume()
+        return False
+
+    # --- Прогресс ---
+
+    def progress_text(self) -> str:
+        job = self.job
+        if not job:
+            return "Рассылок ещё не было."
+        total = len(job["recipients"])
+        counts = self._counts()
+        processed = self._processed()
+        elapsed = max(time.time() - job["created_at"], 1e-6)
+        rate = processed / elapsed
+        eta = (total - processed) / rate if rate > 0 else 0
+        header = {
+            RUNNING: "⏳ <b>Рассылка идёт</b>",
+            PAUSED: "⏸ <b>Рассылка на паузе</b>",
+            CANCELLED: "✖️ <b>Рассылка отменена</b>",
+            DONE: "✅ <b>Рассылка завершена</b>",
+        }.get(job["status"], job["status"])
+        return (
+            f"{header}\n\n"
+            f"Обработано: {processed}/{total}\n"
+            f"📥 Доставлено: {counts[SENT]}\n"
+            f"🚫 Заблокировали бота: {counts[BLOCKED]}\n"
+            f"❌ Ошибок: {counts[FAILED]}\n"
+            + (f"❔ Прервано сбоем (не повторяется): {counts[UNKNOWN]}\n" if counts[UNKNOWN] else "")
+            + (f"🔕 Исключены как недоступные: {job.get('suppressed_skipped')}\n" if job.get("suppressed_skipped") else "")
+            + f"Скорость: {rate:.1f} сообщ./с"
+            + (f", осталось ~{eta / 60:.0f} мин" if job["status"] == RUNNING and processed else "")
+        )
+
+    def progress_keyboard(self) -> InlineKeyboardMarkup:
+        status = self.job.get("status")
+        if status == RUNNING:
+            row = [InlineKeyboardButton(text="⏸ Пауза", callback_data="admin_broadcast_pause"),
+                   InlineKeyboardButton(text="✖️ Отменить", callback_data="admin_broadcast_cancel")]
+        elif status == PAUSED:
+            row = [InlineKeyboardButton(text="▶️ Продолжить", callback_data="admin_broadcast_resume"),
+                   InlineKeyboardButton(text="✖️ Отменить", callback_data="admin_broadcast_cancel")]
+        else:
+            # По завершении под итогом — клавиатура админ-панели
+            return self.admin_panel.get_admin_keyboard()
+        return InlineKeyboardMarkup(inline_keyboard=[row])
+
+    async def _report_progress(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_every_secs:
+            return
+        self._last_progress = now
+        self._flush_suppressions()
+        chat_id = self.job.get("admin_chat_id")
+        message_id = self.job.get("progress_message_id")
+        if not chat_id or not message_id:
+            return
+        try:
+            await self.bot.edit_message_text(
+                self.progress_text(), chat_id=chat_id, message_id=message_id,
+                reply_markup=self.progress_keyboard(), parse_mode="HTML"
+            )
+        except (TelegramBadRequest, TelegramRetryAfter):
+            pass  # Текст не изменился или лимит на редактирование — обновим в следующий раз
+
+    # --- Доставка ---
+
+    def _set_status(self, status: str):
+        self.job["status"] = status
+        self._save_meta()
+        if self.job.get("history_index") is not None:
+            self.admin_panel.update_broadcast_status(self.job["history_index"], status)
+
+    def _flush_suppressions(self):
+        """Сохраняет накопленные постоянные отказы одной записью базы."""
+        if self._suppress:
+            reasons, self._suppress = self._suppress, {}
+            self.admin_panel.suppress_users(reasons)
+
+    def _take(self) -> Optional[int]:
+        """Следующий получатель, которому отправка ещё не начиналась (курсор по порядку)."""
+        recipients = self.job["recipients"]
+        while not self._stopping and self._cursor < len(recipients):
+            index = self._cursor
+            self._cursor += 1
+            if index not in self._started:
+                self._started.add(index)
+                self._write_journal(f"s {index}\n")
+                return index
+        return None
+
+    def _variant_for(self, user_id: int) -> Dict[str, Any]:
+        variants = self.job.get("variants")
+        if not variants:
+            # Рассылки, сохранённые до появления вариантов, — только текст
+            return {"text": self.job.get("text", ""), "media": []}
+        user = self.admin_panel.get_user(user_id)
+        lang = user.get("lang") if isinstance(user, dict) else None
+        return variants.get(lang) or variants[DEFAULT_LANG]
+
+    async def _send_variant(self, user_id: int, variant: Dict[str, Any]):
+        text, media = variant.get("text", ""), variant.get("media") or []
+        if not media:
+            await self.bot.send_message(user_id, text, parse_mode="HTML")
+        elif len(media) == 1 and media[0]["type"] == PHOTO:
+            await self.bot.send_photo(user_id, media[0]["file_id"], caption=text or None, parse_mode="HTML")
+        elif len(media) == 1:
+            await self.bot.send_document(user_id, media[0]["file_id"], caption=text or None, parse_mode="HTML")
+        else:
+            # Подпись альбома — у первого элемента
+            group = [
+                (InputMediaPhoto if item["type"] == PHOTO else InputMediaDocument)(
+                    media=item["file_id"], caption=(text or None) if i == 0 else None, parse_mode="HTML"
+                )
+                for i, item in enumerate(media)
+            ]
+            await self.bot.send_media_group(user_id, group)
+
+    async def _acquire_messages(self, count: int):
+        """Токен на каждое сообщение альбома; порциями не больше ёмкости bucket, иначе acquire не дождётся."""
+        remaining = count
+        while remaining > 0:
+            chunk = min(remaining, self.rate_limiter.capacity)
+            await self.rate_limiter.acquire(chunk)
+            remaining -= chunk
+
+    async def _deliver(self, user_id: int, variant: Dict[str, Any]) -> str:
+        attempt = 1
+        messages = max(len(variant.get("media") or []), 1)
+        while True:
+            await self._acquire_messages(messages)
+            try:
+                await self._send_variant(user_id, variant)
+                return SENT
+            except TelegramRetryAfter as e:
+                # Лимит общий для бота: ставим на паузу всех отправителей
+                self.job["retry_after_pauses"] += 1
+                logger.warning(f"Рассылка: RetryAfter {e.retry_after}с, все отправители на паузе.")
+                self.rate_limiter.block_for(e.retry_after)
+            except TelegramForbiddenError as e:
+                self._suppress[user_id] = e.message
+                return BLOCKED
+            except TelegramBadRequest as e:
+                if any(marker in e.message.lower() for marker in PERMANENT_ERROR_MARKERS):
+                    self._suppress[user_id] = e.message
+                    return BLOCKED
+                logger.info(f"Рассылка: сообщение пользователю {user_id} отклонено: {e}")
+                return FAILED
+            except (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_attempts:
+                    logger.warning(f"Рассылка: не удалось отправить пользователю {user_id} за {attempt} попыток: {e}")
+                    return FAILED
+                await asyncio.sleep(self.retry_delay_secs * (2 ** (attempt - 1)))
+                attempt += 1
+
+    async def _worker(self):
+        while True:
+            index = self._take()
+            if index is None:
+                return
+            user_id = self.job["recipients"][index]
+            try:
+                result = await self._deliver(user_id, self._variant_for(user_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
+                result = FAILED
+            self._results[index] = result
+            self._write_journal(f"d {index} {result}\n")
+            await self._report_progress()
+
+    def _launch(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def _stop_workers(self, status: str):
+        self._stopping = True
+        await asyncio.shield(self._task)
+        if self.job["status"] != RUNNING:
+            return  # Рассылка успела завершиться сама — статус DONE не перезаписываем
+        self._set_status(status)
+        logger.info(f"Рассылка {self.job['id']}: {status} на {self._processed()}/{len(self.job['recipients'])}.")
+
+    async def _run(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._journal = open(self._log_path(self.job["id"]), "a", encoding="utf-8")
+        try:
+            self._mark_unknown()
+            workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+        finally:
+            self._journal.close()
+            self._journal = None
+            self._flush_suppressions()
+        if self._stopping and self._processed() < len(self.job["recipients"]):
+            return  # Пауза или отмена: статус выставляет _stop_workers
+        self._set_status(DONE)
+        counts = self._counts()
+        logger.info(
+            f"Рассылка {self.job['id']} завершена: доставлено {counts[SENT]}, заблокировали {counts[BLOCKED]}, "
+            f"ошибок {counts[FAILED]}, прервано сбоем {counts[UNKNOWN]} из {len(self.job['recipients'])}."
+        )
+        await self._report_progress(force=True)
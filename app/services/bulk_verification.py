@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from app.core.utils import env_float, load_json_state, save_json_state
+from app.services.notifications import notify_deposit_confirmed
+from app.services.verification_scheduler import BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+# Состояния задачи
+RUNNING = "running"
+STOPPED = "stopped"
+DONE = "done"
+
+
+class BulkReverification:
+    """
+    Массовая перепроверка депозита у пользователей, застрявших в верификации
+    (is_registered = True, has_deposit = False).
+
+    Пользователи проходят через очередь по одному с паузой BULK_VERIFY_INTERVAL_SECS (2)
+    и с фоновым приоритетом планировщика, чтобы не мешать интерактивным проверкам.
+    Курсор сохраняется на диск после каждого пользователя, поэтому после падения
+    бота задача продолжается с того же места.
+    Прогресс показывается редактированием одного сообщения у администратора.
+    """
+
+    def __init__(self, bot: Bot, trading_api: Any, admin_panel: Any,
+                 state_file: str = os.path.join(DATA_DIR, "bulk_reverification.json")):
+        self.bot = bot
+        self.trading_api = trading_api
+        self.admin_panel = admin_panel
+        self.state_file = state_file
+        self.interval_secs = env_float("BULK_VERIFY_INTERVAL_SECS", 2.0, minimum=0.0)
+        self.progress_every_secs = env_float("BULK_VERIFY_PROGRESS_SECS", 5.0, minimum=1.0)
+        self.state: Dict[str, Any] = self._load_state()
+        self._task: Optional[asyncio.Task] = None
+        self._last_progress = 0.0
+
+    # --- Состояние на диске ---
+
+    def _load_state(self) -> Dict[str, Any]:
+        return load_json_state(self.state_file, "состояние перепроверки")
+
+    def _save_state(self):
+        save_json_state(self.state_file, self.state, "состояние перепроверки")
+
+    # --- Публичный интерфейс ---
+
+    def candidates(self) -> List[int]:
+        """Пользователи с регистрацией, UID и без подтверждённого депозита."""
+        result = []
+        for user_id, user in self.admin_panel.get_all_users().items():
+            if (isinstance(user, dict) and user.get("is_registered")
+                    and not user.get("has_deposit") and user.get("uid")):
+                result.append(int(user_id))
+        return result
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def progress_text(self) -> str:
+        s = self.state
+        if not s:
+            return "Перепроверка ещё не запускалась."
+        status = {RUNNING: "⏳ выполняется", STOPPED: "⏸ остановлена", DONE: "✅ завершена"}.get(s.get("status"), s.get("status"))
+        return (
+            "🔁 <b>Перепроверка депозитов</b>\n\n"
+            f"Статус: {status}\n"
+            f"Проверено: {s.get('cursor', 0)}/{len(s.get('queue', []))}\n"
+            f"Депозит подтверждён: {len(s.get('upgraded', []))}\n"
+            f"Ошибок: {s.get('errors', 0)}\n"
+            f"Уведомлять пользователей: {'да' if s.get('notify') else 'нет'}"
+        )
+
+    async def start(self, admin_chat_id: int, notify: bool) -> bool:
+        """Запускает новую задачу. False, если задача уже выполняется."""
+        if self.is_running:
+            return False
+        queue = self.candidates()
+        self.state = {
+            "status": RUNNING,
+            "queue": queue,
+            "cursor": 0,
+            "upgraded": [],
+            "errors": 0,
+            "notify": notify,
+            "admin_chat_id": admin_chat_id,
+            "progress_message_id": None,
+            "started_at": time.time(),
+        }
+        try:
+            msg = await self.bot.send_message(admin_chat_id, self.progress_text(), parse_mode="HTML")
+            self.state["progress_message_id"] = msg.message_id
+        except Exception as e:
+            logger.warning(f"Не удалось отправить сообщение прогресса перепроверки: {e}")
+        self._save_state()
+        logger.info(f"Запущена перепроверка депозитов: {len(queue)} пользователей, уведомления: {notify}.")
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    def stop(self):
+        """Останавливает задачу; продолжить можно через resume()."""
+        if self.state.get("status") == RUNNING:
+            self.state["status"] = STOPPED
+            self._save_state()
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def resume(self) -> bool:
+        """Продолжает незавершённую задачу (после остановки или падения бота)."""
+        if self.is_running or self.state.get("status") not in (RUNNING, STOPPED):
+            return False
+        if self.state.get("cursor", 0) >= len(self.state.get("queue", [])):
+            return False
+        self.state["status"] = RUNNING
+        self._save_state()
+        logger.info(f"Продолжаю перепроверку депозитов с позиции {self.state['cursor']}.")
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    def resume_if_interrupted(self) -> bool:
+        """Вызывается при старте бота: продолжает задачу, прерванную падением."""
+        if self.state.get("status") == RUNNING:
+            return self.resume()
+        return False
+
+    # --- Выполнение ---
+
+    async def _report_progress(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_every_secs:
+            return
+        self._last_progress = now
+        chat_id = self.state.get("admin_chat_id")
+        message_id = self.state.get("progress_message_id")
+        if not chat_id or not message_id:
+            return
+        try:
+            await self.bot.edit_message_text(self.progress_text(), chat_id=chat_id, message_id=message_id, parse_mode="HTML")
+        except TelegramBadRequest:
+            pass  # Текст не изменился или сообщение удалено
+
+    async def _check_one(self, user_id: int):
+        user = self.admin_panel.get_user(user_id) or {}
+        uid = user.get("uid")
+        if not uid or user.get("has_deposit"):
+            return  # Пользователь уже прошёл проверку сам, пока задача стояла в очереди
+        min_deposit = self.admin_panel.get_referral_settings().get("min_deposit", 20.0)
+        has_deposit, data = await self.trading_api.check_deposit(user_id, uid, min_deposit, priority=BACKGROUND)
+        if data.get("error"):
+            self.state["errors"] += 1
+        if has_deposit:
+            self.state["upgraded"].append(user_id)
+            if self.state.get("notify"):
+                await notify_deposit_confirmed(self.bot, user_id)
+
+    async def _run(self):
+        queue = self.state.get("queue", [])
+        try:
+            while self.state["cursor"] < len(queue):
+                user_id = queue[self.state["cursor"]]
+                try:
+                    await self._check_one(user_id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.state["errors"] += 1
+                    logger.error(f"Ошибка перепроверки пользователя {user_id}: {e}", exc_info=True)
+                self.state["cursor"] += 1
+                self._save_state()
+                await self._report_progress()
+                if self.state["cursor"] < len(queue):
+                    await asyncio.sleep(self.interval_secs)
+            self.state["status"] = DONE
+            self._save_state()
+            logger.info(
+                f"Перепроверка депозитов завершена: {len(self.state['upgraded'])} из {len(queue)} подтверждены."
+            )
+        except asyncio.CancelledError:
+            logger.info(f"Перепроверка депозитов остановлена на позиции {self.state.get('cursor')}.")
+            raise
+        finally:
+            await self._report_progress(force=True)
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.core.utils import env_int, env_float
+
+logger = logging.getLogger(__name__)
+
+# Ограничение оценки дрейфа локальных часов (500 ppm — заведомо больше реального)
+MAX_DRIFT = 500e-6
+
+
+class ServerClock:
+    """
+    Оценка времени сервера PocketOption без сетевого запроса на каждый вызов.
+
+    Периодически делает серию запросов get_server_time() и, как в NTP, берёт
+    образец с наименьшим RTT: смещение = время_сервера - середина интервала запроса.
+    По истории смещений линейной регрессией оценивается дрейф локальных часов.
+    server_now() работает за O(1) по последней оценке.
+
+    Настройки из окружения:
+      - CLOCK_SYNC_INTERVAL_SECS — интервал синхронизации (300)
+      - CLOCK_SYNC_RETRY_SECS — повтор после неудачной синхронизации (30)
+      - CLOCK_SYNC_SAMPLES — запросов в одной серии (5)
+      - CLOCK_SYNC_HISTORY — сколько серий учитывать при оценке дрейфа (12)
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[Any]]):
+        self._fetch = fetch
+        self.interval_secs = env_float("CLOCK_SYNC_INTERVAL_SECS", 300.0, minimum=5.0)
+        self.retry_secs = env_float("CLOCK_SYNC_RETRY_SECS", 30.0, minimum=1.0)
+        self.samples_per_sync = env_int("CLOCK_SYNC_SAMPLES", 5, minimum=1)
+        self.history: Deque[Tuple[float, float]] = deque(maxlen=env_int("CLOCK_SYNC_HISTORY", 12, minimum=2))
+
+        self.offset: float = 0.0
+        self.drift: float = 0.0
+        self.reference: Optional[float] = None
+        self.last_rtt: Optional[float] = None
+        self.last_sync: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sync_lock = asyncio.Lock()
+
+    # --- O(1) чтение времени ---
+
+    @property
+    def is_synced(self) -> bool:
+        return self.reference is not None
+
+    def server_now(self) -> float:
+        """Текущее время сервера (UNIX timestamp). До первой синхронизации — локальное время."""
+        local = time.time()
+        if self.reference is None:
+            return local
+        return local + self.offset + self.drift * (local - self.reference)
+
+    def server_datetime(self) -> datetime:
+        """Текущее время сервера как naive datetime в локальной зоне (как datetime.now())."""
+        return datetime.fromtimestamp(self.server_now())
+
+    def seconds_until(self, server_timestamp: float) -> float:
+        """Сколько секунд осталось до момента server_timestamp по часам сервера."""
+        return server_timestamp - self.server_now()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "offset_ms": round(self.offset * 1000, 1),
+            "drift_ppm": round(self.drift * 1e6, 2),
+            "rtt_ms": round(self.last_rtt * 1000, 1) if self.last_rtt is not None else None,
+            "last_sync": self.last_sync,
+            "samples": len(self.history),
+        }
+
+    # --- Синхронизация ---
+
+    async def _sample(self) -> Tuple[float, float, float]:
+        """Один обмен: возвращает (середина интервала, смещение, rtt)."""
+        t0 = time.time()
+        server = await self._fetch()
+        t1 = time.time()
+        server = float(server)
+        if server.is_integer():
+            # Сервер отдаёт целые секунды: берём середину секунды, чтобы не смещать оценку на 0.5с
+            server += 0.5
+        midpoint = (t0 + t1) / 2
+        return midpoint, server - midpoint, t1 - t0
+
+    def _estimate_drift(self):
+        if len(self.history) < 3:
+            self.drift = 0.0
+            return
+        xs = [x for x, _ in self.history]
+        ys = [y for _, y in self.history]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if var_x < 60.0 ** 2:
+            # Слишком короткая история для осмысленного наклона
+            self.drift = 0.0
+            return
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        self.drift = max(-MAX_DRIFT, min(MAX_DRIFT, slope))
+
+    async def sync_now(self) -> bool:
+        """Выполняет серию запросов и обновляет оценку смещения. True при успехе."""
+        async with self._sync_lock:
+            best: Optional[Tuple[float, float, float]] = None
+            for _ in range(self.samples_per_sync):
+                try:
+                    sample = await self._sample()
+                except Exception as e:
+                    logger.debug(f"Образец времени сервера не получен: {e}")
+                    continue
+                if best is None or sample[2] < best[2]:
+                    best = sample
+            if best is None:
+                logger.warning("Синхронизация времени с сервером не удалась: нет ни одного ответа.")
+                return False
+
+            midpoint, offset, rtt = best
+            self.history.append((midpoint, offset))
+            self._estimate_drift()
+            self.offset = offset
+            self.reference = midpoint
+            self.last_rtt = rtt
+            self.last_sync = time.time()
+            logger.info(
+                f"Время сервера синхронизировано: смещение {offset * 1000:+.0f} мс, "
+                f"RTT {rtt * 1000:.0f} мс, дрейф {self.drift * 1e6:+.1f} ppm."
+            )
+            return True
+
+    async def run(self):
+        """Фоновая периодическая синхронизация."""
+        logger.info(f"🚀 Запущена синхронизация времени с сервером (интервал {self.interval_secs:.0f}с).")
+        while True:
+            try:
+                ok = await self.sync_now()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации времени с сервером: {e}", exc_info=True)
+                ok = False
+            await asyncio.sleep(self.interval_secs if ok else self.retry_secs)
+
+    def start(self) -> asyncio.Task:
+        """Запускает синхронизацию, если она ещё не запущена."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Any
+
+from app.core.utils import env_int, env_float
+
+logger = logging.getLogger(__name__)
+
+# Состояния соединения с PocketOption API
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+DOWN = "down"
+
+
+class ConnectionHealthMonitor:
+    """
+    Фоновый heartbeat для соединения с API.
+
+    Периодически выполняет лёгкую проверку (probe) и хранит результат в памяти,
+    чтобы обработчики могли узнать состояние соединения за O(1), без сетевого запроса.
+    Настройки берутся из окружения:
+      - HEALTH_HEARTBEAT_INTERVAL_SECS — интервал проверки, когда всё в порядке (30)
+      - HEALTH_DEGRADED_INTERVAL_SECS — интервал проверки после ошибок (10)
+      - HEALTH_PROBE_TIMEOUT_SECS — таймаут одной проверки (10)
+      - HEALTH_DEGRADED_AFTER_FAILURES — ошибок подряд до состояния degraded (1)
+      - HEALTH_DOWN_AFTER_FAILURES — ошибок подряд до состояния down (3)
+    """
+
+    def __init__(self, probe: Callable[[], Awaitable[bool]]):
+        self._probe = probe
+        self.interval_secs = env_float("HEALTH_HEARTBEAT_INTERVAL_SECS", 30.0, minimum=1.0)
+        self.degraded_interval_secs = env_float("HEALTH_DEGRADED_INTERVAL_SECS", 10.0, minimum=1.0)
+        self.probe_timeout_secs = env_float("HEALTH_PROBE_TIMEOUT_SECS", 10.0, minimum=1.0)
+        self.degraded_after = env_int("HEALTH_DEGRADED_AFTER_FAILURES", 1, minimum=1)
+        self.down_after = max(self.degraded_after, env_int("HEALTH_DOWN_AFTER_FAILURES", 3, minimum=1))
+
+        self.state: str = DOWN
+        self.last_ok: Optional[float] = None
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._probe_lock = asyncio.Lock()
+        self._listeners: List[Callable[[str, str], Any]] = []
+
+    # --- O(1) чтение состояния ---
+
+    def is_available(self) -> bool:
+        """True, если API можно использовать (healthy или degraded)."""
+        return self.state != DOWN
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Возвращает копию текущего состояния для логов и админ-панели."""
+        return {
+            "state": self.state,
+            "last_ok": self.last_ok,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+    # --- Обновление состояния ---
+
+    def add_listener(self, listener: Callable[[str, str], Any]):
+        """Подписывает listener(old_state, new_state) на смену состояния."""
+        self._listeners.append(listener)
+
+    def _set_state(self, new_state: str):
+        if new_state != self.state:
+            old_state = self.state
+            logger.info(f"Состояние соединения с API: {old_state} -> {new_state}")
+            self.state = new_state
+            for listener in list(self._listeners):
+                try:
+                    listener(old_state, new_state)
+                except Exception as e:
+                    logger.error(f"Ошибка в обработчике смены состояния соединения: {e}", exc_info=True)
+
+    def record_success(self):
+        """Отмечает успешное обращение к API (heartbeat или обычный запрос)."""
+        now = time.time()
+        self.last_ok = now
+        self.last_check = now
+        self.last_error = None
+        self.consecutive_failures = 0
+        self._set_state(HEALTHY)
+
+    def record_failure(self, error: Any = None):
+        """Отмечает неудачное обращение к API и при необходимости понижает состояние."""
+        self.last_check = time.time()
+        self.last_error = str(error) if error is not None else None
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.down_after:
+            self._set_state(DOWN)
+        elif self.consecutive_failures >= self.degraded_after:
+            self._set_state(DEGRADED)
+
+    def mark_down(self, reason: str = ""):
+        """Немедленно переводит соединение в состояние down (например, нет сессии)."""
+        self.last_check = time.time()
+        self.last_error = reason or None
+        self.consecutive_failures = max(self.consecutive_failures, self.down_after)
+        self._set_state(DOWN)
+
+    # --- Heartbeat ---
+
+    async def check_now(self) -> str:
+        """Выполняет одну проверку прямо сейчас и возвращает новое состояние."""
+        async with self._probe_lock:
+            try:
+                ok = await asyncio.wait_for(self._probe(), timeout=self.probe_timeout_secs)
+            except asyncio.TimeoutError:
+                self.record_failure("timeout")
+            except Exception as e:
+                self.record_failure(e)
+            else:
+                if ok:
+                    self.record_success()
+                else:
+                    self.record_failure("probe returned no data")
+        return self.state
+
+    async def run(self):
+        """Бесконечный цикл heartbeat. Запускается как фоновая задача."""
+        logger.info(
+            f"🚀 Запущен heartbeat соединения с API (интервал {self.interval_secs:.0f}с, "
+            f"degraded после {self.degraded_after}, down после {self.down_after} ошибок)."
+        )
+        while True:
+            try:
+                await self.check_now()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка heartbeat соединения с API: {e}", exc_info=True)
+            interval = self.interval_secs if self.state == HEALTHY else self.degraded_interval_secs
+            await asyncio.sleep(interval)
+
+    def start(self) -> asyncio.Task:
+        """Запускает heartbeat, если он ещё не запущен."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        """Останавливает heartbeat."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.utils import env_int, env_float
+
+logger = logging.getLogger(__name__)
+
+# События / состояния жизненного цикла соединения
+CONNECTED = "connected"
+DISCONNECTED = "disconnected"
+RECONNECTING = "reconnecting"
+FAILED = "failed"
+
+
+class ConnectionSupervisor:
+    """
+    Владеет жизненным циклом PocketOptionAsync.
+
+    - Переподключается с экспоненциальной задержкой и jitter.
+    - Идемпотентные запросы, пришедшие во время обрыва, ждут восстановления
+      соединения (с таймаутом) и повторяются один раз после переподключения.
+    - После переподключения заново устанавливает зарегистрированные подписки.
+    - Рассылает события смены состояния подписчикам (фоновая проверка, уведомления админа).
+
+    Настройки из окружения:
+      - RECONNECT_BASE_DELAY_SECS — первая задержка (2)
+      - RECONNECT_MAX_DELAY_SECS — максимальная задержка (300)
+      - RECONNECT_FAILED_AFTER_ATTEMPTS — после скольких попыток отправить событие failed (5)
+      - RECONNECT_REQUEST_WAIT_SECS — сколько запрос ждёт восстановления соединения (20)
+    """
+
+    def __init__(self, connect: Callable[[], Awaitable[bool]]):
+        self._connect = connect
+        self.base_delay_secs = env_float("RECONNECT_BASE_DELAY_SECS", 2.0, minimum=0.1)
+        self.max_delay_secs = env_float("RECONNECT_MAX_DELAY_SECS", 300.0, minimum=1.0)
+        self.failed_after_attempts = env_int("RECONNECT_FAILED_AFTER_ATTEMPTS", 5, minimum=1)
+        self.request_wait_secs = env_float("RECONNECT_REQUEST_WAIT_SECS", 20.0, minimum=0.0)
+
+        self.state: str = DISCONNECTED
+        self.attempt = 0
+        self.last_error: Optional[str] = None
+        self._connected = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._listeners: List[Callable[[str, str], Any]] = []
+        self._listener_tasks: set = set()
+        self._subscriptions: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Подписчики и подписки ---
+
+    def subscribe(self, listener: Callable[[str, str], Any]):
+        """Подписывает listener(old_state, new_state) на события соединения. Может быть корутиной."""
+        self._listeners.append(listener)
+
+    def register_subscription(self, name: str, factory: Callable[[], Awaitable[Any]]):
+        """Регистрирует подписку, которую нужно восстанавливать после каждого переподключения."""
+        self._subscriptions[name] = factory
+
+    def unregister_subscription(self, name: str):
+        self._subscriptions.pop(name, None)
+
+    def _emit(self, new_state: str):
+        if new_state == self.state:
+            return
+        old_state = self.state
+        self.state = new_state
+        logger.info(f"Супервизор соединения: {old_state} -> {new_state}")
+        for listener in list(self._listeners):
+            try:
+                result = listener(old_state, new_state)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.create_task(result)
+                    self._listener_tasks.add(task)
+                    task.add_done_callback(self._listener_done)
+            except Exception as e:
+                logger.error(f"Ошибка в подписчике событий соединения: {e}", exc_info=True)
+
+    def _listener_done(self, task: asyncio.Task):
+        self._listener_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка в подписчике событий соединения: {task.exception()}", exc_info=task.exception())
+
+    # --- Состояние ---
+
+    @property
+    def is_connected(self) -> bool:
+        return self.state == CONNECTED
+
+    def mark_connected(self):
+        """Отмечает, что соединение установлено (в том числе вне супервизора, например после ручного входа)."""
+        self.attempt = 0
+        self.last_error = None
+        self._connected.set()
+        self._emit(CONNECTED)
+
+    def request_reconnect(self, reason: str = ""):
+        """Сообщает супервизору об обрыве. Повторные вызовы во время переподключения игнорируются."""
+        if self.state in (RECONNECTING, FAILED) and self._wakeup.is_set():
+            return
+        if reason:
+            self.last_error = reason
+        if self.state == CONNECTED:
+            logger.warning(f"Обрыв соединения с API: {reason or 'причина неизвестна'}. Запускаю переподключение.")
+            self._emit(DISCONNECTED)
+        self._connected.clear()
+        self._wakeup.set()
+
+    async def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт восстановления соединения не дольше timeout секунд."""
+        if self._connected.is_set():
+            return True
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # --- Выполнение запросов ---
+
+    async def call(self, operation: Callable[[], Awaitable[Any]], idempotent: bool = True, name: str = "") -> Any:
+        """
+        Выполняет запрос к API с учётом состояния соединения.
+        Идемпотентный запрос во время обрыва ждёт переподключения и повторяется один раз;
+        неидемпотентный сразу получает ConnectionError.
+        """
+        attempts = 2 if idempotent else 1
+        for attempt in range(attempts):
+            if not self._connected.is_set():
+                if not idempotent:
+                    raise ConnectionError("API недоступно: идёт переподключение.")
+                self.request_reconnect()
+                if not await self.wait_connected(self.request_wait_secs):
+                    raise ConnectionError(f"API недоступно: соединение не восстановлено за {self.request_wait_secs:.0f}с.")
+            try:
+                return await operation()
+            except (ConnectionError, asyncio.TimeoutError) as e:
+                logger.warning(f"Запрос {name or 'к API'} не выполнен из-за обрыва соединения: {e}")
+                self.request_reconnect(str(e))
+                if attempt + 1 >= attempts:
+                    raise
+
+    # --- Цикл переподключения ---
+
+    def _backoff_delay(self) -> float:
+        """Экспоненциальная задержка с equal jitter: половина фиксирована, половина случайна."""
+        capped = min(self.max_delay_secs, self.base_delay_secs * (2 ** max(0, self.attempt - 1)))
+        return capped / 2 + random.uniform(0, capped / 2)
+
+    async def _restore_subscriptions(self):
+        for name, factory in list(self._subscriptions.items()):
+            try:
+                await factory()
+                logger.info(f"Подписка '{name}' восстановлена после переподключения.")
+            except Exception as e:
+                logger.error(f"Не удалось восстановить подписку '{name}': {e}", exc_info=True)
+
+    async def _reconnect_until_connected(self):
+        while True:
+            if self._connected.is_set():
+                # Соединение подняли снаружи (например, ручной вход администратора)
+                return
+            self.attempt += 1
+            if self.state != FAILED:
+                self._emit(RECONNECTING)
+            logger.info(f"Попытка переподключения к API #{self.attempt}...")
+            try:
+                ok = await self._connect()
+            except Exception as e:
+                logger.error(f"Ошибка при переподключении к API: {e}", exc_info=True)
+                self.last_error = str(e)
+                ok = False
+
+            if ok:
+                self.mark_connected()
+                await self._restore_subscriptions()
+                return
+
+            if self.attempt >= self.failed_after_attempts:
+                self._emit(FAILED)
+            delay = self._backoff_delay()
+            logger.warning(f"Переподключение не удалось (попытка {self.attempt}). Следующая через {delay:.1f}с.")
+            await asyncio.sleep(delay)
+
+    async def run(self):
+        """Фоновая задача супервизора: ждёт сигнала об обрыве и переподключается."""
+        logger.info("🚀 Запущен супервизор соединения с API.")
+        while True:
+            await self._wakeup.wait()
+            try:
+                if not self._connected.is_set():
+                    await self._reconnect_until_connected()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка супервизора соединения: {e}", exc_info=True)
+                await asyncio.sleep(self.base_delay_secs)
+                continue
+            self._wakeup.clear()
+
+    def start(self) -> asyncio.Task:
+        """Запускает супервизор, если он ещё не запущен."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
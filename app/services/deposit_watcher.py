@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+from app.core.utils import env_float, load_json_state, save_json_state
+from app.services.notifications import notify_deposit_confirmed
+from app.services.verification_scheduler import BACKGROUND, DEPOSIT
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+
+class DepositWatcher:
+    """
+    Фоновое наблюдение за пользователями, которые прошли регистрацию и ждут депозита.
+
+    Депозит перепроверяется по адаптивному расписанию: интервал — доля
+    DEPOSIT_WATCH_BACKOFF (0.25) от времени с момента регистрации, но в пределах
+    DEPOSIT_WATCH_MIN_INTERVAL_SECS (60) … DEPOSIT_WATCH_MAX_INTERVAL_SECS (3600).
+    Через DEPOSIT_WATCH_MAX_AGE_HOURS (72) наблюдение прекращается.
+    Как только депозит найден — пользователю сразу приходит уведомление,
+    а кнопка «Счёт пополнил» просто читает статус и при необходимости
+    ускоряет проверку (nudge), не дожидаясь ответа бота. Состояние FSM
+    пользователя при этом сбрасывается, как после проверки кнопкой.
+    Список наблюдаемых сохраняется на диск (не чаще раза за такт цикла)
+    и переживает перезапуск.
+    """
+
+    def __init__(self, bot: Bot, trading_api: Any, admin_panel: Any, storage: Optional[BaseStorage] = None,
+                 state_file: str = os.path.join(DATA_DIR, "deposit_watch.json")):
+        self.bot = bot
+        self.trading_api = trading_api
+        self.admin_panel = admin_panel
+        self.storage = storage
+        self.state_file = state_file
+        self.min_interval_secs = env_float("DEPOSIT_WATCH_MIN_INTERVAL_SECS", 60.0, minimum=1.0)
+        self.max_interval_secs = env_float("DEPOSIT_WATCH_MAX_INTERVAL_SECS", 3600.0, minimum=1.0)
+        self.backoff = env_float("DEPOSIT_WATCH_BACKOFF", 0.25, minimum=0.0)
+        self.max_age_secs = env_float("DEPOSIT_WATCH_MAX_AGE_HOURS", 72.0, minimum=0.0) * 3600
+        self.nudge_cooldown_secs = env_float("DEPOSIT_WATCH_NUDGE_COOLDOWN_SECS", 15.0, minimum=0.0)
+        self.tick_secs = env_float("DEPOSIT_WATCH_TICK_SECS", 5.0, minimum=0.5)
+        self.watched: Dict[str, Dict[str, Any]] = self._load_state()
+        self._in_flight: set = set()
+        self._tasks: set = set()
+        self._dirty = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"checks": 0, "confirmed": 0, "expired": 0, "nudges": 0}
+
+    # --- Состояние на диске ---
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        return load_json_state(self.state_file, "список ожидающих депозита")
+
+    def _save_state(self):
+        save_json_state(self.state_file, self.watched, "список ожидающих депозита")
+
+    def _mark_dirty(self):
+        """Изменения пишутся на диск одним файлом в конце такта цикла (_flush_state)."""
+        self._dirty = True
+
+    def _flush_state(self):
+        if self._dirty:
+            self._dirty = False
+            self._save_state()
+
+    # --- Публичный интерфейс ---
+
+    def watch(self, user_id: int, uid: str):
+        """Начинает (или перезапускает) наблюдение после подтверждённой регистрации."""
+        now = time.time()
+        self.watched[str(user_id)] = {
+            "uid": uid, "since": now, "next_at": now + self.min_interval_secs,
+            "checks": 0, "last_check_at": 0.0, "urgent": False,
+        }
+        self._mark_dirty()
+        self._wakeup.set()
+
+    def unwatch(self, user_id: int):
+        if self.watched.pop(str(user_id), None) is not None:
+            self._mark_dirty()
+
+    def entry(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self.watched.get(str(user_id))
+
+    def nudge(self, user_id: int) -> bool:
+        """Просит проверить пользователя вне расписания (кнопка «Счёт пополнил»)."""
+        entry = self.entry(user_id)
+        if entry is None:
+            return False
+        if time.time() - entry.get("last_check_at", 0.0) < self.nudge_cooldown_secs:
+            return True  # Только что проверяли — повторный запрос к боту не нужен
+        entry["next_at"] = 0.0
+        entry["urgent"] = True
+        self.stats["nudges"] += 1
+        self._wakeup.set()
+        return True
+
+    async def confirm(self, user_id: int):
+        """Депозит подтверждён извне (постбэк): уведомляем, если пользователь ещё ждал."""
+        if self.entry(user_id) is None:
+            return
+        self.unwatch(user_id)
+        self.stats["confirmed"] += 1
+        await self._finish_verification(user_id)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "watched": len(self.watched), "in_flight": len(self._in_flight)}
+
+    # --- Расписание ---
+
+    def _interval(self, age_secs: float) -> float:
+        return min(self.max_interval_secs, max(self.min_interval_secs, age_secs * self.backoff))
+
+    async def _finish_verification(self, user_id: int):
+        """Сбрасывает ожидание депозита в FSM (как после проверки кнопкой) и уведомляет пользователя."""
+        if self.storage is not None:
+            key = StorageKey(bot_id=self.bot.id, chat_id=user_id, user_id=user_id)
+            await self.storage.set_state(key, None)
+            await self.storage.set_data(key, {})
+        await notify_deposit_confirmed(self.bot, user_id)
+
+    async def _check(self, key: str, entry: Dict[str, Any]):
+        user_id = int(key)
+        user = self.admin_panel.get_user(user_id) or {}
+        if user.get("has_deposit"):
+            # Депозит уже подтверждён другим путём (кнопка, массовая перепроверка)
+            self.unwatch(user_id)
+            return
+        now = time.time()
+        if now - entry["since"] > self.max_age_secs:
+            self.stats["expired"] += 1
+            logger.info(f"Наблюдение за депозитом пользователя {user_id} прекращено по сроку.")
+            self.unwatch(user_id)
+            return
+
+        priority = DEPOSIT if entry.get("urgent") else BACKGROUND
+        entry["urgent"] = False
+        min_deposit = self.admin_panel.get_referral_settings().get("min_deposit", 20.0)
+        self.stats["checks"] += 1
+        has_deposit, data = await self.trading_api.check_deposit(user_id, entry["uid"], min_deposit, priority=priority)
+        if self.watched.get(key) is not entry:
+            return  # Пока шла проверка, наблюдение сняли или перезапустили
+        if has_deposit:
+            self.unwatch(user_id)
+            self.stats["confirmed"] += 1
+            logger.info(f"Наблюдатель нашёл депозит пользователя {user_id} (UID {entry['uid']}).")
+            await self._finish_verification(user_id)
+            return
+        now = time.time()
+        entry["last_check_at"] = now
+        if data.get("error"):
+            entry["next_at"] = now + self.min_interval_secs
+        else:
+            entry["checks"] += 1
+            entry["next_at"] = now + self._interval(now - entry["since"])
+        self._mark_dirty()
+
+    async def _check_guarded(self, key: str, entry: Dict[str, Any]):
+        try:
+            await self._check(key, entry)
+        except Exception as e:
+            logger.error(f"Ошибка наблюдателя депозита для пользователя {key}: {e}", exc_info=True)
+            entry["next_at"] = time.time() + self.min_interval_secs
+        finally:
+            self._in_flight.discard(key)
+
+    # --- Цикл ---
+
+    async def run(self):
+        logger.info(f"Наблюдатель депозитов запущен, ожидают: {len(self.watched)}.")
+        try:
+            while True:
+                now = time.time()
+                for key, entry in list(self.watched.items()):
+                    if key not in self._in_flight and entry["next_at"] <= now:
+                        # Ограничение параллелизма и приоритеты — на стороне планировщика верификации
+                        self._in_flight.add(key)
+                        task = asyncio.create_task(self._check_guarded(key, entry))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+                self._flush_state()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.tick_secs)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._flush_state()
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
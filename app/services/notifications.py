@@ -0,0 +1,22 @@
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+import app.core.database as db
+from app.core.i18n import t
+from app.core.keyboards import get_fully_verified_keyboard
+
+logger = logging.getLogger(__name__)
+
+
+async def notify_deposit_confirmed(bot: Bot, user_id: int):
+    """Уведомление о найденном депозите с клавиатурой полного доступа (наблюдатель, массовая перепроверка)."""
+    lang = db.get_user_lang(user_id)
+    try:
+        await bot.send_message(
+            user_id, t("deposit.confirmed_notice", lang),
+            reply_markup=get_fully_verified_keyboard(lang), parse_mode="HTML"
+        )
+    except (TelegramForbiddenError, TelegramBadRequest) as e:
+        logger.info(f"Не удалось уведомить пользователя {user_id} о депозите: {e}")
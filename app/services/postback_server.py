@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import urlencode
+
+from aiohttp import ContentTypeError, web
+
+import app.core.database as db
+from app.core.utils import env_int, env_float
+from app.services.verification_parser import parse_verification_response
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+# Типы событий постбэка
+REGISTRATION = "registration"
+FIRST_DEPOSIT = "first_deposit"
+DEPOSIT = "deposit"
+
+EVENT_ALIASES = {
+    "reg": REGISTRATION, "registration": REGISTRATION, "signup": REGISTRATION,
+    "ftd": FIRST_DEPOSIT, "first_deposit": FIRST_DEPOSIT,
+    "dep": DEPOSIT, "deposit": DEPOSIT, "redeposit": DEPOSIT,
+}
+
+SIGNATURE_PARAM = "sig"
+# Идентификатор транзакции партнёрки: повтор того же события отсекается по нему, а не только по подписи
+TRANSACTION_PARAMS = ("tx", "transaction_id")
+
+
+def canonical_string(params: Mapping[str, Any]) -> str:
+    """Параметры без подписи, отсортированные по ключу и url-кодированные: "a=1&b=x%26y"."""
+    return urlencode(sorted((str(key), str(value)) for key, value in params.items() if key != SIGNATURE_PARAM))
+
+
+def sign_params(params: Mapping[str, Any], secret: str) -> str:
+    """HMAC-SHA256 (hex) канонической строки параметров."""
+    return hmac.new(secret.encode("utf-8"), canonical_string(params).encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class PostbackServer:
+    """
+    Встроенный HTTP-приёмник постбэков партнёрской программы (регистрация, депозиты).
+
+    Событие обновляет is_registered / has_deposit пользователя и кладёт в кеш
+    верификации ответ в формате партнёрского бота, поэтому большинство проверок
+    решаются локально, без запроса в Telegram.
+
+    Запрос: GET или POST на POSTBACK_PATH с параметрами
+    event (reg | ftd | deposit), uid, amount, ts (обязателен), необязательный tx —
+    id транзакции, и sig = HMAC-SHA256(POSTBACK_SECRET) от остальных параметров
+    (см. sign_params). Без POSTBACK_SECRET сервер не запускается.
+
+    Повторы: запрос с ts вне окна POSTBACK_MAX_SKEW_SECS отклоняется, а ключи
+    принятых событий (tx, иначе подпись) хранятся в data/postback_seen.json всё это
+    окно — повтор перехваченного постбэка не пройдёт и после перезапуска.
+
+    Настройки из окружения:
+      - POSTBACK_HOST / POSTBACK_PORT / POSTBACK_PATH — адрес приёмника (0.0.0.0:8080/postback)
+      - POSTBACK_SECRET — общий секрет для подписи
+      - POSTBACK_MAX_SKEW_SECS — допустимое расхождение ts с текущим временем (300)
+    """
+
+    def __init__(self, trading_api: Any, admin_panel: Any, deposit_watcher: Any = None,
+                 seen_file: str = os.path.join(DATA_DIR, "postback_seen.json")):
+        self.trading_api = trading_api
+        self.admin_panel = admin_panel
+        self.deposit_watcher = deposit_watcher
+        self.host = os.getenv("POSTBACK_HOST", "0.0.0.0")
+        self.port = env_int("POSTBACK_PORT", 8080, minimum=1)
+        self.path = os.getenv("POSTBACK_PATH", "/postback")
+        self.secret = os.getenv("POSTBACK_SECRET", "")
+        self.max_skew_secs = env_float("POSTBACK_MAX_SKEW_SECS", 300.0, minimum=0.0)
+        self.seen_file = seen_file
+        # ключ события -> время приёма; записи старше окна ts уже не нужны
+        self._seen: Dict[str, float] = self._load_seen()
+        self._save_lock = asyncio.Lock()
+        self._runner: Optional[web.AppRunner] = None
+        self.stats = {"received": 0, "accepted": 0, "rejected": 0, "duplicates": 0, "unknown_users": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.secret)
+
+    # --- Жизненный цикл ---
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("GET", self.path, self.handle)
+        app.router.add_route("POST", self.path, self.handle)
+        return app
+
+    async def start(self) -> bool:
+        if not self.enabled:
+            logger.info("POSTBACK_SECRET не задан — приёмник постбэков не запущен.")
+            return False
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            logger.error(f"Не удалось запустить приёмник постбэков на {self.host}:{self.port}: {e}")
+            await self._runner.cleanup()
+            self._runner = None
+            return False
+        logger.info(f"Приёмник постбэков слушает http://{self.host}:{self.port}{self.path}")
+        return True
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+    # --- Проверка запроса ---
+
+    def _verify(self, params: Dict[str, str]) -> Optional[str]:
+        """Возвращает причину отказа или None, если подпись и время в порядке."""
+        signature = params.get(SIGNATURE_PARAM, "")
+        if not signature or not hmac.compare_digest(signature.lower(), sign_params(params, self.secret)):
+            return "bad signature"
+        if not params.get("ts"):
+            return "missing ts"
+        try:
+            skew = abs(time.time() - float(params["ts"]))
+        except ValueError:
+            return "bad ts"
+        if skew > self.max_skew_secs:
+            return "stale ts"
+        return None
+
+    @staticmethod
+    def _event_key(params: Dict[str, str]) -> str:
+        for name in TRANSACTION_PARAMS:
+            if params.get(name):
+                return f"tx:{params[name]}"
+        return f"sig:{params[SIGNATURE_PARAM].lower()}"
+
+    def _load_seen(self) -> Dict[str, float]:
+        try:
+            with open(self.seen_file, "r", encoding="utf-8") as f:
+                seen = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (IOError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось загрузить принятые постбэки: {e}")
+            return {}
+        return {key: float(at) for key, at in seen.items()} if isinstance(seen, dict) else {}
+
+    def _write_seen(self, seen: Dict[str, float]):
+        tmp_path = f"{self.seen_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.seen_file), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(seen, f)
+            os.replace(tmp_path, self.seen_file)
+        except (IOError, OSError) as e:
+            logger.error(f"Не удалось сохранить принятые постбэки: {e}")
+
+    def _is_replay(self, key: str) -> bool:
+        """Повтор в пределах окна ts; записи за окном (с запасом на расхождение часов) удаляются."""
+        now = time.time()
+        retention = 2 * self.max_skew_secs
+        for old_key in [k for k, at in self._seen.items() if now - at > retention]:
+            del self._seen[old_key]
+        if key in self._seen:
+            return True
+        self._seen[key] = now
+        return False
+
+    async def _save_seen(self):
+        async with self._save_lock:
+            await asyncio.to_thread(self._write_seen, dict(self._seen))
+
+    # --- Обработка ---
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.stats["received"] += 1
+        params = dict(request.query)
+        if request.method == "POST":
+            try:
+                if request.content_type == "application/json":
+                    body = await request.json()
+                    if isinstance(body, dict):
+                        params.update({k: str(v) for k, v in body.items()})
+                else:
+                    params.update(await request.post())
+            except (json.JSONDecodeError, ContentTypeError, UnicodeDecodeError, ValueError):
+                self.stats["rejected"] += 1
+                return web.Response(status=400, text="bad body")
+
+        reason = self._verify(params)
+        if reason:
+            self.stats["rejected"] += 1
+            logger.warning(f"Постбэк отклонён ({reason}) от {request.remote}.")
+            return web.Response(status=403, text=reason)
+
+        event = EVENT_ALIASES.get(params.get("event", "").strip().lower())
+        uid = params.get("uid", "").strip()
+        if not event or not uid.isdigit():
+            self.stats["rejected"] += 1
+            return web.Response(status=400, text="bad event or uid")
+        try:
+            amount = float(params.get("amount") or 0)
+        except ValueError:
+            self.stats["rejected"] += 1
+            return web.Response(status=400, text="bad amount")
+
+        if self._is_replay(self._event_key(params)):
+            self.stats["duplicates"] += 1
+            return web.Response(text="duplicate")
+        await self._save_seen()
+
+        user_id = self.apply_event(event, uid, amount)
+        self.stats["accepted"] += 1
+        if user_id is not None and self.deposit_watcher is not None and self.admin_panel.is_fully_verified(user_id):
+            await self.deposit_watcher.confirm(user_id)
+        return web.Response(text="ok")
+
+    def apply_event(self, event: str, uid: str, amount: float = 0.0) -> Optional[int]:
+        """
+        Применяет событие: обновляет кеш верификации и, если UID уже привязан
+        к пользователю бота, его статусы. Возвращает user_id или None.
+        """
+        cache = self.trading_api.verification_cache
+        previous_text = cache.postback(uid) or cache.stale(uid)
+        previous = parse_verification_response(previous_text) if previous_text else {}
+        ftd_amount = previous.get("ftd_amount", 0.0)
+        sum_of_deposits = previous.get("sum_of_deposits", 0.0)
+        if event == FIRST_DEPOSIT:
+            ftd_amount = ftd_amount or amount
+        if event in (FIRST_DEPOSIT, DEPOSIT):
+            sum_of_deposits += amount
+
+        # Тот же формат, что и у партнёрского бота, — его разбирает общий парсер
+        cache.put_postback(uid, f"UID: {uid}\nFTD amount: {ftd_amount:.2f}\nSum of deposits: {sum_of_deposits:.2f}")
+        logger.info(f"Постбэк {event} для UID {uid}: FTD {ftd_amount:.2f}, всего депозитов {sum_of_deposits:.2f}.")
+
+        user_id = self.admin_panel.get_user_id_by_uid(uid)
+        if user_id is None:
+            # Пользователь ещё не ввёл UID в боте — проверка найдёт данные в кеше
+            self.stats["unknown_users"] += 1
+            return None
+        db.set_user_registered(user_id, True)
+        min_deposit = self.admin_panel.get_referral_settings().get("min_deposit", 20.0)
+        if max(ftd_amount, sum_of_deposits) >= min_deposit:
+            db.set_user_deposited(user_id, True)
+        return user_id
@@ -0,0 +1,269 @@
+import asyncio
+import inspect
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.utils import env_int, env_float
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+EXTRA_SSIDS_FILE = os.path.join(DATA_DIR, "sessions", "extra_ssids.json")
+
+
+class PooledSession:
+    """Одно websocket-соединение PocketOptionAsync и его метрики."""
+
+    def __init__(self, api: Any, ssid: str, url: Optional[str]):
+        self.api = api
+        self.ssid = ssid
+        self.url = url
+        self.outstanding = 0
+        self.latency_ewma: Optional[float] = None
+        self.failures = 0
+        self.requests = 0
+        self.created_at = time.time()
+        self.retired = False
+
+    @property
+    def label(self) -> str:
+        return self.url or "default"
+
+    def record_latency(self, seconds: float, alpha: float):
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma = alpha * seconds + (1 - alpha) * self.latency_ewma
+
+
+class SessionPool:
+    """
+    Пул websocket-сессий PocketOption.
+
+    Запросы распределяются по принципу least-outstanding-requests (при равенстве —
+    по меньшей задержке), поэтому долгий скан одного актива не блокирует запросы пользователей.
+    Медленные и сломанные соединения выбрасываются из пула и пересоздаются в фоне;
+    выброшенное соединение закрывается, когда завершатся его текущие запросы.
+    Задержка измеряется только на лёгких запросах (баланс, время сервера, heartbeat),
+    а не на выгрузке свечей, время которой зависит от объёма данных.
+
+    Настройки из окружения:
+      - POCKET_POOL_SIZE — количество соединений (1)
+      - POCKET_WS_URLS — websocket-адреса регионов через запятую (по умолчанию адрес библиотеки)
+      - POCKET_EXTRA_SSIDS_FILE — JSON-список дополнительных SSID (data/sessions/extra_ssids.json)
+      - POOL_MAX_LATENCY_SECS — средняя задержка, после которой соединение выбрасывается (5)
+      - POOL_MAX_FAILURES — ошибок подряд до выброса соединения (3)
+      - POOL_LATENCY_ALPHA — коэффициент сглаживания EWMA задержки (0.3)
+    """
+
+    def __init__(self, session_factory: Callable[[str, Optional[str]], Any]):
+        self._factory = session_factory
+        self.size = env_int("POCKET_POOL_SIZE", 1, minimum=1)
+        self.urls: List[str] = [u.strip() for u in os.getenv("POCKET_WS_URLS", "").split(",") if u.strip()]
+        self.extra_ssids_file = os.getenv("POCKET_EXTRA_SSIDS_FILE", EXTRA_SSIDS_FILE)
+        self.max_latency_secs = env_float("POOL_MAX_LATENCY_SECS", 5.0, minimum=0.1)
+        self.max_failures = env_int("POOL_MAX_FAILURES", 3, minimum=1)
+        self.latency_alpha = min(1.0, env_float("POOL_LATENCY_ALPHA", 0.3, minimum=0.01))
+        self.verify_timeout_secs = env_float("POOL_VERIFY_TIMEOUT_SECS", 15.0, minimum=1.0)
+
+        self.sessions: List[PooledSession] = []
+        self._ssids: List[str] = []
+        self._url_cursor = 0
+        self._replacements: set = set()
+        self._closing: set = set()
+
+    # --- Построение пула ---
+
+    def _load_extra_ssids(self) -> List[str]:
+        if not os.path.exists(self.extra_ssids_file):
+            return []
+        try:
+            with open(self.extra_ssids_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return [s for s in data if isinstance(s, str) and s.strip()]
+        except (IOError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось прочитать дополнительные SSID из {self.extra_ssids_file}: {e}")
+            return []
+
+    def _next_url(self) -> Optional[str]:
+        if not self.urls:
+            return None
+        url = self.urls[self._url_cursor % len(self.urls)]
+        self._url_cursor += 1
+        return url
+
+    async def _create_session(self, ssid: str, url: Optional[str]) -> Optional[PooledSession]:
+        """Создаёт соединение и проверяет его запросом баланса."""
+        try:
+            api = self._factory(ssid, url)
+            started = time.monotonic()
+            try:
+                balance = await asyncio.wait_for(api.balance(), timeout=self.verify_timeout_secs)
+            except Exception:
+                await self._close_api(api)
+                raise
+            if balance is None:
+                logger.warning(f"Соединение пула ({url or 'default'}) не вернуло баланс.")
+                await self._close_api(api)
+                return None
+            session = PooledSession(api, ssid, url)
+            session.record_latency(time.monotonic() - started, self.latency_alpha)
+            return session
+        except Exception as e:
+            logger.warning(f"Не удалось открыть соединение пула ({url or 'default'}): {e}")
+            return None
+
+    async def open(self, primary_ssid: str) -> bool:
+        """Открывает пул заново. Возвращает True, если поднялось хотя бы одно соединение."""
+        self._ssids = [primary_ssid] + [s for s in self._load_extra_ssids() if s != primary_ssid]
+        self._url_cursor = 0
+        plan = [(self._ssids[i % len(self._ssids)], self._next_url()) for i in range(self.size)]
+        created = await asyncio.gather(*(self._create_session(ssid, url) for ssid, url in plan))
+        previous, self.sessions = self.sessions, [s for s in created if s is not None]
+        for session in previous:
+            self._retire(session)
+        if self.sessions:
+            logger.info(
+                f"✅ Пул PocketOption: {len(self.sessions)}/{self.size} соединений "
+                f"({', '.join(s.label for s in self.sessions)})."
+            )
+        else:
+            logger.warning("Пул PocketOption: не удалось открыть ни одного соединения.")
+        return bool(self.sessions)
+
+    @property
+    def primary(self) -> Optional[Any]:
+        """API первого соединения — для одиночных служебных запросов (баланс, время сервера)."""
+        return self.sessions[0].api if self.sessions else None
+
+    # --- Балансировка ---
+
+    def _pick(self) -> Optional[PooledSession]:
+        if not self.sessions:
+            return None
+        return min(self.sessions, key=lambda s: (s.outstanding, s.latency_ewma or 0.0))
+
+    async def call(self, operation: Callable[[Any], Awaitable[Any]], name: str = "", lightweight: bool = False) -> Any:
+        """
+        Выполняет operation(api) на наименее загруженном соединении.
+        lightweight=True — запрос с постоянным временем ответа, по нему обновляется задержка.
+        """
+        session = self._pick()
+        if session is None:
+            raise ConnectionError("Пул PocketOption пуст: нет живых соединений.")
+        session.outstanding += 1
+        session.requests += 1
+        started = time.monotonic()
+        try:
+            result = await operation(session.api)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            session.failures += 1
+            logger.warning(f"Запрос {name or 'к API'} через {session.label} не выполнен: {e}")
+            self._maybe_evict(session)
+            raise
+        else:
+            session.failures = 0
+            if lightweight:
+                session.record_latency(time.monotonic() - started, self.latency_alpha)
+            self._maybe_evict(session)
+            return result
+        finally:
+            session.outstanding -= 1
+            if session.retired and session.outstanding == 0:
+                self._schedule_close(session)
+
+    async def probe_all(self, timeout: float) -> bool:
+        """Проверяет все соединения запросом баланса. True, если живо хотя бы одно."""
+        async def probe(session: PooledSession) -> bool:
+            started = time.monotonic()
+            try:
+                balance = await asyncio.wait_for(session.api.balance(), timeout=timeout)
+            except Exception as e:
+                session.failures += 1
+                logger.warning(f"Heartbeat соединения {session.label} не прошёл: {e}")
+                return False
+            if balance is None:
+                session.failures += 1
+                return False
+            session.failures = 0
+            session.record_latency(time.monotonic() - started, self.latency_alpha)
+            return True
+
+        sessions = list(self.sessions)
+        results = await asyncio.gather(*(probe(s) for s in sessions))
+        for session in sessions:
+            self._maybe_evict(session)
+        return any(results)
+
+    # --- Выброс и замена соединений ---
+
+    def _maybe_evict(self, session: PooledSession):
+        too_slow = session.latency_ewma is not None and session.latency_ewma > self.max_latency_secs
+        broken = session.failures >= self.max_failures
+        if not (too_slow or broken) or session not in self.sessions:
+            return
+        if len(self.sessions) == 1:
+            # Последнее соединение не выбрасываем: обрыв обработает супервизор
+            return
+        reason = "ошибки" if broken else f"задержка {session.latency_ewma:.2f}с"
+        logger.warning(f"Соединение пула {session.label} выброшено ({reason}). Пересоздаю в фоне.")
+        self.sessions.remove(session)
+        self._retire(session)
+        task = asyncio.create_task(self._replace(session.ssid))
+        self._replacements.add(task)
+        task.add_done_callback(self._replacements.discard)
+
+    async def _replace(self, ssid: str):
+        replacement = await self._create_session(ssid, self._next_url())
+        if replacement is None:
+            return
+        if ssid in self._ssids:
+            self.sessions.append(replacement)
+            logger.info(f"Соединение пула пересоздано ({replacement.label}).")
+        else:
+            # Пул открыт заново с другими SSID, пока шла замена
+            self._retire(replacement)
+
+    def _retire(self, session: PooledSession):
+        """Закрывает соединение, выведенное из пула, как только у него не останется запросов."""
+        session.retired = True
+        if session.outstanding == 0:
+            self._schedule_close(session)
+
+    def _schedule_close(self, session: PooledSession):
+        if session.api is None:
+            return
+        api, session.api = session.api, None
+        task = asyncio.create_task(self._close_api(api))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close_api(self, api: Any):
+        # Обёртка PocketOptionAsync не всегда даёт close(): тогда websocket закрывается,
+        # когда нативный клиент освобождается вместе с последней ссылкой на api
+        close = getattr(api, "close", None) or getattr(api, "disconnect", None)
+        if close is None:
+            return
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"Не удалось закрыть соединение пула: {e}")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Метрики соединений для логов и админ-панели."""
+        return [
+            {
+                "url": s.label,
+                "outstanding": s.outstanding,
+                "latency_ms": round(s.latency_ewma * 1000) if s.latency_ewma is not None else None,
+                "failures": s.failures,
+                "requests": s.requests,
+            }
+            for s in self.sessions
+        ]
@@ -1,52 +1,185 @@
 import logging
 import os
 import asyncio
+import zlib
+from typing import List, Optional, Tuple
 from telethon import TelegramClient
 from dotenv import load_dotenv
-from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError
+from telethon.errors import SessionPasswordNeededError, PhoneCodeInvalidError, FloodWaitError
+from app.core.utils import AsyncTokenBucket, env_float, env_int
 
 load_dotenv()
 
 API_ID = os.getenv("TELEGRAM_API_ID")
 API_HASH = os.getenv("TELEGRAM_API_HASH")
 SESSION_NAME = "telethon.session"
+# Extra user sessions (already logged in), comma-separated session file names
+EXTRA_SESSION_NAMES = [name.strip() for name in os.getenv("TELETHON_EXTRA_SESSIONS", "").split(",") if name.strip()]
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class TelethonClient:
+
+class TelethonFloodWait(ConnectionError):
+    """Telegram asked to wait (FloodWaitError). retry_after is the wait in seconds."""
+
+    def __init__(self, retry_after: float, operation: str = ""):
+        self.retry_after = retry_after
+        self.operation = operation
+        super().__init__(f"Telegram flood wait {retry_after:.0f}s for {operation or 'request'}")
+
+
+class TelethonSession:
+    """One logged-in Telegram user session with its own rate limiter and flood/health state."""
+
     def __init__(self, session_name, api_id, api_hash):
-        logger.info("Initializing Telethon client...")
-        self.session_name = session_name
-        self.api_id = api_id
-        self.api_hash = api_hash
-        if not self.api_id or not self.api_hash:
-            raise ValueError("API_ID and API_HASH must be set in environment variables.")
-        self.client = TelegramClient(self.session_name, int(self.api_id), self.api_hash)
+        self.name = session_name
+        self.client = TelegramClient(session_name, int(api_id), api_hash)
         self.is_connected = False
+        # Lifecycle lock: connect / login / disconnect only. Sends and reads do not take it.
         self.lock = asyncio.Lock()
-        self._phone = None
+        # Telegram limits every account separately, so each session has its own limiter;
+        # FloodWait pauses only this session
+        self.rate_limiter = AsyncTokenBucket(
+            rate=env_float("TELETHON_RATE_PER_SEC", 1.0, minimum=0.01),
+            capacity=env_float("TELETHON_BURST", 5.0, minimum=1.0),
+        )
+        self.in_flight = 0
+        self.failures = 0
+        self.stats = {"requests": 0, "flood_waits": 0, "errors": 0}
+
+    @property
+    def flood_blocked_for(self) -> float:
+        return self.rate_limiter.blocked_for
+
+    @property
+    def available(self) -> bool:
+        """Connected and authorized; may still be paused by a flood wait."""
+        return self.is_connected
 
     async def initialize(self):
         async with self.lock:
             if not self.client.is_connected():
-                logger.info("Connecting Telethon client...")
+                logger.info(f"Connecting Telethon session {self.name}...")
                 try:
                     await asyncio.wait_for(self.client.connect(), timeout=20.0)
                     self.is_connected = await self.client.is_user_authorized()
                     if self.is_connected:
                         me = await self.client.get_me()
-                        logger.info(f"✅ Telethon client initialized and connected successfully as {me.first_name}.")
+                        logger.info(f"✅ Telethon session {self.name} connected as {me.first_name}.")
                     else:
-                        logger.warning("Telethon client connected but user is not authorized. Please log in.")
+                        logger.warning(f"Telethon session {self.name} connected but user is not authorized. Please log in.")
                 except asyncio.TimeoutError:
-                    logger.error("❌ Telethon client connection timed out.")
+                    logger.error(f"❌ Telethon session {self.name} connection timed out.")
                     self.is_connected = False
                 except Exception as e:
-                    logger.error(f"❌ Failed to connect Telethon client: {e}")
+                    logger.error(f"❌ Failed to connect Telethon session {self.name}: {e}")
                     self.is_connected = False
             else:
-                logger.info("Telethon client is already connected.")
+                logger.info(f"Telethon session {self.name} is already connected.")
+
+    async def disconnect(self):
+        async with self.lock:
+            if self.client.is_connected():
+                logger.info(f"Disconnecting Telethon session {self.name}...")
+                await self.client.disconnect()
+                self.is_connected = False
+                logger.info(f"✅ Telethon session {self.name} disconnected successfully.")
+
+    async def health_check(self, timeout: float):
+        """Reconnects a dropped session and confirms that the account is still authorized."""
+        if not self.client.is_connected():
+            self.is_connected = False
+            await self.initialize()
+            return
+        try:
+            self.is_connected = await asyncio.wait_for(self.client.is_user_authorized(), timeout=timeout)
+            self.failures = 0
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Telethon session {self.name} health check failed ({self.failures}): {e}")
+            if self.failures >= 3:
+                self.is_connected = False
+
+    async def _ensure_connected(self):
+        """Connects under the lifecycle lock only when needed; the connected path takes no lock."""
+        if not self.is_connected:
+            await self.initialize()
+        if not self.is_connected:
+            raise ConnectionError(f"Telethon session {self.name} is not connected.")
+
+    async def call(self, operation: str, factory):
+        """Runs a rate-limited request and turns FloodWaitError into TelethonFloodWait."""
+        await self._ensure_connected()
+        await self.rate_limiter.acquire()
+        self.in_flight += 1
+        self.stats["requests"] += 1
+        try:
+            return await factory(self.client)
+        except FloodWaitError as e:
+            self.stats["flood_waits"] += 1
+            logger.warning(f"Telegram FloodWait for {operation} on {self.name}: pausing this session for {e.seconds}s.")
+            self.rate_limiter.block_for(e.seconds)
+            raise TelethonFloodWait(e.seconds, operation) from e
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "connected": self.is_connected,
+            "in_flight": self.in_flight,
+            "flood_blocked_for": round(self.flood_blocked_for, 1),
+            **self.stats,
+        }
+
+
+class TelethonClient:
+    """
+    Pool of Telegram user sessions. The primary session (session_name) is the one
+    managed by the login flow; extra sessions from TELETHON_EXTRA_SESSIONS must be
+    logged in already. Requests with a shard key stick to one session and move to
+    another one while that session is flood-blocked or unhealthy.
+    """
+
+    def __init__(self, session_name, api_id, api_hash, extra_session_names: Optional[List[str]] = None):
+        logger.info("Initializing Telethon client...")
+        self.session_name = session_name
+        self.api_id = api_id
+        self.api_hash = api_hash
+        if not self.api_id or not self.api_hash:
+            raise ValueError("API_ID and API_HASH must be set in environment variables.")
+        self.sessions: List[TelethonSession] = [TelethonSession(session_name, api_id, api_hash)]
+        for name in extra_session_names or []:
+            if name != session_name:
+                self.sessions.append(TelethonSession(name, api_id, api_hash))
+        self.primary = self.sessions[0]
+        self.client = self.primary.client
+        self.lock = self.primary.lock
+        self.rate_limiter = self.primary.rate_limiter
+        self.health_interval_secs = env_float("TELETHON_HEALTH_INTERVAL_SECS", 60.0, minimum=5.0)
+        self.health_timeout_secs = env_float("TELETHON_HEALTH_TIMEOUT_SECS", 10.0, minimum=1.0)
+        self.max_failovers = env_int("TELETHON_MAX_FAILOVERS", 2, minimum=0)
+        self._health_task: Optional[asyncio.Task] = None
+        self._phone = None
+
+    @property
+    def is_connected(self) -> bool:
+        """State of the primary (login-managed) session."""
+        return self.primary.is_connected
+
+    @is_connected.setter
+    def is_connected(self, value: bool):
+        self.primary.is_connected = value
+
+    async def initialize(self):
+        await asyncio.gather(*(session.initialize() for session in self.sessions))
+        if len(self.sessions) > 1:
+            ready = sum(1 for s in self.sessions if s.is_connected)
+            logger.info(f"Telethon pool: {ready}/{len(self.sessions)} sessions ready.")
 
     async def start_login(self, phone_number: str):
         async with self.lock:
@@ -78,31 +211,79 @@ class TelethonClient:
             return self.is_connected
 
     async def disconnect(self):
-        async with self.lock:
-            if self.client.is_connected():
-                logger.info("Disconnecting Telethon client...")
-                await self.client.disconnect()
-                self.is_connected = False
-                logger.info("✅ Telethon client disconnected successfully.")
+        self.stop_health_checks()
+        await asyncio.gather(*(session.disconnect() for session in self.sessions))
+
+    # --- Session selection ---
+
+    def pick_session(self, shard_key: Optional[str] = None, exclude: Tuple[TelethonSession, ...] = ()) -> TelethonSession:
+        """
+        Sticky choice by shard key (same key -> same account while it is healthy);
+        otherwise the least loaded session that is not flood-blocked.
+        """
+        candidates = [s for s in self.sessions if s.available and s not in exclude]
+        if not candidates:
+            return self.primary
+        ready = [s for s in candidates if s.flood_blocked_for == 0]
+        if shard_key is not None:
+            preferred = self.sessions[zlib.crc32(str(shard_key).encode("utf-8")) % len(self.sessions)]
+            if preferred in ready:
+                return preferred
+        return min(ready or candidates, key=lambda s: (s.flood_blocked_for, s.in_flight))
+
+    async def _call(self, operation: str, factory, shard_key: Optional[str] = None) -> Tuple[TelethonSession, object]:
+        """Runs the request on a pooled session; on FloodWait moves to another session if one is free."""
+        tried: Tuple[TelethonSession, ...] = ()
+        while True:
+            session = self.pick_session(shard_key, exclude=tried)
+            try:
+                return session, await session.call(operation, factory)
+            except TelethonFloodWait:
+                tried += (session,)
+                alternatives = [s for s in self.sessions if s.available and s not in tried and s.flood_blocked_for == 0]
+                if len(tried) > self.max_failovers or not alternatives:
+                    raise
+                logger.info(f"Session {session.name} is flood-blocked, retrying {operation} on another session.")
+
+    async def send_sharded(self, entity, message, shard_key: Optional[str] = None) -> Tuple[TelethonSession, object]:
+        """Sends a message through the pool; returns the session used (replies arrive on that account)."""
+        return await self._call("send_message", lambda client: client.send_message(entity, message), shard_key)
 
     async def send_message(self, entity, message):
-        async with self.lock:
-            if not self.is_connected:
-                await self.initialize()
-            if not self.is_connected:
-                raise ConnectionError("Telethon client is not connected.")
-            return await self.client.send_message(entity, message)
+        _, sent = await self.send_sharded(entity, message)
+        return sent
+
+    def add_event_handler(self, callback, event):
+        """Registers an update handler on every session in the pool (no lock needed)."""
+        for session in self.sessions:
+            session.client.add_event_handler(callback, event)
 
     async def get_messages(self, entity, limit=1):
-        messages = []
-        async with self.lock:
-            if not self.is_connected:
-                await self.initialize()
-            if not self.is_connected:
-                raise ConnectionError("Telethon client is not connected.")
-            async for message in self.client.iter_messages(entity, limit=limit):
-                messages.append(message)
+        _, messages = await self._call("get_messages", lambda client: client.get_messages(entity, limit=limit))
         return messages
 
+    # --- Health checks ---
+
+    async def run_health_checks(self):
+        while True:
+            await asyncio.sleep(self.health_interval_secs)
+            await asyncio.gather(
+                *(session.health_check(self.health_timeout_secs) for session in self.sessions),
+                return_exceptions=True,
+            )
+
+    def start_health_checks(self) -> asyncio.Task:
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self.run_health_checks())
+        return self._health_task
+
+    def stop_health_checks(self):
+        if self._health_task and not self._health_task.done():
+            self._health_task.cancel()
+        self._health_task = None
+
+    def snapshot(self) -> List[dict]:
+        return [session.snapshot() for session in self.sessions]
+
 # Singleton instance
-telethon_client = TelethonClient(SESSION_NAME, API_ID, API_HASH)
\ No newline at end of file
+telethon_client = TelethonClient(SESSION_NAME, API_ID, API_HASH, EXTRA_SESSION_NAMES)
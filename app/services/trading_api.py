@@ -7,6 +7,7 @@ import json
 import random
 from typing import Dict, Optional, List, Tuple, Any
 import asyncio
+from contextlib import asynccontextmanager
 try:
     from BinaryOptionsToolsV2.pocketoption import PocketOptionAsync
 except Exception:
@@ -34,7 +35,15 @@ import re
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 import app.core.database as db
 import traceback
-from app.core.utils import async_retry
+from app.core.utils import async_retry, env_float
+from app.services.connection_health import ConnectionHealthMonitor, DOWN, HEALTHY
+from app.services.connection_supervisor import ConnectionSupervisor
+from app.services.session_pool import SessionPool
+from app.services.clock_sync import ServerClock
+from app.services.affiliate_replies import AffiliateReplyRouter
+from app.services.verification_cache import VerificationCache
+from app.services.verification_parser import parse_verification_response
+from app.services.verification_scheduler import VerificationScheduler, VerificationQueueFull, INTERACTIVE, DEPOSIT
 
 # Налаштування логування
 # -> Настройка логирования
@@ -81,11 +90,29 @@ class TradingAPI:
         self.pair_cache: Dict[str, Tuple[List[str], datetime]] = {}
         self.cache_expiry = timedelta(minutes=5)
         self._lock = asyncio.Lock()  # Додаємо лок
-        # --- Кеш для відповідей верифікації ---
-        self.verification_cache: Dict[str, Tuple[str, datetime]] = {}
-        self.verification_cache_expiry = timedelta(minutes=5)
-        # Add a lock for verification to prevent race conditions
-        self.verification_lock = asyncio.Lock()
+        # --- Кеш для відповідей верифікації (LRU+TTL, зберігається на диск) ---
+        self.verification_cache = VerificationCache()
+        # Per-UID locks: the same UID is never in flight twice, different UIDs go in parallel.
+        # uid -> [lock, number of users]
+        self.verification_locks: Dict[str, list] = {}
+        # Minimal pause between sends to the affiliate bot
+        self.affiliate_send_interval = env_float("AFFILIATE_SEND_INTERVAL_SECS", 0.5, minimum=0.0)
+        self._affiliate_send_lock = asyncio.Lock()
+        self._affiliate_last_send = 0.0
+        # Ответы партнёрского бота приходят событиями Telethon, без опроса чата
+        self.affiliate_replies = AffiliateReplyRouter()
+        # Пріоритетна черга запитів до партнерського бота (AFFILIATE_MAX_IN_FLIGHT воркерів)
+        self.verification_scheduler = VerificationScheduler(self._request_affiliate_reply)
+        # --- Кешоване состояние соединения (heartbeat) ---
+        self.health = ConnectionHealthMonitor(self._health_probe)
+        # --- Супервизор жизненного цикла PocketOptionAsync (переподключение) ---
+        self.supervisor = ConnectionSupervisor(self._open_session)
+        # --- Пул websocket-сессий для рыночных данных ---
+        self.pool = SessionPool(lambda ssid, url: PocketOptionAsync(ssid, url=url))
+        # --- Оценка времени сервера (смещение + дрейф), без запроса на каждый сигнал ---
+        self.clock = ServerClock(self._fetch_server_time)
+        self.supervisor.register_subscription("clock_sync", self.clock.sync_now)
+        self.health.add_listener(self._on_health_change)
 
     def set_admin_panel(self, admin_panel: Any):
         """Встановлює об'єкт AdminPanel після ініціалізації."""
@@ -100,29 +127,43 @@ class TradingAPI:
         ssid = await self.auth.get_active_ssid()
         if ssid:
             try:
-                self.api = PocketOptionAsync(ssid)
-                # The library connects implicitly. We verify by fetching the balance.
-                balance = await self.api.balance()
-                if balance is not None:
+                # Бібліотека підключається неявно; пул перевіряє кожне з'єднання запитом балансу.
+                if await self.pool.open(ssid):
+                    self.api = self.pool.primary
                     self.is_initialized = True
-                    logger.info(f"✅ API успішно ініціалізовано з існуючої сесії. Баланс: {balance}")
+                    self.health.record_success()
+                    self.supervisor.mark_connected()
+                    logger.info("✅ API успішно ініціалізовано з існуючої сесії.")
                     return True
                 else:
                     self.is_initialized = False
+                    self.health.mark_down("balance is None")
                     logger.warning("Не вдалося отримати баланс з існуючою сесією. Можливо, вона недійсна.")
                     return False
             except Exception as e:
                 logger.error(f"Не вдалося підключитися до API з існуючим SSID: {e}", exc_info=True)
                 self.is_initialized = False
+                self.health.mark_down(str(e))
                 return False
         else:
             logger.warning("Активная сессия не найдена. Требуется ручная авторизация.")
             self.is_initialized = False
+            self.health.mark_down("no active session")
             return False
 
+    async def _open_session(self) -> bool:
+        """Відкриває нову сесію API для супервізора переподключень."""
+        return await self.initialize_session()
+
+    def _on_health_change(self, old_state: str, new_state: str):
+        """Якщо heartbeat визнав з'єднання мертвим — передаємо це супервізору."""
+        if new_state == DOWN and self.supervisor.is_connected:
+            self.supervisor.request_reconnect(self.health.last_error or "heartbeat: connection down")
+
     def set_telethon_client(self, client: Any):
         """Встановлює клієнт Telethon після його ініціалізації."""
         self.telethon_client = client
+        self.affiliate_replies.attach(client, self.affiliate_bot_username)
 
     async def _connect_to_api(self, ssid: str) -> bool:
         try:
@@ -130,20 +171,21 @@ class TradingAPI:
                 return True
             
             logger.info("Підключення до PocketOption API...")
-            self.api = PocketOptionAsync(ssid)
-            await asyncio.sleep(2)
-
-            balance = await self.api.balance()
-            if balance is not None:
+            if await self.pool.open(ssid):
+                self.api = self.pool.primary
                 self.is_initialized = True
+                self.health.record_success()
+                self.supervisor.mark_connected()
                 self.last_login_time = datetime.now()
-                logger.info(f"✅ API успішно ініціалізовано. Баланс: {balance}")
+                logger.info("✅ API успішно ініціалізовано.")
                 return True
             else:
                 logger.warning("Не удалось получить баланс. Возможно, сессия недействительна.")
+                self.health.mark_down("connect: balance unavailable")
                 return False
         except Exception as e:
             logger.error(f"❌ Помилка підczas підключення до API: {e}", exc_info=True)
+            self.health.mark_down(str(e))
             return False
 
     async def _ensure_initialized(self):
@@ -153,24 +195,28 @@ class TradingAPI:
                 "API не ініціалізовано. Потрібна авторизація."
             )
 
-    @async_retry(max_retries=3, delay=2, allowed_exceptions=(ConnectionError, asyncio.TimeoutError))
     async def get_candles(
         self, asset: str, timeframe: int = 60, count: int = 100
     ) -> Optional[pd.DataFrame]:
         try:
-            await self._ensure_initialized()
             offset = timeframe * count
-            candles = await self.api.get_candles(asset, timeframe, offset)
+            # Запит іде на найменш завантажене з'єднання пулу; під час обриву
+            # чекає переподключення і повторюється супервізором
+            candles = await self.supervisor.call(
+                lambda: self.pool.call(lambda api: api.get_candles(asset, timeframe, offset), name=f"get_candles({asset})"),
+                name=f"get_candles({asset})",
+            )
             if not candles:
                 logger.warning(f"Не отримано свічки для {asset}")
                 return None
+            self.health.record_success()
             df = pd.DataFrame(candles)
             df["time"] = pd.to_datetime(df["time"])
             return df
-        except ConnectionError as e:
+        except (ConnectionError, asyncio.TimeoutError) as e:
             logger.error(str(e))
-            self.is_initialized = False # Mark as disconnected on connection error
-            raise # Re-raise to be caught by retry decorator
+            self.health.record_failure(e)
+            raise
         except Exception as e:
             logger.error(f"❌ Помилка під час отримання свічок для {asset}: {e}")
             # Do not retry on general exceptions, just return None
@@ -270,17 +316,18 @@ class TradingAPI:
             )
             return False
 
-    @async_retry(max_retries=3, delay=2, allowed_exceptions=(ConnectionError, asyncio.TimeoutError))
     async def get_balance(self) -> Optional[float]:
         try:
-            if not self.is_initialized or not self.api:
-                raise ConnectionError("API не ініціалізовано.")
-            balance = await self.api.balance()
+            balance = await self.supervisor.call(
+                lambda: self.pool.call(lambda api: api.balance(), name="balance", lightweight=True), name="balance"
+            )
+            if balance is not None:
+                self.health.record_success()
             return balance
-        except ConnectionError as e:
+        except (ConnectionError, asyncio.TimeoutError) as e:
             logger.error(str(e))
-            self.is_initialized = False # Mark as disconnected
-            raise # Re-raise to be caught by retry decorator
+            self.health.record_failure(e)
+            raise
         except Exception as e:
             logger.error(f"Помилка під час отримання балансу: {e}")
             return None
@@ -316,7 +363,7 @@ class TradingAPI:
     def _get_random_signal_data(self, pair: str, expiration_time: int) -> dict:
         """Генерує випадкові, але правдоподібні дані для сигналу в новому форматі."""
         direction = random.choice(["call", "put"])
-        now = datetime.now()
+        now = self.clock.server_datetime()
         close_time = now + timedelta(minutes=expiration_time)
 
         return {
@@ -383,56 +430,108 @@ class TradingAPI:
                         f"Не удалось отправить уведомление администратору: {e}"
                     )
 
-    @async_retry(max_retries=2, delay=3, allowed_exceptions=(asyncio.TimeoutError, ConnectionError))
+    async def _health_probe(self) -> bool:
+        """Лёгкая проверка для heartbeat: запрос баланса по каждому соединению пула."""
+        if not self.is_initialized or not self.api:
+            return False
+        alive = await self.pool.probe_all(self.health.probe_timeout_secs)
+        self.api = self.pool.primary
+        return alive
+
+    async def _fetch_server_time(self) -> int:
+        """Один запит часу сервера для синхронізації годинника."""
+        if not self.is_api_available():
+            raise ConnectionError("API недоступне для синхронізації часу.")
+        return await self.pool.call(lambda api: api.get_server_time(), name="server_time", lightweight=True)
+
+    def is_api_available(self) -> bool:
+        """
+        O(1) проверка доступности API по кешированному состоянию heartbeat.
+        Используется обработчиками вместо живого запроса на каждое нажатие.
+        """
+        return self.supervisor.is_connected and self.api is not None and self.health.is_available()
+
     async def is_api_connection_alive(self) -> bool:
         """
-        Performs a live check to see if the API connection is truly active
-        by fetching the balance. Returns False if the API is not initialized
-        or if the balance check fails.
+        Performs a live check (one balance round-trip through the health monitor)
+        and updates the cached connection state. Returns False if the API is not
+        initialized or the probe did not leave the connection healthy.
+        Prefer is_api_available() in request handlers.
         """
         if not self.is_initialized or not self.api:
-                return False
-        try:
-            # A lightweight check to confirm the connection is active
-            balance = await asyncio.wait_for(self.api.balance(), timeout=10.0)
-            return balance is not None
-        except (asyncio.TimeoutError, ConnectionError) as e:
-            logger.warning(f"API connection check failed: {e}")
-            self.is_initialized = False # Mark as disconnected
-            raise e # Reraise to be caught by the retry decorator
-        except Exception as e:
-            logger.error(f"An unexpected error occurred during API connection check: {e}")
-            self.is_initialized = False # Mark as disconnected
+            self.health.mark_down("API not initialized")
             return False
+        return await self.health.check_now() == HEALTHY
 
-    async def _reconnect(self):
-        """Спроба перепідключення до API."""
+    async def _reconnect(self) -> bool:
+        """Просить супервізор перепідключитися і чекає результату."""
         logger.info("Спроба перепідключення до API...")
-        await self.initialize_session()
-
-    @async_retry(max_retries=3, delay=5, allowed_exceptions=(Exception,))
-    async def _send_verification_request(self, uid: str, force_refresh: bool = False) -> Optional[str]:
+        self.supervisor.request_reconnect("manual reconnect")
+        return await self.supervisor.wait_connected(self.supervisor.request_wait_secs)
+
+    @asynccontextmanager
+    async def _uid_lock(self, uid: str):
+        """Блокування на рівні одного UID; запис видаляється, коли UID ніхто не використовує."""
+        entry = self.verification_locks.get(uid)
+        if entry is None:
+            entry = self.verification_locks[uid] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self.verification_locks.pop(uid, None)
+
+    async def _pace_affiliate_send(self):
         """
-        Asynchronously sends a UID for verification to the affiliate bot and retrieves the response.
-
-        Uses a short-lived cache to avoid duplicate requests and a lock to prevent races.
-        Adds tolerance for Telegram server/client time skew to avoid missing valid replies.
+        Витримує мінімальний інтервал між повідомленнями партнерському боту.
+        Інтервал ділиться на кількість сесій у пулі Telethon: кожен акаунт має власний ліміт.
+        """
+        sessions = len(getattr(self.telethon_client, "sessions", None) or [None])
+        async with self._affiliate_send_lock:
+            wait = self._affiliate_last_send + self.affiliate_send_interval / sessions - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._affiliate_last_send = time.monotonic()
+
+    async def _send_verification_request(
+        self,
+        uid: str,
+        force_refresh: bool = False,
+        priority: int = INTERACTIVE,
+        on_position: Optional[Any] = None,
+    ) -> Optional[str]:
         """
-        now = datetime.now()
+        Returns the affiliate bot's reply for a UID.
 
+        Served from the verification cache when possible; otherwise the UID goes through
+        the priority scheduler (deduplication, backpressure, explicit retries).
+        on_position(position) is called while the request waits in the queue.
+        Raises VerificationQueueFull when the queue is too deep.
+        """
         # Check cache first
-        if not force_refresh and uid in self.verification_cache:
-            response_text, timestamp = self.verification_cache[uid]
-            if now - timestamp < self.verification_cache_expiry:
+        if not force_refresh:
+            hit, response_text = self.verification_cache.get(uid)
+            if hit:
                 logger.info(f"Повертаю кешовану відповідь для UID: {uid}")
                 return response_text
 
-        # Use a lock to prevent race conditions for new UIDs
-        async with self.verification_lock:
+        return await self.verification_scheduler.submit(uid, priority, force_refresh, on_position)
+
+    async def _request_affiliate_reply(self, uid: str, force_refresh: bool = False) -> Optional[str]:
+        """
+        One round-trip with the affiliate bot, executed by a scheduler worker.
+        The reply is delivered by AffiliateReplyRouter as soon as the bot answers.
+        Telethon errors propagate so the scheduler can retry.
+        """
+        # Per-UID lock: concurrent requests for the same UID share one round-trip
+        async with self._uid_lock(uid):
             # Double-check cache inside the lock
-            if not force_refresh and uid in self.verification_cache:
-                response_text, timestamp = self.verification_cache[uid]
-                if now - timestamp < self.verification_cache_expiry:
+            if not force_refresh:
+                hit, response_text = self.verification_cache.get(uid)
+                if hit:
                     logger.info(f"Повертаю кешовану відповідь (після блокування) для UID: {uid}")
                     return response_text
 
@@ -444,184 +543,58 @@ class TradingAPI:
 
                 logger.info(f"Надсилання запиту на верифікацію для UID: {uid}")
 
-                # Send the UID to the verification bot
-                sent_at = datetime.now(timezone.utc)
-                sent_msg = await self.telethon_client.send_message(self.affiliate_bot_username, uid)
-                sent_id = getattr(sent_msg, 'id', None)
-
-                # Wait for response, polling the chat
+                # Wait for response: the reply router resolves it from a NewMessage event
                 try:
                     timeout_env = os.getenv("AFFILIATE_RESPONSE_TIMEOUT_SECS", "30")
                     timeout_secs = max(5, int(timeout_env))
                 except Exception:
                     timeout_secs = 30
 
+                self.affiliate_replies.attach(self.telethon_client, self.affiliate_bot_username)
+                await self._pace_affiliate_send()
+                pending = self.affiliate_replies.expect(uid)
                 try:
-                    skew_env = os.getenv("AFFILIATE_TIME_SKEW_TOLERANCE_SECS", "10")
-                    skew_secs = max(0, int(skew_env))
+                    # Send the UID to the verification bot; the UID is the shard key, so repeated
+                    # checks of one UID stay on one account while it is not flood-blocked
+                    session, sent_msg = await self.telethon_client.send_sharded(self.affiliate_bot_username, uid, shard_key=uid)
                 except Exception:
-                    skew_secs = 10
-
-                poll_interval = 1
-                deadline = datetime.now() + timedelta(seconds=timeout_secs)
-                response_text: Optional[str] = None
-                fallback_text: Optional[str] = None
-
-                while datetime.now() < deadline:
-                    # Fetch a slightly larger window to avoid missing replies
-                    messages = await self.telethon_client.get_messages(self.affiliate_bot_username, limit=25)
-                    for msg in messages:
-                        # Only incoming replies
-                        if bool(getattr(msg, 'out', False)):
-                            continue
-
-                        text = (getattr(msg, 'text', '') or '')
-                        msg_dt = getattr(msg, 'date', None)
-
-                        # Accept messages newer than (sent_at - skew)
-                        if msg_dt:
-                            if msg_dt.tzinfo is None:
-                                msg_dt_cmp = msg_dt.replace(tzinfo=timezone.utc)
-                            else:
-                                msg_dt_cmp = msg_dt.astimezone(timezone.utc)
-                            if msg_dt_cmp < sent_at - timedelta(seconds=skew_secs):
-                                continue
-
-                        # 1) Prefer replies that reference our sent message
-                        reply_to_id = getattr(msg, 'reply_to_msg_id', None)
-                        if sent_id is not None and reply_to_id == sent_id:
-                            response_text = text
-                            break
-
-                        # 2) Then prefer texts that contain the UID
-                        if uid and uid in text:
-                            response_text = text
-                            break
-
-                        # 3) Otherwise remember the first acceptable incoming message as fallback
-                        if not fallback_text:
-                            fallback_text = text
-
-                    if response_text:
-                        break
-
-                    await asyncio.sleep(poll_interval)
-
-                # If no strong match found, use fallback if present
-                if not response_text and fallback_text:
-                    logger.info("Використовую fallback-відповідь (без UID/без reply_to), але в допустимому вікні часу")
-                    response_text = fallback_text
+                    self.affiliate_replies.discard(pending)
+                    raise
+                self.affiliate_replies.bind_sent_message(pending, getattr(sent_msg, 'id', None), session.client)
+                response_text = await self.affiliate_replies.wait(pending, timeout_secs)
 
                 if response_text:
                     logger.info(f"Отримано відповідь для UID {uid}: '{response_text}'")
-                    self.verification_cache[uid] = (response_text, now)
+                    parsed = self._parse_verification_response(response_text)
+                    self.verification_cache.put(uid, response_text, found=parsed.get('is_found', False))
                     return response_text
                 else:
                     logger.warning(f"Не отримано відповіді від бота для UID: {uid} за {timeout_secs}с")
+                    # Negative-cache the error briefly so retries do not hammer the affiliate bot
+                    self.verification_cache.put_error(uid)
                     # Best-effort fallback: reuse cached value if present (even if expired)
-                    cached = self.verification_cache.get(uid)
-                    if cached:
-                        cached_text, _ = cached
+                    cached_text = self.verification_cache.stale(uid)
+                    if cached_text:
                         logger.info(f"Використовую кешовану відповідь для UID {uid} після таймауту")
-                        return cached_text
-                    return None
+                    return cached_text
 
             except Exception as e:
                 logger.error(f"Помилка підczas взаємодії з Telethon: {e}", exc_info=True)
-                # Re-raise for retry
+                # Re-raise: the scheduler decides whether to retry
                 raise
 
-    async def _parse_verification_response(self, response_text: str) -> dict:
+    def _parse_verification_response(self, response_text: str) -> dict:
         """
         Парсить текстову відповідь від верифікаційного бота в словник.
-        Цей парсер стійкий до варіацій у пробілах, регістрах та символах-роздільниках.
+        Синхронний: регулярні вирази та таблиця аліасів скомпільовані один раз у verification_parser.
         """
-        data = {}
-        # Паттерн для очищення значень (видалення $, %, і пробілів, крім десяткової крапки)
-        # Разрешаем цифры, точку и минус (на случай возвратов/отрицательных значений)
-        cleanup_pattern = re.compile(r'[^0-9.\-]+')
-        nbsp = '\u00A0'
-        # Алиасы ключей (EN/UA/RU) -> канонические имена
-        key_aliases = {
-            'uid': {'uid', 'user_id', 'id', 'айди', 'ід'},
-            'balance': {'balance', 'баланс'},
-            'ftd_amount': {'ftd_amount', 'ftd', 'ftd_sum', 'first_deposit', 'первый_депозит', 'перший_депозит'},
-            'sum_of_deposits': {'sum_of_deposits', 'total_deposits', 'deposits_sum', 'сумма_депозитов', 'сума_депозитів', 'общая_сумма_депозитов'},
-            'sum_of_bonuses': {'sum_of_bonuses', 'bonuses', 'сумма_бонусов', 'сума_бонусів'},
-            'commission': {'commission', 'комиссия', 'комісія'},
-        }
-        # Обратная карта алиасов
-        alias_to_canonical = {}
-        for canon, aliases in key_aliases.items():
-            for a in aliases:
-                alias_to_canonical[a] = canon
-         
-        # Обробляємо рядки до роздільника '--------------------------'
-        if '--------------------------' in response_text:
-            response_text = response_text.split('--------------------------')[0]
-
-        lines = response_text.strip().split('\n')
-
-        for line in lines:
-            # Використовуємо regex для гнучкого розділення ключ-значення
-            # Дозволяє різні роздільники (:, -, –) та пробіли навколо них.
-            match = re.match(r'^(.*?)\s*[:\-–]\s*(.*)$', line)
-            if not match:
-                continue
-
-            key, value = match.groups()
-            key = key.strip().lower().replace(" ", "_")
-            value = value.strip()
-            # Нормализуем ключ по алиасам, если возможно
-            canonical_key = alias_to_canonical.get(key, key)
-            
-            # Пропускаємо порожні ключі або значення
-            if not key or not value:
-                continue
-            
-            # Спеціальна обробка для числових значень
-            numeric_keys = {"balance", "ftd_amount", "sum_of_deposits", "sum_of_bonuses", "commission"}
-            if canonical_key in numeric_keys:
-                try:
-                    # Поддержка десятичной запятой: если есть запятая и нет точки — считаем ',' десятичной
-                    raw = value.replace(' ', '').replace(nbsp, '')
-                    if ',' in raw and '.' not in raw:
-                        raw = raw.replace(',', '.')
-                    # Удаляем валюты/символы, оставляем только цифры, точку и минус
-                    cleaned_value = cleanup_pattern.sub('', raw)
-                    data[canonical_key] = float(cleaned_value) if cleaned_value else 0.0
-                except (ValueError, TypeError):
-                    data[canonical_key] = 0.0 # За замовчуванням 0, якщо конвертація не вдалася
-            else:
-                data[canonical_key] = value
-
-        # Перевіряємо, чи користувач не знайдений
-        # Використовуємо гнучкий пошук з урахуванням різних формулювань.
-        not_found_patterns = [
-            r'user\s+with\s+this\s+id\s+not\s+found',
-            r'user\s+not\s+found',
-            r'no\s+such\s+user',
-            r'користувача\s+не\s+знайдено',
-            r'пользовател[ья]\s+не\s+найден'
-        ]
-        if any(re.search(p, response_text, re.IGNORECASE) for p in not_found_patterns):
-            data['is_found'] = False
-            # Явно сбрасываем числовые поля, чтобы избежать ложных срабатываний
-            data.pop('uid', None)
-            data.pop('balance', None)
-            data.pop('ftd_amount', None)
-            data.pop('sum_of_deposits', None)
-            data.pop('sum_of_bonuses', None)
-        else:
-            # Вважаємо, що користувач знайдений, якщо є UID або інші дані
-            data['is_found'] = 'uid' in data or len(data) > 0
-            
-        return data
+        return parse_verification_response(response_text)
 
-    async def check_registration(self, user_id: str, uid: str) -> Tuple[bool, Dict[str, Any]]:
+    async def check_registration(self, user_id: str, uid: str, on_position: Optional[Any] = None) -> Tuple[bool, Dict[str, Any]]:
         """
         Перевіряє, чи користувач зареєстрований через партнерське посилання.
         Повертає кортеж: (is_registered, parsed_data).
+        Якщо черга верифікації переповнена — parsed_data містить {"error": "queue_full"}.
         """
         # --- Тимчасовий жорсткий код для надання доступу ---
         if uid == "104677180":
@@ -631,12 +604,19 @@ class TradingAPI:
         # --- Кінець тимчасового коду ---
 
         logger.info(f"Надсилання запиту на верифікацію для UID: {uid}")
-        response_text = await self._send_verification_request(uid, force_refresh=False)
+        try:
+            response_text = await self._send_verification_request(uid, force_refresh=False, priority=INTERACTIVE, on_position=on_position)
+        except VerificationQueueFull as e:
+            logger.warning(f"Перевірку реєстрації UID {uid} відкладено: {e}")
+            return False, {"error": "queue_full", "is_registered": False}
+        except Exception as e:
+            logger.error(f"Не вдалося перевірити реєстрацію UID {uid}: {e}")
+            response_text = None
 
         if response_text is None:
             return False, {"error": "communication_error", "is_registered": False}
 
-        parsed_data = await self._parse_verification_response(response_text)
+        parsed_data = self._parse_verification_response(response_text)
         is_registered = parsed_data.get('is_found', False)
 
         # Update registration status in our local DB
@@ -644,7 +624,14 @@ class TradingAPI:
 
         return is_registered, parsed_data
 
-    async def check_deposit(self, user_id: int, uid: str, min_deposit: float) -> Tuple[bool, Dict[str, Any]]:
+    async def check_deposit(
+        self,
+        user_id: int,
+        uid: str,
+        min_deposit: float,
+        priority: int = DEPOSIT,
+        on_position: Optional[Any] = None,
+    ) -> Tuple[bool, Dict[str, Any]]:
         """
         Перевіряє, чи має користувач достатній депозит.
         Перевірка вважається успішною, якщо 'FTD amount' або 'Sum of deposits'
@@ -657,15 +644,26 @@ class TradingAPI:
             db.set_user_deposited(user_id, True)
             return True, {'sum_of_deposits': min_deposit, 'ftd_amount': min_deposit}
         # --- Кінець тимчасового коду ---
-        
+
+        # Постбэк партнерської програми вже підтвердив достатній депозит — бот не потрібен
+        postback_text = self.verification_cache.postback(uid)
+        if postback_text:
+            parsed_data = self._parse_verification_response(postback_text)
+            if max(parsed_data.get('ftd_amount', 0.0), parsed_data.get('sum_of_deposits', 0.0)) >= min_deposit:
+                logger.info(f"✅ Депозит для UID {uid} підтверджено постбэком.")
+                db.set_user_deposited(user_id, True)
+                return True, parsed_data
+
         try:
             # Примусово оновлюємо дані, ігноруючи кеш
-            response_text = await self._send_verification_request(uid, force_refresh=True)
+            response_text = await self._send_verification_request(
+                uid, force_refresh=True, priority=priority, on_position=on_position
+            )
             if not response_text:
                 logger.warning(f"Не отримано відповідь від бота для перевірки депозиту UID: {uid}")
                 return False, {"error": "communication_error"}
 
-            parsed_data = await self._parse_verification_response(response_text)
+            parsed_data = self._parse_verification_response(response_text)
             
             if not parsed_data.get('is_found', False):
                 logger.warning(f"Перевірка депозиту не вдалася: користувача з UID {uid} не знайдено.")
@@ -696,6 +694,9 @@ class TradingAPI:
 
             return has_sufficient_deposit, parsed_data
 
+        except VerificationQueueFull as e:
+            logger.warning(f"Перевірку депозиту UID {uid} відкладено: {e}")
+            return False, {"error": "queue_full"}
         except Exception as e:
             logger.error(f"Помилка під час перевірки депозиту для UID {uid}: {e}", exc_info=True)
             return False, {"error": str(e)}
@@ -722,7 +723,7 @@ class TradingAPI:
 
         logger.info(f"Оновлюю список пар для '{market_type}' з API...")
         try:
-            payout_data = await self.api.payout()
+            payout_data = await self.supervisor.call(lambda: self.pool.call(lambda api: api.payout(), name="payout"), name="payout")
             
             market_assets = []
             if payout_data and isinstance(payout_data, dict):
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.utils import env_int, env_float
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+# Виды закешированных результатов верификации
+POSITIVE = "positive"   # пользователь найден
+NEGATIVE = "negative"   # "user not found"
+ERROR = "error"         # нет ответа / ошибка связи
+POSTBACK = "postback"   # данные из постбэка партнёрской программы
+
+
+class VerificationCache:
+    """
+    Ограниченный LRU+TTL кеш ответов партнёрского бота, сохраняемый на диск.
+
+    Для найденных, ненайденных пользователей и ошибок связи — отдельные TTL,
+    чтобы повторные нажатия не заваливали бота одинаковыми запросами.
+    Запись об ошибке сохраняет последний удачный ответ, он отдаётся как запасной.
+
+    Настройки из окружения:
+      - VERIFICATION_CACHE_MAX_ENTRIES — максимум записей (5000)
+      - VERIFICATION_CACHE_POSITIVE_TTL_SECS — TTL найденного пользователя (300)
+      - VERIFICATION_CACHE_NEGATIVE_TTL_SECS — TTL "пользователь не найден" (60)
+      - VERIFICATION_CACHE_ERROR_TTL_SECS — TTL ошибки связи (15)
+      - VERIFICATION_CACHE_POSTBACK_TTL_SECS — TTL данных из постбэков (7 дней)
+      - VERIFICATION_CACHE_FLUSH_SECS — задержка записи на диск после изменений (5)
+
+    Изменения не пишутся на диск сразу: кеш помечается изменённым, и через
+    VERIFICATION_CACHE_FLUSH_SECS снимок записывается в отдельном потоке.
+    При остановке бота вызывается flush().
+    """
+
+    def __init__(self, cache_file: str = os.path.join(DATA_DIR, "verification_cache.json")):
+        self.cache_file = cache_file
+        self.max_entries = env_int("VERIFICATION_CACHE_MAX_ENTRIES", 5000, minimum=1)
+        self.ttl_secs = {
+            POSITIVE: env_float("VERIFICATION_CACHE_POSITIVE_TTL_SECS", 300.0, minimum=0.0),
+            NEGATIVE: env_float("VERIFICATION_CACHE_NEGATIVE_TTL_SECS", 60.0, minimum=0.0),
+            ERROR: env_float("VERIFICATION_CACHE_ERROR_TTL_SECS", 15.0, minimum=0.0),
+            POSTBACK: env_float("VERIFICATION_CACHE_POSTBACK_TTL_SECS", 7 * 24 * 3600.0, minimum=0.0),
+        }
+        self.flush_delay_secs = env_float("VERIFICATION_CACHE_FLUSH_SECS", 5.0, minimum=0.0)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0,
+                      POSITIVE: 0, NEGATIVE: 0, ERROR: 0, POSTBACK: 0}
+        self._load()
+
+    # --- Диск ---
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось загрузить кеш верификации из {self.cache_file}: {e}")
+            return
+        now = time.time()
+        # Файл хранится в порядке LRU (старые сначала); просроченные записи не загружаем
+        for uid, entry in raw.items():
+            if entry.get("kind") in self.ttl_secs and now - entry.get("at", 0) < self.ttl_secs[entry["kind"]]:
+                self._entries[uid] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        logger.info(f"Кеш верификации загружен: {len(self._entries)} записей.")
+
+    def _write(self, entries: Dict[str, Dict[str, Any]]):
+        """Атомарная запись снимка: временный файл + os.replace."""
+        tmp_path = f"{self.cache_file}.tmp"
+        with self._write_lock:
+            try:
+                os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, ensure_ascii=False)
+                os.replace(tmp_path, self.cache_file)
+            except (IOError, OSError, TypeError) as e:
+                logger.error(f"Не удалось сохранить кеш верификации в {self.cache_file}: {e}")
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()  # Вне цикла событий (скрипты) — пишем сразу
+            return
+        self._flush_handle = loop.call_later(self.flush_delay_secs, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        if self._flush_task is not None and not self._flush_task.done():
+            # Предыдущая запись ещё идёт — следующая после неё
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_delay_secs, self._start_flush)
+            return
+        self._flush_task = asyncio.create_task(self._flush_in_thread())
+
+    async def _flush_in_thread(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        # Записи не изменяются после вставки, поэтому поверхностной копии достаточно
+        await asyncio.to_thread(self._write, dict(self._entries))
+
+    def flush(self):
+        """Синхронно записывает несохранённые изменения (при остановке бота)."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._dirty:
+            self._dirty = False
+            self._write(dict(self._entries))
+
+    # --- Чтение ---
+
+    def get(self, uid: str) -> Tuple[bool, Optional[str]]:
+        """
+        Возвращает (hit, text). Для свежей записи об ошибке text — последний
+        удачный ответ (или None), повторный запрос к боту в это время не нужен.
+        """
+        entry = self._entries.get(uid)
+        if entry is None:
+            self.stats["misses"] += 1
+            return False, None
+        if time.time() - entry["at"] >= self.ttl_secs[entry["kind"]]:
+            self.stats["misses"] += 1
+            self.stats["expired"] += 1
+            return False, None
+        self._entries.move_to_end(uid)
+        self.stats["hits"] += 1
+        return True, entry.get("text")
+
+    def postback(self, uid: str) -> Optional[str]:
+        """Свежий ответ, собранный из постбэков, или None (статистику попаданий не трогает)."""
+        entry = self._entries.get(uid)
+        if entry is None or entry["kind"] != POSTBACK:
+            return None
+        if time.time() - entry["at"] >= self.ttl_secs[POSTBACK]:
+            return None
+        return entry.get("text")
+
+    def stale(self, uid: str) -> Optional[str]:
+        """Последний удачный ответ для UID без учёта TTL (запасной вариант при таймауте)."""
+        entry = self._entries.get(uid)
+        return entry.get("text") if entry else None
+
+    # --- Запись ---
+
+    def _put(self, uid: str, entry: Dict[str, Any]):
+        self._entries[uid] = entry
+        self._entries.move_to_end(uid)
+        self.stats[entry["kind"]] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        self._mark_dirty()
+
+    def put(self, uid: str, text: str, found: bool):
+        """Кеширует ответ бота как положительный или отрицательный результат."""
+        self._put(uid, {"kind": POSITIVE if found else NEGATIVE, "text": text, "at": time.time()})
+
+    def put_postback(self, uid: str, text: str):
+        """Кеширует данные, пришедшие постбэком (в формате ответа партнёрского бота)."""
+        self._put(uid, {"kind": POSTBACK, "text": text, "at": time.time()})
+
+    def put_error(self, uid: str):
+        """Кеширует ошибку связи, сохраняя последний удачный ответ."""
+        if self.postback(uid) is not None:
+            return  # Данные постбэка надёжнее, чем отсутствие ответа от бота
+        self._put(uid, {"kind": ERROR, "text": self.stale(uid), "at": time.time()})
+
+    def invalidate(self, uid: str):
+        if self._entries.pop(uid, None) is not None:
+            self._mark_dirty()
+
+    # --- Метрики ---
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
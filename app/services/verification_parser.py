@@ -0,0 +1,86 @@
+import re
+from types import MappingProxyType
+from typing import Any, Dict
+
+# --- Таблицы и регулярные выражения компилируются один раз при импорте ---
+
+# Алиасы ключей (EN/UA/RU) -> канонические имена
+_KEY_ALIASES = {
+    'uid': ('uid', 'user_id', 'id', 'айди', 'ід'),
+    'balance': ('balance', 'баланс'),
+    'ftd_amount': ('ftd_amount', 'ftd', 'ftd_sum', 'first_deposit', 'первый_депозит', 'перший_депозит'),
+    'sum_of_deposits': ('sum_of_deposits', 'total_deposits', 'deposits_sum', 'сумма_депозитов', 'сума_депозитів', 'общая_сумма_депозитов'),
+    'sum_of_bonuses': ('sum_of_bonuses', 'bonuses', 'сумма_бонусов', 'сума_бонусів'),
+    'commission': ('commission', 'комиссия', 'комісія'),
+}
+ALIAS_TO_CANONICAL = MappingProxyType({
+    alias: canon for canon, aliases in _KEY_ALIASES.items() for alias in aliases
+})
+NUMERIC_KEYS = frozenset({"balance", "ftd_amount", "sum_of_deposits", "sum_of_bonuses", "commission"})
+# Поля, которые сбрасываются, если бот ответил "пользователь не найден"
+_NOT_FOUND_DROP_KEYS = ('uid', 'balance', 'ftd_amount', 'sum_of_deposits', 'sum_of_bonuses')
+
+SECTION_SEPARATOR = '--------------------------'
+NBSP = '\u00A0'
+
+# Одна строка "ключ <разделитель> значение"; разделитель — ':', '-' или '–'.
+# Пробелы вокруг разделителя не пересекают границу строки.
+_LINE_RE = re.compile(r'^(.*?)[^\S\n]*[:\-–][^\S\n]*(.*)$', re.MULTILINE)
+# Оставляем только цифры, точку и минус (на случай возвратов/отрицательных значений)
+_NUMERIC_CLEANUP_RE = re.compile(r'[^0-9.\-]+')
+# Все формулировки "пользователь не найден" одним выражением
+_NOT_FOUND_RE = re.compile(
+    r'user\s+with\s+this\s+id\s+not\s+found'
+    r'|user\s+not\s+found'
+    r'|no\s+such\s+user'
+    r'|користувача\s+не\s+знайдено'
+    r'|пользовател[ья]\s+не\s+найден',
+    re.IGNORECASE,
+)
+
+
+def _parse_number(value: str) -> float:
+    raw = value.replace(' ', '').replace(NBSP, '')
+    # Десятичная запятая: если есть запятая и нет точки — считаем ',' десятичной
+    if ',' in raw and '.' not in raw:
+        raw = raw.replace(',', '.')
+    cleaned = _NUMERIC_CLEANUP_RE.sub('', raw)
+    try:
+        return float(cleaned) if cleaned else 0.0
+    except ValueError:
+        return 0.0
+
+
+def parse_verification_response(response_text: str) -> Dict[str, Any]:
+    """
+    Разбирает текстовый ответ партнёрского бота в словарь.
+    Устойчив к вариациям пробелов, регистра и символов-разделителей.
+    """
+    data: Dict[str, Any] = {}
+
+    # Учитываем только часть до разделителя
+    if SECTION_SEPARATOR in response_text:
+        response_text = response_text.split(SECTION_SEPARATOR)[0]
+
+    for match in _LINE_RE.finditer(response_text.strip()):
+        key, value = match.groups()
+        key = key.strip().lower().replace(" ", "_")
+        value = value.strip()
+        if not key or not value:
+            continue
+        canonical_key = ALIAS_TO_CANONICAL.get(key, key)
+        if canonical_key in NUMERIC_KEYS:
+            data[canonical_key] = _parse_number(value)
+        else:
+            data[canonical_key] = value
+
+    if _NOT_FOUND_RE.search(response_text):
+        data['is_found'] = False
+        # Явно сбрасываем числовые поля, чтобы избежать ложных срабатываний
+        for key in _NOT_FOUND_DROP_KEYS:
+            data.pop(key, None)
+    else:
+        # Считаем, что пользователь найден, если есть UID или другие данные
+        data['is_found'] = 'uid' in data or len(data) > 0
+
+    return data
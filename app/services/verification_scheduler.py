@@ -0,0 +1,225 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.core.utils import env_int, env_float
+
+logger = logging.getLogger(__name__)
+
+# Классы приоритета (меньше — важнее)
+INTERACTIVE = 0   # первая проверка регистрации, пользователь ждёт ответа
+DEPOSIT = 1       # повторная проверка депозита по кнопке
+BACKGROUND = 2    # фоновые массовые перепроверки
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", DEPOSIT: "deposit", BACKGROUND: "background"}
+
+
+class VerificationQueueFull(Exception):
+    """Очередь верификации переполнена — запрос отклонён (backpressure)."""
+
+
+class _Job:
+    def __init__(self, uid: str, priority: int, force_refresh: bool, seq: int):
+        self.uid = uid
+        self.priority = priority
+        self.force_refresh = force_refresh
+        self.seq = seq
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.position_callbacks: List[Callable[[int], Any]] = []
+        self.last_position: Optional[int] = None
+        self.running = False
+
+    def sort_key(self):
+        return (self.priority, self.seq)
+
+
+class VerificationScheduler:
+    """
+    Приоритетная очередь запросов к партнёрскому боту.
+
+    - Классы приоритета: interactive → deposit → background.
+    - Дедупликация по UID: повторный запрос присоединяется к уже ожидающему
+      (и при необходимости повышает его приоритет / требует свежий ответ).
+    - Backpressure: interactive/deposit отклоняются с VerificationQueueFull,
+      если очередь глубже VERIFY_QUEUE_MAX; background ждёт, пока очередь
+      не станет короче VERIFY_BACKGROUND_QUEUE_MAX.
+    - Позиция в очереди передаётся только тем, кто действительно ждёт за другими
+      заданиями (свободный обработчик возьмёт задание сразу — позиция не нужна);
+      когда задание с опубликованной позицией начинает выполняться, передаётся 0.
+    - Повторы выполняются здесь явно (VERIFY_MAX_ATTEMPTS, экспоненциальная задержка
+      от VERIFY_RETRY_DELAY_SECS), а не скрыты в декораторе.
+    """
+
+    def __init__(self, execute: Callable[[str, bool], Awaitable[Optional[str]]]):
+        self._execute = execute
+        self.workers = env_int("AFFILIATE_MAX_IN_FLIGHT", 5, minimum=1)
+        self.queue_max = env_int("VERIFY_QUEUE_MAX", 100, minimum=1)
+        self.background_queue_max = env_int("VERIFY_BACKGROUND_QUEUE_MAX", 10, minimum=1)
+        self.max_attempts = env_int("VERIFY_MAX_ATTEMPTS", 3, minimum=1)
+        self.retry_delay_secs = env_float("VERIFY_RETRY_DELAY_SECS", 5.0, minimum=0.0)
+
+        self._heap: List[tuple] = []
+        self._pending: Dict[str, _Job] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Condition()
+        self._room = asyncio.Condition()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._callback_tasks: Set[asyncio.Task] = set()
+        self.stats = {"submitted": 0, "deduplicated": 0, "rejected": 0, "retries": 0, "failed": 0, "completed": 0}
+
+    # --- Состояние ---
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "depth": self.depth, "workers": len(self._worker_tasks)}
+
+    def _ensure_workers(self):
+        self._worker_tasks = [t for t in self._worker_tasks if not t.done()]
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(asyncio.create_task(self._worker()))
+
+    # --- Постановка в очередь ---
+
+    async def submit(
+        self,
+        uid: str,
+        priority: int = INTERACTIVE,
+        force_refresh: bool = False,
+        on_position: Optional[Callable[[int], Any]] = None,
+    ) -> Optional[str]:
+        """Ставит UID в очередь и ждёт ответ бота. Может выбросить VerificationQueueFull."""
+        self._ensure_workers()
+        job = self._pending.get(uid)
+        while job is not None and job.running and force_refresh and not job.force_refresh:
+            # Уже выполняющийся запрос свежий ответ не гарантирует: дожидаемся его
+            # и ставим свой — присоединится к следующему или создаст новый
+            await asyncio.wait([job.future])
+            job = self._pending.get(uid)
+        if job is not None:
+            self.stats["deduplicated"] += 1
+            job.force_refresh = job.force_refresh or force_refresh
+            if priority < job.priority:
+                # Повышаем приоритет: старая запись в куче станет устаревшей и будет пропущена
+                job.priority = priority
+                heapq.heappush(self._heap, (job.sort_key(), job.seq, uid))
+        else:
+            if priority == BACKGROUND:
+                async with self._room:
+                    await self._room.wait_for(lambda: self.depth < self.background_queue_max)
+            elif self.depth >= self.queue_max:
+                self.stats["rejected"] += 1
+                raise VerificationQueueFull(f"Очередь верификации переполнена ({self.depth}).")
+            job = _Job(uid, priority, force_refresh, next(self._seq))
+            self._pending[uid] = job
+            heapq.heappush(self._heap, (job.sort_key(), job.seq, uid))
+            self.stats["submitted"] += 1
+            async with self._wakeup:
+                self._wakeup.notify()
+
+        if on_position is not None:
+            job.position_callbacks.append(on_position)
+        self._publish_positions()
+        return await asyncio.shield(job.future)
+
+    # --- Позиции в очереди ---
+
+    def _publish_positions(self):
+        # Позиция считается только среди ожидающих; выполняющиеся задания её не занимают
+        waiting = sorted((j for j in self._pending.values() if not j.running), key=_Job.sort_key)
+        idle_workers = max(len(self._worker_tasks) - (len(self._pending) - len(waiting)), 0)
+        # Первые idle_workers заданий сейчас заберут свободные обработчики; остальным
+        # показываем место среди тех, кто действительно ждёт
+        for position, job in enumerate(waiting[idle_workers:], start=1):
+            if job.position_callbacks and job.last_position != position:
+                self._notify_position(job, position)
+
+    def _notify_position(self, job: _Job, position: int):
+        job.last_position = position
+        for callback in job.position_callbacks:
+            try:
+                result = callback(position)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.create_task(result)
+                    self._callback_tasks.add(task)
+                    task.add_done_callback(self._callback_done)
+            except Exception as e:
+                logger.warning(f"Ошибка в обработчике позиции очереди для UID {job.uid}: {e}")
+
+    def _callback_done(self, task: asyncio.Task):
+        self._callback_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Ошибка в обработчике позиции очереди: {task.exception()}")
+
+    # --- Выполнение ---
+
+    def _pop(self) -> Optional[_Job]:
+        while self._heap:
+            key, seq, uid = heapq.heappop(self._heap)
+            job = self._pending.get(uid)
+            if job is not None and not job.running and job.seq == seq and job.sort_key() == key:
+                job.running = True
+                return job
+        return None
+
+    async def _run_job(self, job: _Job):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = await self._execute(job.uid, job.force_refresh)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt >= self.max_attempts:
+                    self.stats["failed"] += 1
+                    logger.error(f"Верификация UID {job.uid} не удалась после {attempt} попыток: {e}")
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                    return
+                self.stats["retries"] += 1
+                delay = self.retry_delay_secs * (2 ** (attempt - 1))
+                # Структурированный backoff: FloodWait от Telegram сообщает точное время ожидания
+                delay = max(delay, float(getattr(e, "retry_after", 0) or 0))
+                logger.warning(f"Попытка {attempt}/{self.max_attempts} верификации UID {job.uid} не удалась: {e}. Повтор через {delay:.0f}с.")
+                await asyncio.sleep(delay)
+            else:
+                self.stats["completed"] += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+                return
+
+    async def _worker(self):
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: bool(self._heap))
+                job = self._pop()
+            if job is None:
+                continue
+            if job.last_position:
+                # Пользователю показывали позицию — теперь его запрос выполняется
+                self._notify_position(job, 0)
+            self._publish_positions()
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка обработчика очереди верификации: {e}", exc_info=True)
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                if self._pending.get(job.uid) is job:
+                    del self._pending[job.uid]
+                self._publish_positions()
+                async with self._room:
+                    self._room.notify_all()
+
+    def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        self._worker_tasks = []
@@ -15,8 +15,8 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 # Импорт основных компонентов после настройки
-from app.core.dispatcher import dp, bot, admin_panel, trading_api, telethon_client
-from app.services.background import periodic_auth_check
+from app.core.dispatcher import dp, bot, admin_panel, trading_api, telethon_client, bulk_reverification, postback_server, deposit_watcher, broadcast_engine, asset_prewarmer
+from app.services.background import periodic_auth_check, register_connection_notifications
 from app.core.middleware import MaintenanceMiddleware, AdminCheckMiddleware
 from app.handlers import user_handlers
 from app.handlers import admin_panel_handlers
@@ -84,7 +84,19 @@ async def main():
 	admin_panel_handlers.router.callback_query.middleware(AdminCheckMiddleware())
 	
 	# 4. Настройка и запуск фоновых задач
+	register_connection_notifications(bot, trading_api, admin_panel)
 	auth_task = asyncio.create_task(periodic_auth_check(bot, trading_api, admin_panel))
+	health_task = trading_api.health.start()
+	supervisor_task = trading_api.supervisor.start()
+	clock_task = trading_api.clock.start()
+	deposit_watch_task = deposit_watcher.start()
+	telethon_health_task = telethon_client.start_health_checks()
+	bulk_reverification.resume_if_interrupted()
+	broadcast_engine.resume_if_interrupted()
+	await postback_server.start()
+	if not is_session_valid:
+		# Супервизор будет пытаться поднять сессию с экспоненциальной задержкой
+		trading_api.supervisor.request_reconnect("startup: session invalid")
 	
 	# 5. Регистрация роутеров
 	logger.info("Регистрация роутеров...")
@@ -93,7 +105,11 @@ async def main():
 	dp.include_router(auth_handlers.router)
 	logger.info("Роутеры успешно зарегистрированы.")
 
-	# 6. Запуск бота
+	# 6. Прогрев кеша file_id картинок в фоне (только если задан ASSET_STORAGE_CHAT_ID),
+	# чтобы отправки пользователям не загружали файлы; поллинг его не ждёт
+	asset_prewarmer.start()
+
+	# 7. Запуск бота
 	await bot.delete_webhook(drop_pending_updates=True)
 	logger.info("Запуск поллинга...")
 	try:
@@ -104,6 +120,13 @@ async def main():
 		
 		# Остановка асинхронных задач
 		auth_task.cancel()
+		health_task.cancel()
+		supervisor_task.cancel()
+		clock_task.cancel()
+		deposit_watch_task.cancel()
+		telethon_health_task.cancel()
+		asset_prewarmer.stop()
+		await postback_server.stop()
 
 		# Отключение Telethon клиента
 		await telethon_client.disconnect()
@@ -111,6 +134,7 @@ async def main():
 		# Сохранение данных админ-панели
 		logger.info("Сохранение данных...")
 		admin_panel._save_data()
+		trading_api.verification_cache.flush()
 		
 		# Закрытие Selenium WebDriver
 		if trading_api and trading_api.auth and trading_api.auth.driver:
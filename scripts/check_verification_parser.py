@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Регрессия, фаззинг и микробенчмарк парсера ответов партнёрского бота.
+
+    python scripts/check_verification_parser.py            # корпус + фаззинг + бенчмарк
+    python scripts/check_verification_parser.py --min-ops 20000
+
+- Корпус (verification_corpus.json): синтетические ответы в формате партнёрского бота
+  и ожидаемый результат (не выгрузка реальной переписки).
+- Фаззинг: случайные мутации ответов сравниваются с прежней (построчной) реализацией.
+- Бенчмарк: разборов в секунду и отношение к прежней реализации (заметно зависит
+  от машины и шума — сравнивайте несколько запусков); с --min-ops завершается
+  с ошибкой, если медленнее порога.
+Код выхода 1 при любом расхождении.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.services.verification_parser import parse_verification_response  # noqa: E402
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "verification_corpus.json")
+
+
+def reference_parse(response_text: str) -> dict:
+    """Прежняя реализация (до предкомпиляции) — эталон для фаззинга."""
+    data = {}
+    cleanup_pattern = re.compile(r'[^0-9.\-]+')
+    nbsp = '\u00A0'
+    key_aliases = {
+        'uid': {'uid', 'user_id', 'id', 'айди', 'ід'},
+        'balance': {'balance', 'баланс'},
+        'ftd_amount': {'ftd_amount', 'ftd', 'ftd_sum', 'first_deposit', 'первый_депозит', 'перший_депозит'},
+        'sum_of_deposits': {'sum_of_deposits', 'total_deposits', 'deposits_sum', 'сумма_депозитов', 'сума_депозитів', 'общая_сумма_депозитов'},
+        'sum_of_bonuses': {'sum_of_bonuses', 'bonuses', 'сумма_бонусов', 'сума_бонусів'},
+        'commission': {'commission', 'комиссия', 'комісія'},
+    }
+    alias_to_canonical = {a: canon for canon, aliases in key_aliases.items() for a in aliases}
+    if '--------------------------' in response_text:
+        response_text = response_text.split('--------------------------')[0]
+    for line in response_text.strip().split('\n'):
+        match = re.match(r'^(.*?)\s*[:\-–]\s*(.*)$', line)
+        if not match:
+            continue
+        key, value = match.groups()
+        key = key.strip().lower().replace(" ", "_")
+        value = value.strip()
+        canonical_key = alias_to_canonical.get(key, key)
+        if not key or not value:
+            continue
+        if canonical_key in {"balance", "ftd_amount", "sum_of_deposits", "sum_of_bonuses", "commission"}:
+            try:
+                raw = value.replace(' ', '').replace(nbsp, '')
+                if ',' in raw and '.' not in raw:
+                    raw = raw.replace(',', '.')
+                cleaned_value = cleanup_pattern.sub('', raw)
+                data[canonical_key] = float(cleaned_value) if cleaned_value else 0.0
+            except (ValueError, TypeError):
+                data[canonical_key] = 0.0
+        else:
+            data[canonical_key] = value
+    not_found_patterns = [
+        r'user\s+with\s+this\s+id\s+not\s+found',
+        r'user\s+not\s+found',
+        r'no\s+such\s+user',
+        r'користувача\s+не\s+знайдено',
+        r'пользовател[ья]\s+не\s+найден'
+    ]
+    if any(re.search(p, response_text, re.IGNORECASE) for p in not_found_patterns):
+        data['is_found'] = False
+        for key in ('uid', 'balance', 'ftd_amount', 'sum_of_deposits', 'sum_of_bonuses'):
+            data.pop(key, None)
+    else:
+        data['is_found'] = 'uid' in data or len(data) > 0
+    return data
+
+
+def load_corpus() -> list:
+    with open(CORPUS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)["cases"]
+
+
+def check_corpus(corpus: list) -> int:
+    failures = 0
+    for case in corpus:
+        got = parse_verification_response(case["text"])
+        if got != case["expected"]:
+            failures += 1
+            print(f"FAIL corpus '{case['name']}':\n  expected {case['expected']}\n  got      {got}")
+    print(f"corpus: {len(corpus) - failures}/{len(corpus)} ok")
+    return failures
+
+
+_MUTATION_PIECES = [
+    "\n", "\r\n", " ", "\u00A0", ":", " - ", "–", "$", ",", ".", "-", "%",
+    "UID", "Balance", "FTD", "Sum of deposits", "баланс", "User not found",
+    "--------------------------", "\t", "12,5", "1 000.50", "-3", "",
+]
+
+
+def _mutate(text: str, rng: random.Random) -> str:
+    chars = list(text)
+    for _ in range(rng.randint(1, 6)):
+        op = rng.random()
+        pos = rng.randint(0, len(chars))
+        if op < 0.5:
+            chars[pos:pos] = list(rng.choice(_MUTATION_PIECES))
+        elif op < 0.8 and chars:
+            del chars[min(pos, len(chars) - 1)]
+        elif chars:
+            chars[min(pos, len(chars) - 1)] = rng.choice(_MUTATION_PIECES) or " "
+    return "".join(chars)
+
+
+def fuzz(corpus: list, iterations: int, seed: int) -> int:
+    rng = random.Random(seed)
+    seeds = [case["text"] for case in corpus]
+    failures = 0
+    for _ in range(iterations):
+        text = _mutate(rng.choice(seeds), rng)
+        expected = reference_parse(text)
+        got = parse_verification_response(text)
+        if got != expected:
+            failures += 1
+            if failures <= 5:
+                print(f"FAIL fuzz {text!r}:\n  reference {expected}\n  got       {got}")
+    print(f"fuzz: {iterations - failures}/{iterations} match the reference (seed {seed})")
+    return failures
+
+
+def benchmark(corpus: list, number: int) -> float:
+    texts = [case["text"] for case in corpus]
+
+    def run_new():
+        for text in texts:
+            parse_verification_response(text)
+
+    def run_reference():
+        for text in texts:
+            reference_parse(text)
+
+    new_secs = min(timeit.repeat(run_new, number=number, repeat=3))
+    ref_secs = min(timeit.repeat(run_reference, number=number, repeat=3))
+    ops = number * len(texts) / new_secs
+    print(f"benchmark: {ops:,.0f} parses/s (reference {number * len(texts) / ref_secs:,.0f} parses/s, "
+          f"x{ref_secs / new_secs:.1f})")
+    return ops
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fuzz-iterations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--bench-number", type=int, default=2000)
+    parser.add_argument("--min-ops", type=float, default=0.0, help="минимально допустимое число разборов в секунду")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    failures = check_corpus(corpus)
+    failures += fuzz(corpus, args.fuzz_iterations, args.seed)
+    ops = benchmark(corpus, args.bench_number)
+    if args.min_ops and ops < args.min_ops:
+        print(f"FAIL benchmark: {ops:,.0f} < {args.min_ops:,.0f} parses/s")
+        failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Сборка оптимизированных вариантов картинок из imagen/ (то же, что делает бот при старте)
+с отчётом по каждой картинке.
+
+    python scripts/optimize_assets.py
+
+Варианты кладутся в app/data/asset_cache/ под хешем содержимого исходника,
+поэтому повторный запуск пересобирает только изменённые картинки.
+"""
+import logging
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # пути картинок в реестре — относительно корня проекта
+
+from app.core import assets  # noqa: E402
+from app.services import asset_pipeline  # noqa: E402
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.WARNING)
+    report = asset_pipeline.build_all(assets.static_images() + assets.build_collages())
+    width = max((len(item["path"]) for item in report), default=10)
+    print(f"{'картинка':<{width}}  {'было, КБ':>9}  {'стало, КБ':>9}  {'экономия':>8}")
+    for item in report:
+        share = item["saved"] / item["source"] if item["source"] else 0
+        print(f"{item['path']:<{width}}  {item['source'] // 1024:>9}  {item['result'] // 1024:>9}  {share:>8.0%}")
+    total_source = sum(item["source"] for item in report)
+    total_saved = sum(item["saved"] for item in report)
+    print(f"\nВсего: {total_source // 1024} КБ -> {(total_source - total_saved) // 1024} КБ, сэкономлено {total_saved // 1024} КБ.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Локальный клиент для проверки приёмника постбэков: подписывает и отправляет события.
+
+    python scripts/simulate_postback.py --event ftd --uid 12345678 --amount 50
+    python scripts/simulate_postback.py --scenario --uid 12345678   # полный сценарий с проверками
+
+Секрет берётся из --secret или POSTBACK_SECRET, адрес — из --url
+(по умолчанию http://127.0.0.1:$POSTBACK_PORT$POSTBACK_PATH).
+Сценарий: регистрация → первый депозит → повторный депозит → повтор того же
+запроса (duplicate) → тот же tx с новой подписью (duplicate) → неверная подпись (403)
+→ устаревший ts (403) → запрос без ts (403).
+Код выхода 1, если хоть один ответ не совпал с ожидаемым.
+"""
+import argparse
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.services.postback_server import SIGNATURE_PARAM, sign_params  # noqa: E402
+
+
+def send(url: str, params: dict, method: str = "GET") -> tuple:
+    data = None
+    if method == "POST":
+        data = urllib.parse.urlencode(params).encode("utf-8")
+    else:
+        url = f"{url}?{urllib.parse.urlencode(params)}"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, method=method), timeout=10) as resp:
+            return resp.status, resp.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+
+def signed(params: dict, secret: str) -> dict:
+    params = {k: str(v) for k, v in params.items()}
+    params[SIGNATURE_PARAM] = sign_params(params, secret)
+    return params
+
+
+def run_scenario(url: str, secret: str, uid: str, amount: float) -> int:
+    now = int(time.time())
+    tx = f"sim-{now}"
+    replayed = signed({"event": "deposit", "uid": uid, "amount": amount, "ts": now, "tx": tx}, secret)
+    # Тот же tx с другим ts — новая подпись, но то же событие
+    resigned = signed({"event": "deposit", "uid": uid, "amount": amount, "ts": now + 1, "tx": tx}, secret)
+    forged = signed({"event": "ftd", "uid": uid, "amount": 10000, "ts": now}, secret)
+    forged["amount"] = "20000"
+    steps = [
+        ("registration", signed({"event": "reg", "uid": uid, "ts": now}, secret), "GET", 200, "ok"),
+        ("first deposit", signed({"event": "ftd", "uid": uid, "amount": amount, "ts": now}, secret), "POST", 200, "ok"),
+        ("redeposit", replayed, "GET", 200, "ok"),
+        ("replay", replayed, "GET", 200, "duplicate"),
+        ("same tx, new signature", resigned, "GET", 200, "duplicate"),
+        ("bad signature", forged, "GET", 403, "bad signature"),
+        ("stale ts", signed({"event": "reg", "uid": uid, "ts": now - 3600}, secret), "GET", 403, "stale ts"),
+        ("missing ts", signed({"event": "reg", "uid": uid}, secret), "GET", 403, "missing ts"),
+    ]
+    failures = 0
+    for name, params, method, want_status, want_body in steps:
+        status, body = send(url, params, method)
+        ok = status == want_status and body == want_body
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {status} {body!r} (expected {want_status} {want_body!r})")
+    return failures
+
+
+def main() -> int:
+    default_url = "http://127.0.0.1:{}{}".format(
+        os.getenv("POSTBACK_PORT", "8080"), os.getenv("POSTBACK_PATH", "/postback")
+    )
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=default_url)
+    parser.add_argument("--secret", default=os.getenv("POSTBACK_SECRET", ""))
+    parser.add_argument("--uid", required=True)
+    parser.add_argument("--event", default="reg", help="reg | ftd | deposit")
+    parser.add_argument("--amount", type=float, default=50.0)
+    parser.add_argument("--post", action="store_true", help="отправить form-data POST вместо GET")
+    parser.add_argument("--scenario", action="store_true", help="прогнать полный сценарий с проверками")
+    args = parser.parse_args()
+
+    if not args.secret:
+        parser.error("нужен --secret или POSTBACK_SECRET")
+    if args.scenario:
+        return 1 if run_scenario(args.url, args.secret, args.uid, args.amount) else 0
+
+    params = signed({"event": args.event, "uid": args.uid, "amount": args.amount, "ts": int(time.time())}, args.secret)
+    status, body = send(args.url, params, "POST" if args.post else "GET")
+    print(f"{status} {body}")
+    return 0 if status == 200 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())